@@ -3,35 +3,60 @@
 Flask app: Phát hiện & highlight (span-level) ngôn từ xúc phạm/tiêu cực trong phản hồi sinh viên.
 - POST /api/predict        -> {"text": "..."}  (phân tích 1 đoạn)
 - POST /api/upload         -> multipart/form-data { file: CSV/TXT/XLSX/DOCX/PDF } (phân tích nhiều dòng)
-- POST /api/export_docx    -> JSON { items: [...] } xuất DOCX có highlight
+                              ?stream=1 -> NDJSON, không giới hạn số dòng
+- POST /api/jobs           -> file hoặc {"texts": [...]} -> job chạy nền, trả job id
+- GET  /api/jobs/<id>      -> tiến độ + kết quả từng phần; /api/jobs/<id>/result -> kết quả đầy đủ
+- POST /api/export         -> JSON { items: [...] } hoặc { job_id } -> báo cáo DOCX/XLSX/CSV/HTML (?format=)
+- POST /api/export_docx    -> như trên, luôn DOCX; GET /api/jobs/<id>/export?format=csv
+- GET  /metrics            -> số đo Prometheus (thời gian từng công đoạn, request, cache)
 - GET  /                   -> UI
 
 Chạy:
     pip install -r requirements.txt
     python app.py
 Mở: http://127.0.0.1:5000
+
+Production (nhiều worker, mô hình nạp một lần ở master):
+    gunicorn -c gunicorn.conf.py wsgi:app
 """
 from __future__ import annotations
 
+import hmac
+import json
 import os
-import re
-import tempfile
+import threading
+import time
+from itertools import islice
 from html import escape
-from typing import List, Dict, Any, Optional
+from typing import TYPE_CHECKING, Iterable, List, Dict, Any, Optional, Tuple
 
-from flask import Flask, request, jsonify, render_template, send_file
-import pandas as pd
+from flask import Flask, Response, request, jsonify, render_template, send_file, stream_with_context
 
-from sklearn.feature_extraction.text import TfidfVectorizer
-from sklearn.linear_model import LogisticRegression
+if TYPE_CHECKING:  # pandas / sklearn chỉ import khi huấn luyện hoặc đọc file (xem startup_profile.py)
+    import pandas as pd
+    from sklearn.feature_extraction.text import TfidfVectorizer
+    from sklearn.linear_model import LogisticRegression
 
-# cho export DOCX
-from docx import Document
-from docx.enum.text import WD_COLOR_INDEX
+import model_store
+from compact_model import CompactClassifier, CompactVectorizer, load_compact_model
+from dictionary_store import DictionarySnapshot, DictionaryStore
+from ml_explainer import MLExplainer
+from upload_reader import SUPPORTED_EXTS, Location, Segment, chunked, iter_upload_segments
+from jobs import JobManager
+from report_export import FORMATS as EXPORT_FORMATS, STREAMING_FORMATS
+from report_export import iter_csv, iter_html, iter_report_items, spooled_report
+import near_dup
+from near_dup import DEDUP_MODE, DedupStats
+from micro_batcher import MICROBATCH_WINDOW_MS, MicroBatcher, Overloaded
+from parallel_scoring import PARALLEL_MIN_BATCH, PARALLEL_WORKERS, ParallelScorer
+from result_cache import RESULT_CACHE_MAX_MB_DEFAULT, RESULT_CACHE_SIZE_DEFAULT, ResultCache
+import metrics
+from metrics import BATCH_SIZE, REQUEST_SECONDS, REQUESTS_TOTAL, STAGE_SECONDS, TEXTS_TOTAL, StageTimes
 
 # =========================
 # 1) CẤU HÌNH & TỪ ĐIỂN
 # =========================
+# từ điển gốc, luôn được ưu tiên; các mục viết tắt còn lại nạp từ file (DICT_STORE)
 profanity_list: List[str] = [
     "thối lợm",
     "ngu", "ngu ngốc", "đần", "dốt",
@@ -55,66 +80,48 @@ norm_dict: Dict[str, str] = {
 # =========================
 # 2) SPAN HELPERS
 # =========================
-import re as _re
-def _term_to_regex(term: str):
-    parts = []
-    for ch in term:
-        if ch == '*':
-            parts.append(r'[\w\.]*')
-        elif ch.isspace():
-            parts.append(r'\s+')
-        else:
-            parts.append(_re.escape(ch))
-    pattern = r'(?i)\b' + ''.join(parts) + r'\b'
-    return _re.compile(pattern)
+# từ điển đang dùng = bản gốc ở trên + file (master_dict_data.csv, xem DICT_SOURCES),
+# kèm bộ dò lexicon / chỉ mục viết tắt / bộ chuẩn hoá dựng sẵn cho đúng phiên bản đó
+# (bật emoji/teencode bằng NORMALIZE_EMOJI=1)
+DICT_STORE = DictionaryStore(
+    profanity_list, norm_dict, emoji=os.environ.get("NORMALIZE_EMOJI", "0") == "1"
+)
 
-LEXICON_PATTERNS = [(_w, _term_to_regex(_w)) for _w in profanity_list]
+def _dictionaries() -> DictionarySnapshot:
+    # một lần đọc tham chiếu: cả lô dùng chung một snapshot, không lẫn hai phiên bản
+    return DICT_STORE.current
 
 def find_spans_lexicon(original_text: str):
-    spans = []
-    for _, pat in LEXICON_PATTERNS:
-        for m in pat.finditer(original_text):
-            spans.append({"start": m.start(), "end": m.end(), "source": {"lexicon"}})
-    return spans
-
-def find_spans_abbrev(original_text: str, norm_dict: Dict[str, str]):
-    spans = []
-    if not norm_dict:
-        return spans
-    def meaning_is_profane(s: str) -> bool:
-        return any(pat.search(s) for _, pat in LEXICON_PATTERNS)
-    for abb, meaning in norm_dict.items():
-        try:
-            if meaning_is_profane(str(meaning)):
-                pat_abb = _re.compile(r'(?i)\b' + _re.escape(str(abb)) + r'\b')
-                for m in pat_abb.finditer(original_text):
-                    spans.append({"start": m.start(), "end": m.end(), "source": {"abbrev"}})
-        except Exception:
-            continue
-    return spans
+    return _dictionaries().lexicon.find_spans(original_text, source="lexicon")
+
+def find_spans_abbrev(original_text: str):
+    return _dictionaries().abbrev.find_spans(original_text, source="abbrev")
+
+def normalize_text(s: str) -> str:
+    return _dictionaries().normalizer.normalize(s)
+
+# explainer span ML: dựng một lần cho mỗi cặp (vectorizer, model) đang dùng
+_EXPLAINERS: Dict[Tuple[int, int], MLExplainer] = {}
+
+def _explainer_for(model, vectorizer) -> MLExplainer:
+    key = (id(vectorizer), id(model))
+    explainer = _EXPLAINERS.get(key)
+    if explainer is None:
+        explainer = MLExplainer(vectorizer, model)
+        if len(_EXPLAINERS) >= 4:
+            _EXPLAINERS.pop(next(iter(_EXPLAINERS)))
+        _EXPLAINERS[key] = explainer
+    return explainer
 
 def find_spans_ml(original_text: str, normalized_text: str, model, vectorizer, top_k: int = 3):
-    spans = []
     try:
         if hasattr(model, "coef_"):
-            X = vectorizer.transform([normalized_text])
-            feature_names = vectorizer.get_feature_names_out()
-            coefs = model.coef_[0]
-            row = X.tocoo()
-            contribs = []
-            for idx, val in zip(row.col, row.data):
-                score = val * coefs[idx]
-                contribs.append((feature_names[idx], score))
-            contribs.sort(key=lambda x: x[1], reverse=True)
-            for tok, score in contribs[:top_k]:
-                if score <= 0:
-                    break
-                pat_tok = _re.compile(r'(?i)\b' + _re.escape(tok) + r'\b')
-                for m in pat_tok.finditer(original_text):
-                    spans.append({"start": m.start(), "end": m.end(), "source": {"ml"}})
+            explainer = _explainer_for(model, vectorizer)
+            C = explainer.contributions(vectorizer.transform([normalized_text]))
+            return explainer.row_spans(original_text, C.indices, C.data, top_k)
     except Exception:
         pass
-    return spans
+    return []
 
 def _merge_spans(spans, text: str):
     if not spans:
@@ -140,7 +147,7 @@ def make_highlight_html(original_text: str, spans):
     html_parts, last = [], 0
     for s in spans_sorted:
         html_parts.append(escape(original_text[last:s["start"]]))
-        tip = ", ".join(s["source"])
+        tip = escape(", ".join(s["source"]), quote=True)
         html_parts.append(f"<mark title='Nguồn: {tip}'>{escape(original_text[s['start']:s['end']])}</mark>")
         last = s["end"]
     html_parts.append(escape(original_text[last:]))
@@ -149,8 +156,19 @@ def make_highlight_html(original_text: str, spans):
 # =========================
 # 3) HUẤN LUYỆN / LOAD
 # =========================
-tfidf_vectorizer: Optional[TfidfVectorizer] = None
-model: Optional[LogisticRegression] = None
+tfidf_vectorizer: Optional[TfidfVectorizer | CompactVectorizer] = None
+model: Optional[LogisticRegression | CompactClassifier] = None
+MODEL_VERSION: Optional[str] = None
+_model_lock = threading.RLock()
+
+# "compact": phục vụ bằng bản NumPy mmap (compact_model.py), không import sklearn;
+# "sklearn": phục vụ thẳng bằng object sklearn đã unpickle như trước
+SERVING_RUNTIME = os.environ.get("SERVING_RUNTIME", "compact")
+
+TRAIN_CONFIG: Dict[str, Dict[str, Any]] = {
+    "tfidf": {"ngram_range": (1, 2), "min_df": 1, "max_df": 0.95},
+    "logreg": {"max_iter": 200},
+}
 
 def _detect_columns(df: pd.DataFrame):
     text_candidates = ["text", "content", "comment", "message", "review", "sentence"]
@@ -170,13 +188,17 @@ def _detect_columns(df: pd.DataFrame):
             label_col = lower_cols[name]; break
     return text_col, label_col
 
-def _load_user_dataset() -> Optional[pd.DataFrame]:
-    candidates = [
+def _dataset_candidates() -> List[str]:
+    return [
         os.path.join(os.path.dirname(__file__), "data_train.csv"),
         "data_train.csv",
         os.path.join("/mnt/data", "data_train.csv"),
     ]
-    for p in candidates:
+
+def _load_user_dataset() -> Optional[pd.DataFrame]:
+    import pandas as pd
+
+    for p in _dataset_candidates():
         if os.path.exists(p):
             try:
                 df = pd.read_csv(p)
@@ -187,6 +209,8 @@ def _load_user_dataset() -> Optional[pd.DataFrame]:
     return None
 
 def _build_synthetic_dataset() -> pd.DataFrame:
+    import pandas as pd
+
     pos = [
         "mày ngu quá", "đúng là đồ dốt", "cút đi", "đồ rác rưởi",
         "thằng này vô học", "đồ điên", "đ.m thằng kia", "vcl dở tệ",
@@ -201,8 +225,55 @@ def _build_synthetic_dataset() -> pd.DataFrame:
     df = pd.DataFrame({"text": pos + neg, "label": [1]*len(pos) + [0]*len(neg)})
     return df
 
-def train_model():
-    global tfidf_vectorizer, model
+def _training_fingerprint(dicts: DictionarySnapshot) -> str:
+    # hash dữ liệu + từ điển + cấu hình: đổi bất kỳ thứ gì thì artifact cũ không còn dùng
+    return model_store.fingerprint(
+        _dataset_candidates(),
+        {
+            "dictionary": dicts.version,
+            "normalize_emoji": os.environ.get("NORMALIZE_EMOJI", "0"),
+            "config": TRAIN_CONFIG,
+            "sklearn": _sklearn_version(),
+        },
+    )
+
+def _sklearn_version() -> str:
+    # đọc metadata thay vì import sklearn (kéo theo scipy) chỉ để lấy phiên bản
+    import importlib.metadata
+
+    try:
+        return importlib.metadata.version("scikit-learn")
+    except importlib.metadata.PackageNotFoundError:
+        import sklearn
+        return sklearn.__version__
+
+def _serving_model(vec, clf, manifest: Dict[str, Any]):
+    """Cặp (vectorizer, model) dùng để phục vụ: bản compact mmap nếu SERVING_RUNTIME=compact."""
+    if SERVING_RUNTIME != "compact":
+        return vec, clf
+    try:
+        return load_compact_model(model_store.ensure_compact_export(vec, clf, manifest["version"]), mmap=True)
+    except (OSError, ValueError) as e:
+        # cấu hình TF-IDF chưa hỗ trợ / không ghi được -> phục vụ bằng sklearn
+        app.logger.warning("Không dùng được mô hình compact (%s), phục vụ bằng sklearn", e)
+        return vec, clf
+
+def _load_artifact(fp: str) -> Optional[Tuple[Any, Any, Dict[str, Any]]]:
+    if SERVING_RUNTIME == "compact":
+        loaded = model_store.load_compact_artifact(fp)
+        if loaded is not None:
+            return loaded
+    loaded = model_store.load_artifact(fp)
+    if loaded is None:
+        return None
+    vec, clf, manifest = loaded
+    return (*_serving_model(vec, clf, manifest), manifest)
+
+def train_model(dicts: Optional[DictionarySnapshot] = None):
+    from sklearn.feature_extraction.text import TfidfVectorizer
+    from sklearn.linear_model import LogisticRegression
+
+    dicts = dicts or _dictionaries()
     df = _load_user_dataset()
     if df is None:
         df = _build_synthetic_dataset()
@@ -212,81 +283,352 @@ def train_model():
     if label_col is None:
         def label_by_rule(s: str) -> int:
             s = str(s)
-            return int(any(pat.search(s) for _, pat in LEXICON_PATTERNS))
+            return int(dicts.lexicon.search(s))
         df["label_auto"] = df[text_col].astype(str).apply(label_by_rule)
         label_col = "label_auto"
 
-    def normalize_text(s: str) -> str:
-        t = str(s).lower().strip()
-        for abb, meaning in norm_dict.items():
-            pattern = r'\b' + _re.escape(abb) + r'\b'
-            t = _re.sub(pattern, str(meaning), t, flags=_re.IGNORECASE)
-        return t
-
     texts = df[text_col].astype(str).tolist()
     labels = df[label_col].astype(int).tolist()
-    texts_norm = [normalize_text(x) for x in texts]
+    texts_norm = dicts.normalizer.normalize_many(texts)
 
-    tfidf_vectorizer = TfidfVectorizer(ngram_range=(1, 2), min_df=1, max_df=0.95)
-    X = tfidf_vectorizer.fit_transform(texts_norm)
+    vec = TfidfVectorizer(**TRAIN_CONFIG["tfidf"])
+    X = vec.fit_transform(texts_norm)
 
-    model = LogisticRegression(max_iter=200)
-    model.fit(X, labels)
+    clf = LogisticRegression(**TRAIN_CONFIG["logreg"])
+    clf.fit(X, labels)
 
-train_model()
+    fp = _training_fingerprint(dicts)
+    try:
+        manifest = model_store.save_artifact(vec, clf, fp, n_samples=len(texts))
+    except OSError:
+        # thư mục artifact chỉ đọc: vẫn phục vụ bằng mô hình trong bộ nhớ
+        manifest = {"version": fp[:12], "fingerprint": fp}
+    _install_model(*_serving_model(vec, clf, manifest), manifest, dicts)
+    RESULT_CACHE.clear()
+    return manifest
+
+def _install_model(vec, clf, manifest: Dict[str, Any], dicts: DictionarySnapshot) -> Dict[str, Any]:
+    # đổi cả bộ (vectorizer, model, version, từ điển) dưới khoá: không request nào
+    # thấy nửa cũ nửa mới, mô hình luôn đi cùng từ điển đã dùng để huấn luyện nó
+    global tfidf_vectorizer, model, MODEL_VERSION
+    with _model_lock:
+        tfidf_vectorizer, model = vec, clf
+        MODEL_VERSION = manifest["version"]
+        DICT_STORE.activate(dicts)
+    return manifest
+
+def load_model(force_retrain: bool = False, dicts: Optional[DictionarySnapshot] = None) -> Dict[str, Any]:
+    """
+    Nạp mô hình từ artifact nếu hash khớp dữ liệu/từ điển (`dicts`, mặc định
+    bản đang dùng), ngược lại (hoặc khi force_retrain) thì huấn luyện lại và
+    lưu artifact mới. Mô hình + từ điển mới được nạp/huấn luyện xong rồi mới
+    thay vào, nên request đang chạy vẫn dùng bản cũ trong lúc chờ.
+    Với SERVING_RUNTIME=compact, artifact đã có bản compact được mở bằng mmap
+    mà không unpickle sklearn.
+    """
+    dicts = dicts or _dictionaries()
+    fp = _training_fingerprint(dicts)
+    if not force_retrain:
+        loaded = _load_artifact(fp)
+        if loaded is not None:
+            return _install_model(*loaded, dicts)
+    with model_store.training_lock():
+        if not force_retrain:
+            # worker khác có thể vừa huấn luyện xong trong lúc chờ khoá
+            loaded = _load_artifact(fp)
+            if loaded is not None:
+                return _install_model(*loaded, dicts)
+        return train_model(dicts)
+
+def ensure_model() -> None:
+    """Nạp mô hình lười (lần gọi đầu tiên); import app.py không còn tự huấn luyện."""
+    if tfidf_vectorizer is None or model is None:
+        with _model_lock:
+            if tfidf_vectorizer is None or model is None:
+                load_model()
+
+def _current_state():
+    """(vectorizer, model, version, từ điển) đang dùng, đọc cùng lúc dưới khoá."""
+    ensure_model()
+    with _model_lock:
+        return tfidf_vectorizer, model, MODEL_VERSION, _dictionaries()
+
+def _current_model():
+    return _current_state()[:3]
 
 # =========================
 # 4) DỰ ĐOÁN
 # =========================
-def preprocess_and_predict(text: str) -> Dict[str, Any]:
-    original_text = str(text)
-    normalized_text = original_text.lower().strip()
-    if norm_dict:
-        for abb, meaning in norm_dict.items():
-            pattern = r'\b' + _re.escape(abb) + r'\b'
-            normalized_text = _re.sub(pattern, str(meaning), normalized_text, flags=_re.IGNORECASE)
-
-    prob_profane = None
-    final_prediction = 0
-    if tfidf_vectorizer is not None and model is not None:
-        text_vectorized = tfidf_vectorizer.transform([normalized_text])
-        raw_pred = model.predict(text_vectorized)[0]
-        final_prediction = int(raw_pred)
+# mức chi tiết kết quả (chấm theo tầng, xem _predict_batch); chọn theo request bằng ?detail=
+SCORING_DETAILS = ("full", "probability", "label")
+SCORING_DETAIL = os.environ.get("SCORING_DETAIL", "full")
+
+def _predict_batch(
+    texts: List[str],
+    top_k: int = 3,
+    vec=None,
+    clf=None,
+    times: Optional[StageTimes] = None,
+    dicts: Optional[DictionarySnapshot] = None,
+    dedup: str = DEDUP_MODE,
+    detail: str = "full",
+) -> List[Dict[str, Any]]:
+    """
+    Lõi dự đoán theo lô: chuẩn hoá cả lô, transform thành MỘT ma trận thưa,
+    gọi predict_proba MỘT lần (suy ra luôn nhãn) và tính đóng góp span ML
+    cho mọi dòng từ cùng ma trận đó.
+
+    Chấm theo tầng, rẻ trước: lexicon -> viết tắt -> ML. Mỗi kết quả có
+    "decided_by" = tầng đầu tiên kết luận nhãn ("lexicon", "abbrev", "ml", hoặc
+    "ml_spans" khi chỉ span ML làm nhãn thành 1). `detail` (xem SCORING_DETAILS):
+    - "full": chạy mọi tầng, đủ span ML + HTML highlight (như trước).
+    - "probability": xác suất ML cho mọi dòng, bỏ span ML và HTML; nhãn =
+      lexicon / viết tắt / xác suất ML.
+    - "label": như "probability" nhưng dừng sớm — dòng đã có kết luận ở tầng
+      lexicon / viết tắt không qua ML ("probability_profane" = None); dòng đã
+      trúng lexicon không dò tiếp viết tắt (span chỉ gồm phần đã dò).
+
+    `dedup` ("near"/"exact"/"off", xem near_dup.py): văn bản trùng sau chuẩn
+    hoá hoặc gần trùng chỉ đưa ĐẠI DIỆN cụm qua mô hình; thành viên dùng lại
+    xác suất + đặc trưng ML của đại diện, còn span (lexicon, viết tắt, vị trí
+    đặc trưng ML) vẫn tính lại trên chính văn bản của nó. Thành viên có thêm
+    "deduplicated": "exact" | "near".
+
+    `vec`/`clf` cho phép worker chấm song song truyền mô hình compact (mmap)
+    thay cho mô hình sklearn toàn cục. Cả lô dùng một snapshot từ điển `dicts`
+    (bộ chuẩn hoá, lexicon, chỉ mục viết tắt cùng phiên bản). Thời gian từng
+    công đoạn được ghi vào histogram /metrics và cộng vào `times` nếu truyền
+    vào (?profile=1).
+    """
+    if detail not in SCORING_DETAILS:
+        raise ValueError(f"detail phải là một trong {SCORING_DETAILS}")
+    if vec is None or clf is None:
+        vec, clf, _, current = _current_state()
+        dicts = dicts or current
+    dicts = dicts or _dictionaries()
+    full = detail == "full"
+    stages = StageTimes()
+    clock = time.perf_counter
+    t0 = clock()
+    originals = [str(t) for t in texts]
+    normalized = dicts.normalizer.normalize_many(originals)
+    n = len(originals)
+    t1 = clock()
+    stages.add("normalize", t1 - t0)
+
+    # ---- tầng rẻ: lexicon rồi viết tắt (chế độ "label" bỏ tầng sau khi đã có kết luận) ----
+    lexicon = dicts.lexicon
+    abbrev_index = dicts.abbrev if dicts.abbrev.profane else None
+    by_list: List[bool] = []
+    spans_of: List[List[Dict[str, Any]]] = []
+    decided: List[Optional[str]] = [None] * n
+    for i, (original_text, normalized_text) in enumerate(zip(originals, normalized)):
+        is_profane_by_list = bool(lexicon.search(normalized_text))
+        spans = lexicon.find_spans(original_text, source="lexicon")
+        if is_profane_by_list or spans:
+            decided[i] = "lexicon"
+        by_list.append(is_profane_by_list)
+        spans_of.append(spans)
+    t0 = clock()
+    if n:
+        stages.add("lexicon_spans", t0 - t1)
+    if abbrev_index is not None:
+        for i, original_text in enumerate(originals):
+            if detail != "label" or decided[i] is None:
+                found = abbrev_index.find_spans(original_text)
+                if found:
+                    spans_of[i] += found
+                    decided[i] = decided[i] or "abbrev"
+        t1 = clock()
+        if n:
+            stages.add("abbrev_spans", t1 - t0)
+        t0 = t1
+
+    # ---- tầng ML: chỉ các dòng còn cần (chế độ "label": dòng chưa có kết luận) ----
+    ml_rows = [i for i in range(n) if detail != "label" or decided[i] is None]
+    t1 = t0
+    # row[i] = dòng của văn bản i trong ma trận (chỉ gồm đại diện cụm)
+    row: List[Optional[int]] = [None] * n
+    kinds: List[Optional[str]] = [None] * n
+    model_texts = [normalized[i] for i in ml_rows]
+    if dedup != "off" and len(ml_rows) > 1:
+        rep, sub_kinds = near_dup.cluster(model_texts, near=dedup == "near")
+        reps = [j for j in range(len(ml_rows)) if rep[j] == j]
+        pos = {r: k for k, r in enumerate(reps)}
+        for j, i in enumerate(ml_rows):
+            row[i], kinds[i] = pos[rep[j]], sub_kinds[j]
+        model_texts = [model_texts[r] for r in reps]
+        t0 = clock()
+        stages.add("dedup", t0 - t1)
+        t1 = t0
+    else:
+        for k, i in enumerate(ml_rows):
+            row[i] = k
+
+    m = len(model_texts)
+    preds = [0] * m
+    probs: List[Optional[float]] = [None] * m
+    contribs = explainer = None
+    if vec is not None and clf is not None and m:
+        X = vec.transform(model_texts)
+        t0 = clock()
+        stages.add("transform", t0 - t1)
         try:
-            proba = model.predict_proba(text_vectorized)[0]
-            prob_profane = round(float(proba[1]) * 100, 2)
+            proba = clf.predict_proba(X)
+            preds = [int(c) for c in clf.classes_[proba.argmax(axis=1)]]
+            probs = [round(float(p) * 100, 2) for p in proba[:, 1]]
+            stage = "predict_proba"
         except Exception:
-            prob_profane = None
+            preds = [int(c) for c in clf.predict(X)]
+            stage = "predict"
+        t1 = clock()
+        stages.add(stage, t1 - t0)
+        if full and hasattr(clf, "coef_"):
+            try:
+                explainer = _explainer_for(clf, vec)
+                contribs = explainer.contributions(X)
+            except Exception:
+                contribs = None
+            stages.add("ml_contrib", clock() - t1)
 
-    is_profane_by_list = any(pat.search(normalized_text) for _, pat in LEXICON_PATTERNS)
+    # ---- span ML, gộp span, HTML (chỉ "full") ----
+    t_ml = t_merge = t_html = 0.0
+    features: Dict[int, List] = {}  # đặc trưng ML top-k theo dòng, dùng chung trong cụm
+    results = []
+    for i, (original_text, normalized_text) in enumerate(zip(originals, normalized)):
+        k = row[i]
+        spans = spans_of[i]
+        t0 = clock()
+        if contribs is not None:
+            if k not in features:
+                lo, hi = contribs.indptr[k], contribs.indptr[k + 1]
+                features[k] = explainer.top_features(contribs.indices[lo:hi], contribs.data[lo:hi], top_k)
+            spans += explainer.locate(original_text, features[k])
+        t1 = clock()
+        t_ml += t1 - t0
+        spans = _merge_spans(spans, original_text)
+        t0 = clock()
+        t_merge += t0 - t1
 
-    spans = []
-    spans += find_spans_lexicon(original_text)
-    spans += find_spans_abbrev(original_text, norm_dict)
-    spans += find_spans_ml(original_text, normalized_text, model, tfidf_vectorizer)
-    spans = _merge_spans(spans, original_text)
+        pred = preds[k] if k is not None else 0
+        if decided[i] is None:
+            decided[i] = "ml_spans" if pred != 1 and spans else "ml"
+        result = {
+            "normalized_text": normalized_text,
+            "prediction": 1 if (pred == 1 or by_list[i] or len(spans) > 0) else 0,
+            "probability_profane": probs[k] if k is not None else None,
+            "is_profane_by_list": by_list[i],
+            "spans": spans,
+        }
+        if full:
+            result["highlighted_html"] = make_highlight_html(original_text, spans)
+        result["decided_by"] = decided[i]
+        if kinds[i]:
+            result["deduplicated"] = kinds[i]
+        results.append(result)
+        t_html += clock() - t0
+    if n:
+        if contribs is not None:
+            stages.add("ml_spans", t_ml)
+        stages.add("merge_spans", t_merge)
+        if full:
+            stages.add("html", t_html)
+    stages.observe()
+    if times is not None:
+        times.merge(stages)
+    return results
 
-    final_prediction = 1 if (final_prediction == 1 or is_profane_by_list or len(spans) > 0) else 0
-    highlighted_html = make_highlight_html(original_text, spans)
+# ---- Cache kết quả theo văn bản (RESULT_CACHE_SIZE=0 để tắt) ----
+RESULT_CACHE = ResultCache(
+    int(os.environ.get("RESULT_CACHE_SIZE", str(RESULT_CACHE_SIZE_DEFAULT))),
+    int(os.environ.get("RESULT_CACHE_MAX_MB", str(RESULT_CACHE_MAX_MB_DEFAULT))) << 20,
+)
 
-    return {
-        "normalized_text": normalized_text,
-        "prediction": final_prediction,
-        "probability_profane": prob_profane,
-        "is_profane_by_list": bool(is_profane_by_list),
-        "spans": spans,
-        "highlighted_html": highlighted_html
-    }
+def _score_texts(
+    texts: List[str],
+    top_k: int = 3,
+    parallel: bool = True,
+    times: Optional[StageTimes] = None,
+    stats: Optional[DedupStats] = None,
+    detail: str = SCORING_DETAIL,
+) -> List[Dict[str, Any]]:
+    """
+    Chấm một lô qua cache: văn bản đã có kết quả (cùng phiên bản mô hình + từ
+    điển) lấy lại từ cache, văn bản trùng nhau trong lô chỉ chấm một lần.
+    Phần còn lại chấm song song nếu được bật và đủ lớn, ngược lại `_predict_batch`
+    (gom cụm trùng/gần trùng theo DEDUP_MODE). Kết quả "near" là xấp xỉ nên
+    không vào cache. `stats` (nếu có) cộng dồn số văn bản / số lần chấm mô hình.
+    `detail`: mức chi tiết ("full" / "probability" / "label"), cache theo từng mức
+    (cùng top_k là biến thể trong khoá; chỉ đổi mô hình / từ điển mới xoá cache).
+    Khi đo công đoạn (`times`, ?profile=1) thì bỏ qua cache để đo lần chấm thật.
+    """
+    vec, clf, model_version, dicts = _current_state()
+    t0 = time.perf_counter()
+    texts = [str(t) for t in texts]
+    version = (model_version, dicts.version)
+    variant = (top_k, detail)
+    results: List[Optional[Dict[str, Any]]] = [None] * len(texts)
+    pending: Dict[str, List[int]] = {}
+    for i, t in enumerate(texts):
+        if t in pending:
+            pending[t].append(i)
+            continue
+        cached = RESULT_CACHE.get(t, version, variant) if times is None else None
+        if cached is None:
+            pending[t] = [i]
+        else:
+            results[i] = cached
+    STAGE_SECONDS.observe(time.perf_counter() - t0, "cache_lookup")
+    BATCH_SIZE.observe(len(texts))
+    n_cached = len(texts) - sum(len(idx) for idx in pending.values())
+    if n_cached:
+        TEXTS_TOTAL.inc("cache", amount=n_cached)
+    if pending:
+        unique = list(pending)
+        if len(unique) < len(texts) - n_cached:
+            TEXTS_TOTAL.inc("batch_duplicate", amount=len(texts) - n_cached - len(unique))
+        scorer = get_parallel_scorer() if parallel else None
+        if scorer is not None and len(unique) >= PARALLEL_MIN_BATCH:
+            t0 = time.perf_counter()
+            scored = scorer.score(unique, top_k, detail)
+            elapsed = time.perf_counter() - t0
+            STAGE_SECONDS.observe(elapsed, "parallel_score")
+            if times is not None:
+                times.add("parallel_score", elapsed)
+        else:
+            scored = _predict_batch(unique, top_k, vec=vec, clf=clf, times=times, dicts=dicts, detail=detail)
+        kinds = [res.get("deduplicated") for res in scored]
+        counts = {"model": kinds.count(None), "canonical_duplicate": kinds.count("exact"),
+                  "near_duplicate": kinds.count("near")}
+        for source, amount in counts.items():
+            if amount:
+                TEXTS_TOTAL.inc(source, amount=amount)
+        if stats is not None:
+            merged = counts["canonical_duplicate"] + counts["near_duplicate"]
+            stats.add(len(texts), len(set(texts)) - merged, counts["model"], counts["near_duplicate"])
+        for t, res, kind in zip(unique, scored, kinds):
+            if kind is None:
+                RESULT_CACHE.put(t, version, res, variant)
+            elif kind == "exact":  # cờ chỉ đúng với lô này
+                RESULT_CACHE.put(t, version, {k: v for k, v in res.items() if k != "deduplicated"}, variant)
+            for i in pending[t]:
+                results[i] = dict(res)
+    elif stats is not None:
+        stats.add(len(texts), len(set(texts)), 0)
+    return results
 
-def batch_predict_texts(texts: List[str], limit: int = 200):
-    items = []
-    for i, t in enumerate(texts[:limit]):
-        res = preprocess_and_predict(str(t))
-        items.append({
-            "index": i,
-            "text": str(t),
-            **res
-        })
+def preprocess_and_predict(
+    text: str, times: Optional[StageTimes] = None, detail: str = SCORING_DETAIL
+) -> Dict[str, Any]:
+    return _score_texts([text], times=times, detail=detail)[0]
+
+# ---- Micro-batching /api/predict (MICROBATCH_WINDOW_MS > 0) ----
+# lô gom từ nhiều request nhỏ (<= MICROBATCH_MAX_BATCH) nên chấm tại chỗ, không qua pool song song
+MICRO_BATCHER: Optional[MicroBatcher] = (
+    MicroBatcher(lambda texts: _score_texts(texts, parallel=False)) if MICROBATCH_WINDOW_MS > 0 else None
+)
+
+def _batch_result(items: List[Dict[str, Any]]) -> Dict[str, Any]:
     labels = [f"#{it['index']+1}" for it in items]
     probs = [float(it["probability_profane"]) if isinstance(it["probability_profane"], (int, float)) else (100.0 if it["prediction"]==1 else 0.0) for it in items]
     return {
@@ -294,137 +636,465 @@ def batch_predict_texts(texts: List[str], limit: int = 200):
         "chart": {"labels": labels, "probabilities": probs}
     }
 
+# ---- Chấm song song nhiều lõi (PARALLEL_WORKERS > 0) ----
+_parallel_scorer: Optional[ParallelScorer] = None
+_parallel_lock = threading.Lock()
+
+def get_parallel_scorer() -> Optional[ParallelScorer]:
+    """Pool chấm song song dùng mô hình compact (mmap); None nếu không bật."""
+    global _parallel_scorer
+    if PARALLEL_WORKERS <= 0:
+        return None
+    with _parallel_lock:
+        if _parallel_scorer is None:
+            _parallel_scorer = ParallelScorer(PARALLEL_WORKERS)
+        return _parallel_scorer
+
+def _iter_scored_batches(
+    segments: Iterable[Segment], chunk_size: int, stats: Optional[DedupStats] = None, detail: str = SCORING_DETAIL
+):
+    """
+    Chấm một nguồn (văn bản, vị trí) (có thể rất dài) theo lô, trả từng lô
+    [(text, location, result)]. Khi bật chấm song song, đọc khối
+    PARALLEL_MIN_BATCH dòng để chia cho pool tiến trình, rồi vẫn trả kết quả
+    theo lô `chunk_size`.
+    """
+    block = max(chunk_size, PARALLEL_MIN_BATCH) if get_parallel_scorer() is not None else chunk_size
+    for batch in chunked(segments, block):
+        results = _score_texts([t for t, _ in batch], stats=stats, detail=detail)
+        for i in range(0, len(batch), chunk_size):
+            yield [(t, loc, res) for (t, loc), res in zip(batch[i:i + chunk_size], results[i:i + chunk_size])]
+
+def batch_predict_texts(
+    texts: List[str], limit: int = 200, locations: Optional[List[Location]] = None, detail: str = SCORING_DETAIL
+):
+    """`locations` (nếu có): vị trí của từng văn bản trong file gốc, trả kèm mỗi item."""
+    texts = [str(t) for t in texts[:limit]]
+    stats = DedupStats()
+    results = _score_texts(texts, stats=stats, detail=detail)
+    items = [
+        {"index": i, "text": t, **res}
+        for i, (t, res) in enumerate(zip(texts, results))
+    ]
+    if locations is not None:
+        for it, loc in zip(items, locations):
+            it["location"] = loc
+    return {**_batch_result(items), "dedup": stats.as_dict()}
+
 # =========================
 # 5) FLASK ROUTES
 # =========================
 app = Flask(__name__)
 
+# ---- Đo thời gian / đếm request cho /metrics ----
+@app.before_request
+def _metrics_start():
+    request.environ["metrics.start"] = time.perf_counter()
+
+@app.after_request
+def _metrics_record(response):
+    start = request.environ.get("metrics.start")
+    if start is not None:
+        # theo rule (vd. /api/jobs/<job_id>) để số nhãn không tăng theo id
+        endpoint = request.url_rule.rule if request.url_rule is not None else "unmatched"
+        REQUEST_SECONDS.observe(time.perf_counter() - start, endpoint, request.method)
+        REQUESTS_TOTAL.inc(endpoint, request.method, str(response.status_code))
+        metrics.REGISTRY.start_flusher()
+    return response
+
 @app.route("/")
 def index():
     return render_template("index.html")
 
 @app.route("/api/predict", methods=["POST"])
 def api_predict():
+    """
+    `?profile=1`: thêm "profile" = thời gian (ms) từng công đoạn, chấm lại không qua cache.
+    `?detail=label|probability|full`: chỉ cần nhãn / xác suất thì bỏ span ML +
+    HTML highlight; span lexicon / viết tắt vẫn đủ (với "label", dòng đã có kết
+    luận từ lexicon không qua ML và không dò thêm viết tắt).
+    Khi bật micro-batching, request được gom lô với các request đồng thời khác;
+    hàng đợi đầy -> 503 + Retry-After.
+    """
+    try:
+        detail = _request_detail()
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    profile = request.args.get("profile", "").lower() in {"1", "true"}
+    # ?profile=1 chấm riêng (không qua lô chung): không báo incoming() để luồng gom lô không chờ nó
+    if MICRO_BATCHER is None or detail != SCORING_DETAIL or profile:
+        return _predict_one(lambda text, times=None: preprocess_and_predict(text, times=times, detail=detail), profile)
+    with MICRO_BATCHER.incoming() as score:
+        return _predict_one(score)
+
+def _predict_one(score, profile: bool = False) -> Response:
     try:
         data = request.get_json(force=True) or {}
         text = data.get("text", "")
-        result = preprocess_and_predict(text)
+        times = StageTimes() if profile else None
+        t0 = time.perf_counter()
+        result = score(text) if times is None else score(text, times=times)
         result["chart"] = {"labels": ["Input"], "probabilities": [result["probability_profane"] if isinstance(result["probability_profane"], (int, float)) else (100.0 if result["prediction"]==1 else 0.0)]}
+        if times is not None:
+            result["profile"] = {
+                "stages_ms": times.as_ms(),
+                "total_ms": round((time.perf_counter() - t0) * 1000, 3),
+                "model_version": MODEL_VERSION,
+                "dict_version": _dictionaries().version,
+            }
         return jsonify(result)
+    except Overloaded as e:
+        return jsonify({"error": str(e)}), 503, {"Retry-After": "1"}
     except Exception as e:
         return jsonify({"error": str(e)}), 400
 
+# số dòng mỗi lô khi phân tích file theo luồng
+UPLOAD_CHUNK_SIZE = int(os.environ.get("UPLOAD_CHUNK_SIZE", "200"))
+
+def _request_detail() -> str:
+    detail = request.args.get("detail", SCORING_DETAIL).lower()
+    if detail not in SCORING_DETAILS:
+        raise ValueError(f"detail phải là một trong: {', '.join(SCORING_DETAILS)}")
+    return detail
+
+def _wants_stream() -> bool:
+    return (request.args.get("stream", "").lower() in {"1", "true", "ndjson"}
+            or "application/x-ndjson" in request.headers.get("Accept", ""))
+
+def _ndjson(obj: Dict[str, Any]) -> str:
+    return json.dumps(obj, ensure_ascii=False) + "\n"
+
+def _stream_predictions(segments: Iterable[Segment], detail: str = SCORING_DETAIL):
+    """Chấm từng lô UPLOAD_CHUNK_SIZE dòng và trả ngay mỗi lô (NDJSON, mỗi dòng một item)."""
+    count = 0
+    stats = DedupStats()
+    try:
+        for scored in _iter_scored_batches(segments, UPLOAD_CHUNK_SIZE, stats, detail):
+            lines = []
+            for t, loc, res in scored:
+                lines.append(_ndjson({"index": count, "text": t, **res, "location": loc}))
+                count += 1
+            yield "".join(lines)
+    except Exception as e:
+        yield _ndjson({"error": str(e)})
+    yield _ndjson({"done": True, "count": count, "dedup": stats.as_dict()})
+
 @app.route("/api/upload", methods=["POST"])
 def api_upload():
     """
     Nhận file CSV/TXT/XLSX/DOCX/PDF và phân tích hàng loạt (tối đa 200 dòng).
-    DOCX: đọc từng paragraph, PDF: trích text toàn bộ rồi tách dòng.
+    DOCX: đọc từng paragraph, PDF: trích text từng trang (song song theo nhóm
+    trang với PDF lớn) rồi tách dòng; file được đọc thẳng từ bộ nhớ.
+    Mỗi item có "location" = vị trí trong file gốc ({"page", "line"},
+    {"paragraph"}, {"row"} hoặc {"line"}).
+    `?stream=1` (hoặc Accept: application/x-ndjson): không giới hạn số dòng,
+    đọc file theo lô và trả kết quả dần dạng NDJSON.
+    `?detail=label|probability|full` như /api/predict.
     """
     try:
         if "file" not in request.files:
             return jsonify({"error": "Thiếu file upload (field name: file)."}), 400
         f = request.files["file"]
-        filename = f.filename or ""
-        ext = filename.split(".")[-1].lower()
-
-        df = None
-        texts: List[str] = []
-
-        if ext in {"csv"}:
-            df = pd.read_csv(f)
-        elif ext in {"xlsx", "xls"}:
-            df = pd.read_excel(f)
-        elif ext in {"txt"}:
-            content = f.read().decode("utf-8", errors="ignore")
-            texts = [line.strip() for line in content.splitlines() if line.strip()]
-        elif ext in {"docx", "pdf"}:
-            # lưu tạm để lib xử lý
-            with tempfile.NamedTemporaryFile(delete=False, suffix="."+ext) as tmp:
-                tmp_path = tmp.name
-                f.save(tmp_path)
-            try:
-                if ext == "docx":
-                    doc = Document(tmp_path)
-                    texts = [p.text.strip() for p in doc.paragraphs if p.text and p.text.strip()]
-                else:
-                    from pdfminer.high_level import extract_text
-                    content = extract_text(tmp_path) or ""
-                    texts = [line.strip() for line in content.splitlines() if line.strip()]
-            finally:
-                try:
-                    os.remove(tmp_path)
-                except Exception:
-                    pass
-        else:
-            return jsonify({"error": "Định dạng không hỗ trợ. Hãy dùng CSV/TXT/XLSX/DOCX/PDF."}), 400
-
-        if df is not None:
-            text_col, _ = _detect_columns(df)
-            if text_col is None:
-                obj_cols = [c for c in df.columns if df[c].dtype == 'object']
-                if not obj_cols:
-                    return jsonify({"error": "Không tìm thấy cột văn bản trong file."}), 400
-                text_col = obj_cols[0]
-            texts = df[text_col].astype(str).tolist()
-
-        result = batch_predict_texts(texts, limit=200)
+        detail = _request_detail()
+        segments = iter_upload_segments(f.stream, f.filename or "", _detect_columns)
+
+        if _wants_stream():
+            return Response(stream_with_context(_stream_predictions(segments, detail)),
+                            mimetype="application/x-ndjson")
+
+        head = list(islice(segments, 200))
+        result = batch_predict_texts(
+            [t for t, _ in head], limit=200, locations=[loc for _, loc in head], detail=detail
+        )
         return jsonify(result)
     except Exception as e:
         return jsonify({"error": str(e)}), 400
 
+# ---- Job chạy nền cho file lớn ----
+_job_manager: Optional[JobManager] = None
+_job_manager_lock = threading.Lock()
+
+def get_job_manager() -> JobManager:
+    """Tạo JobManager lần đầu dùng và chạy tiếp các job dở dang từ lần chạy trước."""
+    global _job_manager
+    with _job_manager_lock:
+        if _job_manager is None:
+            _job_manager = JobManager()
+            _job_manager.recover()
+        return _job_manager
+
+def _job_status(job: Dict[str, Any]) -> Dict[str, Any]:
+    return {k: job[k] for k in ("id", "status", "source", "total", "done", "error", "created_at", "updated_at")}
+
+@app.route("/api/jobs", methods=["POST"])
+def api_jobs_create():
+    """
+    Tạo job phân tích nền: multipart { file } hoặc JSON { texts: [...] }.
+    Trả về job id ngay (202), theo dõi bằng GET /api/jobs/<id>.
+    """
+    try:
+        manager = get_job_manager()
+        if "file" in request.files:
+            f = request.files["file"]
+            ext = (f.filename or "").split(".")[-1].lower()
+            if ext not in SUPPORTED_EXTS:
+                return jsonify({"error": "Định dạng không hỗ trợ. Hãy dùng CSV/TXT/XLSX/DOCX/PDF."}), 400
+            job_id = manager.submit_file(f.stream, f.filename or "")
+        else:
+            data = request.get_json(force=True, silent=True) or {}
+            texts = data.get("texts")
+            if not isinstance(texts, list) or not texts:
+                return jsonify({"error": "Cần file upload (field name: file) hoặc JSON {texts: [...]}."}), 400
+            job_id = manager.submit_texts(texts)
+        return jsonify({"job_id": job_id, "status": "queued"}), 202
+    except Exception as e:
+        return jsonify({"error": str(e)}), 400
+
+@app.route("/api/jobs/<job_id>", methods=["GET"])
+def api_jobs_status(job_id: str):
+    """Tiến độ + kết quả từng phần (?offset=&limit=, mặc định 200 item đầu)."""
+    store = get_job_manager().store
+    job = store.get(job_id)
+    if job is None:
+        return jsonify({"error": "Không tìm thấy job."}), 404
+    offset = request.args.get("offset", 0, type=int)
+    limit = request.args.get("limit", 200, type=int)
+    return jsonify({**_job_status(job), "items": store.results(job_id, offset=offset, limit=limit)})
+
+@app.route("/api/jobs/<job_id>/result", methods=["GET"])
+def api_jobs_result(job_id: str):
+    """Kết quả đầy đủ (cùng định dạng /api/upload) khi job đã xong."""
+    store = get_job_manager().store
+    job = store.get(job_id)
+    if job is None:
+        return jsonify({"error": "Không tìm thấy job."}), 404
+    if job["status"] != "done":
+        return jsonify(_job_status(job)), 409
+    return jsonify({**_batch_result(store.results(job_id)), "job": _job_status(job)})
+
+# ---- Xuất báo cáo (DOCX / XLSX / CSV / HTML) ----
+def _export_source(data: Dict[str, Any]):
+    """
+    Item cần xuất: kết quả job nền (`job_id`, đọc dần từ kho job) hoặc danh
+    sách `items` client gửi lên. Trả (items, None) hoặc (None, (lỗi, mã HTTP)).
+    """
+    job_id = data.get("job_id")
+    if job_id:
+        store = get_job_manager().store
+        job = store.get(str(job_id))
+        if job is None:
+            return None, ("Không tìm thấy job.", 404)
+        if job["status"] != "done":
+            return None, (f"Job chưa xong (trạng thái: {job['status']}).", 409)
+        return store.iter_results(job["id"]), None
+    items = data.get("items", [])
+    if not isinstance(items, list) or not items:
+        return None, ("Không có dữ liệu items để xuất.", 400)
+    return items, None
+
+def _export_response(fmt: str, items) -> Response:
+    mimetype, filename = EXPORT_FORMATS[fmt]
+    items = iter_report_items(items)
+    if fmt in STREAMING_FORMATS:
+        chunks = iter_csv(items) if fmt == "csv" else iter_html(items, make_highlight_html)
+        return Response(stream_with_context(chunks), mimetype=mimetype,
+                        headers={"Content-Disposition": f'attachment; filename="{filename}"'})
+    fp = spooled_report(fmt, items)
+    response = send_file(fp, mimetype=mimetype, as_attachment=True, download_name=filename)
+    response.call_on_close(fp.close)  # đóng = giải phóng bộ đệm, không để lại file tạm
+    return response
+
+def _export(data: Dict[str, Any], fmt: str):
+    fmt = (fmt or "docx").lower()
+    if fmt not in EXPORT_FORMATS:
+        return jsonify({"error": f"format phải là một trong: {', '.join(EXPORT_FORMATS)}."}), 400
+    items, error = _export_source(data)
+    if error is not None:
+        return jsonify({"error": error[0]}), error[1]
+    return _export_response(fmt, items)
+
+@app.route("/api/export", methods=["POST"])
+def api_export():
+    """
+    Xuất báo cáo có highlight. JSON {items: [...]} hoặc {job_id: "..."} (kết quả
+    job nền, không cần gửi lại); `format` (trong JSON hoặc ?format=) = docx |
+    xlsx | csv | html, mặc định docx. CSV/HTML trả dạng streaming.
+    """
+    try:
+        data = request.get_json(force=True) or {}
+        return _export(data, request.args.get("format") or data.get("format"))
+    except Exception as e:
+        return jsonify({"error": str(e)}), 400
+
 @app.route("/api/export_docx", methods=["POST"])
 def api_export_docx():
     """
     Nhận JSON {items:[{text:str, spans:[{start,end,text,...}], probability_profane, prediction}, ...]}
-    và trả về file DOCX có highlight phần bị gắn cờ.
+    (hoặc {job_id}) và trả về file DOCX có highlight phần bị gắn cờ.
     """
     try:
-        data = request.get_json(force=True) or {}
-        items = data.get("items", [])
-        if not isinstance(items, list) or not items:
-            return jsonify({"error": "Không có dữ liệu items để xuất."}), 400
-
-        doc = Document()
-        doc.add_heading("BÁO CÁO PHÂN TÍCH NGÔN TỪ XÚC PHẠM", level=1)
-
-        for it in items:
-            text = str(it.get("text", ""))
-            spans = it.get("spans", []) or []
-            prob = it.get("probability_profane", None)
-            pred = it.get("prediction", 0)
-
-            title = f"• Dòng #{int(it.get('index', 0))+1} — Xác suất: {prob if prob is not None else 'N/A'}% — Kết luận: {'Xúc phạm' if pred==1 else 'Không'}"
-            doc.add_paragraph(title)
-
-            # paragraph có highlight
-            p = doc.add_paragraph()
-            last = 0
-            spans_sorted = sorted(spans, key=lambda s: (s["start"], s["end"]))
-            for s in spans_sorted:
-                # phần trước span
-                if s["start"] > last:
-                    r = p.add_run(text[last:s["start"]])
-                # span
-                r = p.add_run(text[s["start"]:s["end"]])
-                r.font.highlight_color = WD_COLOR_INDEX.YELLOW
-                last = s["end"]
-            # phần còn lại
-            if last < len(text):
-                p.add_run(text[last:])
-
-        # lưu file tạm và trả về
-        tmp = tempfile.NamedTemporaryFile(delete=False, suffix=".docx")
-        tmp.close()
-        doc.save(tmp.name)
-        return send_file(tmp.name, as_attachment=True, download_name="bao_cao_highlight.docx")
+        return _export(request.get_json(force=True) or {}, "docx")
+    except Exception as e:
+        return jsonify({"error": str(e)}), 400
+
+@app.route("/api/jobs/<job_id>/export", methods=["GET"])
+def api_jobs_export(job_id: str):
+    """Tải báo cáo kết quả job (?format=csv|xlsx|html|docx, mặc định csv)."""
+    try:
+        return _export({"job_id": job_id}, request.args.get("format", "csv"))
     except Exception as e:
         return jsonify({"error": str(e)}), 400
 
+@app.cli.command("train-model")
+def train_model_command():
+    """Huấn luyện lại mô hình và ghi artifact mới (flask --app app train-model)."""
+    manifest = load_model(force_retrain=True)
+    print(f"Đã lưu artifact phiên bản {manifest['version']}")
+
+def is_ready() -> bool:
+    """Đã nạp xong mô hình (readiness): trước đó /healthz trả 503."""
+    return tfidf_vectorizer is not None and model is not None
+
+_background_load_started = False
+_background_load_lock = threading.Lock()
+
+def _start_background_load() -> None:
+    # server không gọi create_app (vd. `flask run`): nạp mô hình trong nền khi bị hỏi readiness
+    global _background_load_started
+    with _background_load_lock:
+        if _background_load_started:
+            return
+        _background_load_started = True
+    threading.Thread(target=ensure_model, name="model-load", daemon=True).start()
+
 @app.route("/healthz")
 def healthz():
-    return jsonify({"status": "ok"})
+    """Liveness + readiness: `ready` false (HTTP 503) cho tới khi mô hình được nạp."""
+    ready = is_ready()
+    body: Dict[str, Any] = {
+        "status": "ok" if ready else "starting",
+        "ready": ready,
+        "model_version": MODEL_VERSION,
+        "model_runtime": ("compact" if isinstance(model, CompactClassifier) else "sklearn") if ready else None,
+        "startup_ms": STARTUP_MS,
+        "result_cache": RESULT_CACHE.stats(),
+    }
+    if not ready:
+        _start_background_load()
+        return jsonify(body), 503
+    body["dictionary"] = _dictionaries().info()
+    return jsonify(body)
+
+@app.route("/metrics")
+def metrics_endpoint():
+    """Prometheus text format: histogram công đoạn / request, counter, gauge cache + phiên bản."""
+    cache = RESULT_CACHE.stats()
+    dicts = _dictionaries()
+    gauges = [
+        ("model_info", "Phiên bản mô hình đang phục vụ", {
+            "version": str(MODEL_VERSION),
+            "runtime": "compact" if isinstance(model, CompactClassifier) else "sklearn",
+        }, 1),
+        ("dictionary_info", "Phiên bản từ điển đang dùng (hash nội dung)", {"version": dicts.version}, 1),
+        ("dictionary_entries", "Số mục viết tắt trong từ điển đang dùng", {}, len(dicts.norm_dict)),
+        ("result_cache_items", "Số mục trong cache kết quả", {}, cache["items"]),
+        ("result_cache_bytes", "Dung lượng ước lượng của cache kết quả", {}, cache["bytes"]),
+        ("result_cache_hits", "Số lần trúng cache (tiến trình này)", {}, cache["hits"]),
+        ("result_cache_misses", "Số lần trượt cache (tiến trình này)", {}, cache["misses"]),
+        ("result_cache_evictions", "Số mục bị đẩy ra (tiến trình này)", {}, cache["evictions"]),
+        ("result_cache_hit_rate", "Tỉ lệ trúng cache (tiến trình này)", {}, cache["hit_rate"]),
+    ]
+    return Response(metrics.REGISTRY.render(gauges), mimetype="text/plain; version=0.0.4")
+
+# =========================
+# 6) CHẠY PRODUCTION (WSGI)
+# =========================
+_WARMUP_TEXTS = ["khởi động mô hình", "dm bài này"]
+
+def _warmup() -> None:
+    # chạy thử một lô để dựng sẵn explainer, bộ chuẩn hoá, chỉ mục viết tắt
+    _predict_batch(_WARMUP_TEXTS)
+
+def reload_resources() -> Dict[str, Any]:
+    """
+    Đọc lại file từ điển, nạp lại mô hình khớp với nó (artifact hiện tại; train
+    lại nếu hash lệch) mà không ngừng phục vụ: bản mới dựng xong mới thay vào,
+    request đang chạy dùng nốt bản cũ; cache kết quả được xoá.
+    """
+    dicts = DICT_STORE.build()
+    manifest = load_model(dicts=dicts)
+    RESULT_CACHE.clear()
+    _warmup()
+    return {"model_version": manifest["version"], "dict_version": dicts.version}
+
+def _swap_dictionaries(dicts: DictionarySnapshot) -> None:
+    """
+    Watcher của DICT_STORE gọi khi file từ điển đổi: nạp (hoặc huấn luyện) mô
+    hình cho từ điển mới trong luồng nền rồi thay cả hai cùng lúc.
+    """
+    manifest = load_model(dicts=dicts)
+    RESULT_CACHE.clear()
+    _warmup()
+    app.logger.info("Đã nạp từ điển %s (%d mục viết tắt), mô hình %s",
+                    dicts.version, len(dicts.norm_dict), manifest["version"])
+
+def refresh_dictionaries() -> bool:
+    """Kiểm tra file từ điển ngay (tiến trình không có watcher, vd. worker job); True nếu đã đổi."""
+    dicts = DICT_STORE.check()
+    if dicts is None:
+        return False
+    _swap_dictionaries(dicts)
+    return True
+
+# thời gian (ms) từng pha khởi động của create_app; đo cả phần import: benchmarks/startup_profile.py
+STARTUP_MS: Dict[str, float] = {}
+
+def start_dictionary_watcher() -> None:
+    """Luồng nền đổi nóng từ điển cho tiến trình này (DICT_WATCH_INTERVAL, gọi lại an toàn)."""
+    DICT_STORE.start_watcher(_swap_dictionaries)
+
+def create_app(preload: bool = True, watch: bool = True) -> Flask:
+    """
+    App factory cho server WSGI (xem wsgi.py, gunicorn.conf.py).
+
+    preload=True: nạp mô hình và dựng sẵn mọi chỉ mục ngay trong tiến trình gọi.
+    Với gunicorn `preload_app`, việc này chạy MỘT lần ở master; các worker fork
+    ra dùng chung bộ nhớ đó (copy-on-write) và request đầu không phải chờ nạp.
+    Thời gian từng pha (từ điển, mô hình, warmup) xem ở /healthz `startup_ms`.
+    Pool job nền / chấm song song vẫn tạo lười trong từng worker sau khi fork.
+    watch=True: bật watcher đổi nóng từ điển ngay trong tiến trình này; gunicorn
+    (wsgi.py) tắt ở master và bật trong từng worker sau khi fork (post_fork).
+    """
+    if preload:
+        for phase, step in (("dictionaries", _dictionaries), ("model", ensure_model), ("warmup", _warmup)):
+            t0 = time.perf_counter()
+            step()
+            STARTUP_MS[phase] = round((time.perf_counter() - t0) * 1000, 1)
+    if watch:
+        start_dictionary_watcher()
+    return app
+
+@app.route("/admin/reload", methods=["POST"])
+def admin_reload():
+    """
+    Nạp lại mô hình + từ điển trong tiến trình này (server một tiến trình).
+    Chỉ bật khi đặt ADMIN_TOKEN, gửi kèm header X-Admin-Token. Với gunicorn
+    dùng `kill -HUP <master>` để mọi worker cùng nhận bản mới.
+    """
+    token = os.environ.get("ADMIN_TOKEN", "")
+    if not token:
+        return jsonify({"error": "Not found"}), 404
+    if not hmac.compare_digest(request.headers.get("X-Admin-Token", ""), token):
+        return jsonify({"error": "Sai token."}), 403
+    try:
+        return jsonify({"status": "reloaded", **reload_resources()})
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
 
 if __name__ == "__main__":
+    ensure_model()
+    start_dictionary_watcher()
+    get_job_manager()
     app.run(host="127.0.0.1", port=5000, debug=True)
 
 # =========================
\ No newline at end of file
@@ -0,0 +1,87 @@
+# -*- coding: utf-8 -*-
+"""
+Micro-benchmark: độ trễ dò lexicon theo kích thước từ điển (20 -> 5.000 từ khoá).
+
+So sánh cách cũ (mỗi từ khoá một regex + finditer) với `LexiconMatcher` (một regex
+dạng trie, quét một lượt). Từ khoá lấy từ master_dict_data.csv, thiếu thì sinh thêm.
+
+Chạy:
+    python benchmarks/bench_lexicon.py
+    python benchmarks/bench_lexicon.py --sizes 20 100 1000 5000 --repeat 5
+"""
+import argparse, csv, os, random, sys, time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from lexicon_matcher import LexiconMatcher, term_to_regex  # noqa: E402
+
+
+def load_terms(n: int):
+    terms = []
+    with open(os.path.join(ROOT, "master_dict_data.csv"), encoding="utf-8") as f:
+        for row in csv.DictReader(f):
+            for t in (row.get("abb"), row.get("meaning")):
+                t = (t or "").strip()
+                if t and t not in terms:
+                    terms.append(t)
+    rnd = random.Random(0)
+    alphabet = "abcdeghiklmnopqrstuvxyđăâêôơư"
+    while len(terms) < n:
+        w = " ".join(
+            "".join(rnd.choice(alphabet) for _ in range(rnd.randint(2, 6)))
+            for _ in range(rnd.randint(1, 3))
+        )
+        if rnd.random() < 0.05:
+            w = w[0] + "*" + w[-1]
+        terms.append(w)
+    return terms[:n]
+
+
+def load_texts():
+    texts = []
+    with open(os.path.join(ROOT, "data_eval.csv"), encoding="utf-8") as f:
+        for row in csv.DictReader(f):
+            texts.append(row["text"])
+    return texts
+
+
+def bench(fn, texts, repeat):
+    best = float("inf")
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        for t in texts:
+            fn(t)
+        best = min(best, time.perf_counter() - t0)
+    return best / len(texts) * 1e6  # µs / văn bản
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--sizes", type=int, nargs="+", default=[20, 100, 500, 1000, 2000, 5000])
+    ap.add_argument("--repeat", type=int, default=3)
+    args = ap.parse_args()
+
+    texts = load_texts()
+    all_terms = load_terms(max(args.sizes))
+    print(f"{len(texts)} văn bản (data_eval.csv), best-of-{args.repeat}")
+    print("| Số từ khoá | Build trie (ms) | Cũ: per-term (µs/văn bản) | Mới: một lượt (µs/văn bản) | Tăng tốc |")
+    print("|---:|---:|---:|---:|---:|")
+    for n in args.sizes:
+        terms = all_terms[:n]
+        patterns = [term_to_regex(t) for t in terms]
+
+        def old(text):
+            return [(m.start(), m.end()) for p in patterns for m in p.finditer(text)]
+
+        t0 = time.perf_counter()
+        matcher = LexiconMatcher(terms)
+        build_ms = (time.perf_counter() - t0) * 1e3
+
+        old_us = bench(old, texts, args.repeat)
+        new_us = bench(lambda text: list(matcher.finditer(text)), texts, args.repeat)
+        print(f"| {n} | {build_ms:.1f} | {old_us:.1f} | {new_us:.1f} | {old_us / new_us:.1f}x |")
+
+
+if __name__ == "__main__":
+    main()
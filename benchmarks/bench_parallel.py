@@ -0,0 +1,76 @@
+# -*- coding: utf-8 -*-
+"""
+Benchmark: thông lượng chấm điểm (văn bản/giây) theo số worker, 1 -> N lõi.
+
+Hai bộ dữ liệu:
+- "train"  : cỡ data_train (labeled_train_data.csv, ~1.2k dòng)
+- "x100"   : 100 lần cỡ đó, sinh bằng cách ghép ngẫu nhiên các câu thật
+
+Mốc "serial" là `app._predict_batch` trong một tiến trình (như khi tắt
+PARALLEL_WORKERS). Các mốc còn lại dùng `ParallelScorer` (mô hình compact mmap);
+thời gian khởi động pool (spawn + import app) không tính vào phép đo.
+
+Chạy:
+    python benchmarks/bench_parallel.py
+    python benchmarks/bench_parallel.py --workers 1 2 4 8 --corpus x100
+"""
+import argparse, csv, os, random, sys, time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+
+def load_texts():
+    with open(os.path.join(ROOT, "labeled_train_data.csv"), encoding="utf-8") as f:
+        return [row["text"] for row in csv.DictReader(f)]
+
+
+def synthetic(base, factor, seed=0):
+    rnd = random.Random(seed)
+    out = []
+    for _ in range(len(base) * factor):
+        k = rnd.randint(1, 3)
+        out.append(" ".join(rnd.choice(base) for _ in range(k)))
+    return out
+
+
+def timed(fn, texts):
+    t0 = time.perf_counter()
+    fn(texts)
+    return len(texts) / (time.perf_counter() - t0)
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--workers", type=int, nargs="+",
+                    default=sorted({1, 2, 4, os.cpu_count() or 1}))
+    ap.add_argument("--corpus", nargs="+", choices=["train", "x100"], default=["train", "x100"])
+    ap.add_argument("--chunk-size", type=int, default=250)
+    args = ap.parse_args()
+
+    import app
+    from parallel_scoring import ParallelScorer
+
+    app.ensure_model()
+    base = load_texts()
+    corpora = {"train": base, "x100": synthetic(base, 100)}
+    print(f"cpu_count={os.cpu_count()}  model={app.MODEL_VERSION}")
+
+    for name in args.corpus:
+        texts = corpora[name]
+        serial = timed(app._predict_batch, texts)
+        print(f"\n[{name}] {len(texts)} văn bản")
+        print(f"{'workers':>8} {'texts/s':>10} {'speedup':>8}")
+        print(f"{'serial':>8} {serial:>10.0f} {1.0:>8.2f}")
+        for n in args.workers:
+            scorer = ParallelScorer(n, chunk_size=args.chunk_size)
+            try:
+                scorer.warmup()
+                rate = timed(scorer.score, texts)
+            finally:
+                scorer.shutdown()
+            print(f"{n:>8} {rate:>10.0f} {rate / serial:>8.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,335 @@
+# -*- coding: utf-8 -*-
+"""
+Bộ benchmark cho các đường nóng của app, chạy offline, lưu kết quả JSON làm mốc
+và so sánh hai mốc để bắt chỗ chậm đi.
+
+Các case (mỗi case chạy trên từng corpus):
+- lexicon, abbrev, ml_spans   : find_spans_lexicon / find_spans_abbrev / find_spans_ml
+- merge_spans, highlight_html : _merge_spans / make_highlight_html (span dựng sẵn)
+- predict                     : preprocess_and_predict từng văn bản
+- batch_predict               : batch_predict_texts theo lô 200 dòng (như /api/upload)
+- upload, upload_stream       : POST /api/upload qua Flask test client
+                                (file 200 dòng / file 10k dòng ?stream=1)
+- export_docx                 : POST /api/export_docx, 200 item mỗi file, tối đa 10k item
+- eval_fold                   : eval_offensive.eval_fold trên một lần chia 80/20
+
+Corpus: data_train (data_train.csv — thực chất là file XLSX, cột cmt),
+labeled_train (labeled_train_data.csv) và synth-10k / synth-100k / synth-1m
+(ghép ngẫu nhiên 1-3 câu thật, nhãn = có câu xúc phạm). Cache kết quả và chấm
+song song bị tắt để đo đúng phần tính toán.
+
+Văn bản được xử lý theo khối: phần chuẩn bị (tạo span, dựng file upload, ...)
+không tính giờ; mỗi khối đo `--repeat` lần lấy nhanh nhất, cộng các khối lại.
+File JSON được ghi lại sau mỗi case. eval_fold giữ cả corpus trong bộ nhớ
+(~0.5 GB mỗi 100k văn bản): synth-1m cần khoảng 6 GB RAM.
+
+Chạy:
+    python benchmarks/bench_suite.py run                                  # data_train, labeled_train, synth-10k
+    python benchmarks/bench_suite.py run --sizes 10k 100k 1m --out benchmarks/baselines/big.json
+    python benchmarks/bench_suite.py run --cases lexicon abbrev --corpus labeled_train --out /tmp/new.json
+    python benchmarks/bench_suite.py compare benchmarks/baselines/baseline.json /tmp/new.json --threshold 0.15
+"""
+import argparse, csv, io, json, os, platform, random, statistics, subprocess, sys, time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+# đo phần tính toán: không cache, không pool tiến trình, không ghi snapshot số đo
+os.environ["RESULT_CACHE_SIZE"] = "0"
+os.environ["PARALLEL_WORKERS"] = "0"
+os.environ.pop("METRICS_DIR", None)
+
+DEFAULT_OUT = os.path.join(ROOT, "benchmarks", "baselines", "baseline.json")
+SIZES = {"10k": 10_000, "100k": 100_000, "1m": 1_000_000}
+CHUNK = 10_000
+REQUEST_ROWS = 200
+DOCX_CAP = 10_000
+
+
+# =========================
+# Corpus
+# =========================
+def _read_table(path):
+    import pandas as pd
+
+    try:
+        return pd.read_csv(path)
+    except (UnicodeDecodeError, pd.errors.ParserError):
+        return pd.read_excel(path)  # data_train.csv thực chất là XLSX
+
+
+def load_data_train(app):
+    df = _read_table(os.path.join(ROOT, "data_train.csv"))
+    text_col = "cmt" if "cmt" in df.columns else app._detect_columns(df)[0]
+    texts = df[text_col].dropna().astype(str).tolist()
+    # không có cột nhãn -> gán nhãn theo lexicon như train_model
+    labels = [int(app._dictionaries().lexicon.search(app.normalize_text(t))) for t in texts]
+    return texts, labels
+
+
+def load_labeled_train():
+    with open(os.path.join(ROOT, "labeled_train_data.csv"), encoding="utf-8") as f:
+        rows = list(csv.DictReader(f))
+    return [r["text"] for r in rows], [int(r["label"]) for r in rows]
+
+
+def synthetic(base_texts, base_labels, n, seed=0):
+    rnd = random.Random(seed)
+    texts, labels = [], []
+    m = len(base_texts)
+    for _ in range(n):
+        idx = [rnd.randrange(m) for _ in range(rnd.randint(1, 3))]
+        texts.append(" ".join(base_texts[i] for i in idx))
+        labels.append(max(base_labels[i] for i in idx))
+    return texts, labels
+
+
+def build_corpora(app, names, sizes):
+    base = load_labeled_train()
+    corpora = {}
+    if "data_train" in names:
+        corpora["data_train"] = load_data_train(app)
+    if "labeled_train" in names:
+        corpora["labeled_train"] = base
+    for s in sizes:
+        corpora[f"synth-{s}"] = synthetic(*base, SIZES[s])
+    return corpora
+
+
+# =========================
+# Đo
+# =========================
+def measure(texts, setup, run, repeat, chunk=CHUNK):
+    """Σ theo khối của (nhanh nhất / trung vị) `repeat` lần chạy `run(setup(khối))`."""
+    best = median = 0.0
+    n = 0
+    for i in range(0, len(texts), chunk):
+        part = texts[i:i + chunk]
+        prep = setup(part)
+        times = []
+        for _ in range(repeat):
+            t0 = time.perf_counter()
+            run(prep)
+            times.append(time.perf_counter() - t0)
+        best += min(times)
+        median += statistics.median(times)
+        n += len(part)
+    return n, best, median
+
+
+def _csv_bytes(texts):
+    buf = io.StringIO()
+    w = csv.writer(buf)
+    w.writerow(["text"])
+    w.writerows([t] for t in texts)
+    return buf.getvalue().encode("utf-8")
+
+
+def make_cases(app, client):
+    def ml_setup(part):
+        vec, clf, _ = app._current_model()
+        return vec, clf, [(t, app.normalize_text(t)) for t in part]
+
+    def ml_run(prep):
+        vec, clf, pairs = prep
+        for t, nt in pairs:
+            app.find_spans_ml(t, nt, clf, vec)
+
+    def raw_spans(part):
+        vec, clf, pairs = ml_setup(part)
+        return [
+            (t, app.find_spans_lexicon(t) + app.find_spans_abbrev(t) + app.find_spans_ml(t, nt, clf, vec))
+            for t, nt in pairs
+        ]
+
+    def merged_spans(part):
+        return [(t, app._merge_spans(s, t)) for t, s in raw_spans(part)]
+
+    def upload_setup(part):
+        return [_csv_bytes(part[i:i + REQUEST_ROWS]) for i in range(0, len(part), REQUEST_ROWS)]
+
+    def upload_run(files):
+        for data in files:
+            r = client.post("/api/upload", data={"file": (io.BytesIO(data), "bench.csv")})
+            assert r.status_code == 200, r.get_data(as_text=True)[:200]
+
+    def stream_run(data):
+        r = client.post("/api/upload?stream=1", data={"file": (io.BytesIO(data), "bench.csv")})
+        assert r.status_code == 200
+        r.get_data()
+
+    def docx_setup(part):
+        items = app.batch_predict_texts(part, limit=len(part))["items"]
+        return [items[i:i + REQUEST_ROWS] for i in range(0, len(items), REQUEST_ROWS)]
+
+    def docx_run(batches):
+        for items in batches:
+            r = client.post("/api/export_docx", json={"items": items})
+            assert r.status_code == 200, r.get_data(as_text=True)[:200]
+            r.get_data()
+
+    def batch_run(part):
+        for i in range(0, len(part), REQUEST_ROWS):
+            app.batch_predict_texts(part[i:i + REQUEST_ROWS], limit=REQUEST_ROWS)
+
+    same = lambda part: part
+    return {
+        "lexicon": (same, lambda p: [app.find_spans_lexicon(t) for t in p]),
+        "abbrev": (same, lambda p: [app.find_spans_abbrev(t) for t in p]),
+        "ml_spans": (ml_setup, ml_run),
+        "merge_spans": (raw_spans, lambda p: [app._merge_spans(s, t) for t, s in p]),
+        "highlight_html": (merged_spans, lambda p: [app.make_highlight_html(t, s) for t, s in p]),
+        "predict": (same, lambda p: [app.preprocess_and_predict(t) for t in p]),
+        "batch_predict": (same, batch_run),
+        "upload": (upload_setup, upload_run),
+        "upload_stream": (_csv_bytes, stream_run),
+        "export_docx": (docx_setup, docx_run),
+    }
+
+
+def bench_eval_fold(texts, labels, repeat):
+    import pandas as pd
+    from sklearn.model_selection import train_test_split
+
+    if len(set(labels)) < 2:
+        return None
+    import eval_offensive
+
+    df = pd.DataFrame({"text": texts, "label": labels})
+    tr, te = train_test_split(df, test_size=0.2, random_state=42, stratify=df["label"])
+    times = []
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        eval_offensive.eval_fold(tr, te, "text", "label")
+        times.append(time.perf_counter() - t0)
+    return len(df), min(times), statistics.median(times)
+
+
+ALL_CASES = ["lexicon", "abbrev", "ml_spans", "merge_spans", "highlight_html", "predict",
+             "batch_predict", "upload", "upload_stream", "export_docx", "eval_fold"]
+
+
+def _meta(repeat):
+    import numpy, sklearn
+
+    try:
+        commit = subprocess.check_output(["git", "-C", ROOT, "rev-parse", "--short", "HEAD"],
+                                         stderr=subprocess.DEVNULL).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+    return {
+        "created_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "commit": commit,
+        "python": platform.python_version(),
+        "numpy": numpy.__version__,
+        "sklearn": sklearn.__version__,
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "repeat": repeat,
+    }
+
+
+def cmd_run(args):
+    import app
+
+    app.ensure_model()
+    client = app.app.test_client()
+    corpora = build_corpora(app, args.corpus, args.sizes)
+    cases = make_cases(app, client)
+    results = {}
+    meta = _meta(args.repeat)
+    os.makedirs(os.path.dirname(os.path.abspath(args.out)), exist_ok=True)
+
+    def save(results):
+        tmp = args.out + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump({"meta": meta, "results": results}, f, ensure_ascii=False, indent=2)
+        os.replace(tmp, args.out)
+
+    print(f"{'case':<15} {'corpus':<14} {'items':>8} {'seconds':>9} {'µs/item':>10} {'items/s':>10}")
+    for cname, (texts, labels) in corpora.items():
+        for case in args.cases:
+            if case == "eval_fold":
+                out = bench_eval_fold(texts, labels, args.repeat)
+                if out is None:
+                    continue
+                n, best, med = out
+            else:
+                setup, run = cases[case]
+                sub = texts[:DOCX_CAP] if case == "export_docx" else texts
+                n, best, med = measure(sub, setup, run, args.repeat)
+            key = f"{case}/{cname}"
+            results[key] = {
+                "case": case, "corpus": cname, "items": n,
+                "seconds": round(best, 6), "median_seconds": round(med, 6),
+                "us_per_item": round(best / n * 1e6, 3), "items_per_s": round(n / best, 1) if best else None,
+            }
+            r = results[key]
+            print(f"{case:<15} {cname:<14} {n:>8} {best:>9.3f} {r['us_per_item']:>10.2f} {r['items_per_s']:>10.0f}",
+                  flush=True)
+            save(results)
+    print(f"\nĐã ghi {args.out}")
+    if args.compare:
+        return compare(args.compare, args.out, args.threshold)
+    return 0
+
+
+def compare(base_path, new_path, threshold):
+    """In tỉ lệ µs/item mới / cũ; trả 1 nếu có case chậm hơn quá `threshold`."""
+    with open(base_path, encoding="utf-8") as f:
+        base = json.load(f)
+    with open(new_path, encoding="utf-8") as f:
+        new = json.load(f)
+    for k in ("cpu_count", "platform", "python"):
+        if base["meta"].get(k) != new["meta"].get(k):
+            print(f"! Khác môi trường ({k}): {base['meta'].get(k)} -> {new['meta'].get(k)}")
+
+    slow = []
+    print(f"{'case/corpus':<32} {'base µs':>10} {'new µs':>10} {'ratio':>7}")
+    for key in sorted(set(base["results"]) & set(new["results"])):
+        a = base["results"][key]["us_per_item"]
+        b = new["results"][key]["us_per_item"]
+        ratio = b / a if a else float("inf")
+        flag = ""
+        if ratio > 1 + threshold:
+            flag = "  CHẬM HƠN"
+            slow.append(key)
+        elif ratio < 1 - threshold:
+            flag = "  nhanh hơn"
+        print(f"{key:<32} {a:>10.2f} {b:>10.2f} {ratio:>7.2f}{flag}")
+    for key in sorted(set(base["results"]) ^ set(new["results"])):
+        print(f"{key:<32} (chỉ có trong {'mốc cũ' if key in base['results'] else 'mốc mới'})")
+    if slow:
+        print(f"\n{len(slow)} case chậm hơn quá {threshold:.0%}: {', '.join(slow)}")
+        return 1
+    print(f"\nKhông case nào chậm hơn quá {threshold:.0%}.")
+    return 0
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    sub = ap.add_subparsers(dest="cmd", required=True)
+
+    run = sub.add_parser("run", help="chạy benchmark và ghi JSON")
+    run.add_argument("--cases", nargs="+", choices=ALL_CASES, default=ALL_CASES)
+    run.add_argument("--corpus", nargs="*", choices=["data_train", "labeled_train"],
+                     default=["data_train", "labeled_train"])
+    run.add_argument("--sizes", nargs="*", choices=list(SIZES), default=["10k"])
+    run.add_argument("--repeat", type=int, default=3)
+    run.add_argument("--out", default=DEFAULT_OUT)
+    run.add_argument("--compare", default=None, help="so với mốc này sau khi chạy")
+    run.add_argument("--threshold", type=float, default=0.15)
+
+    cmp_ = sub.add_parser("compare", help="so sánh hai file JSON")
+    cmp_.add_argument("base")
+    cmp_.add_argument("new")
+    cmp_.add_argument("--threshold", type=float, default=0.15, help="tỉ lệ chậm đi cho phép (0.15 = 15%%)")
+
+    args = ap.parse_args()
+    if args.cmd == "run":
+        sys.exit(cmd_run(args))
+    sys.exit(compare(args.base, args.new, args.threshold))
+
+
+if __name__ == "__main__":
+    main()
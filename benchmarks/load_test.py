@@ -0,0 +1,119 @@
+# -*- coding: utf-8 -*-
+"""
+Load test cho POST /api/predict trên một server đang chạy: đo RPS và độ trễ
+p50/p90/p99 theo số kết nối đồng thời. Chỉ dùng thư viện chuẩn.
+
+Văn bản lấy ngẫu nhiên từ labeled_train_data.csv. Mặc định mỗi request thêm một
+hậu tố ngẫu nhiên để không trúng cache kết quả (đo đường chấm thật);
+`--allow-cache` để đo cả hiệu ứng cache.
+
+Chạy:
+    gunicorn -c gunicorn.conf.py wsgi:app          # cửa sổ khác
+    python benchmarks/load_test.py --url http://127.0.0.1:8000 --concurrency 1 8 32 --duration 20
+    python benchmarks/load_test.py --requests 2000 --json-out load.json
+"""
+import argparse, csv, json, os, random, threading, time
+import urllib.error
+import urllib.request
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def load_texts():
+    with open(os.path.join(ROOT, "labeled_train_data.csv"), encoding="utf-8") as f:
+        return [row["text"] for row in csv.DictReader(f)]
+
+
+def percentile(sorted_values, q):
+    if not sorted_values:
+        return float("nan")
+    k = (len(sorted_values) - 1) * q
+    lo, hi = int(k), min(int(k) + 1, len(sorted_values) - 1)
+    return sorted_values[lo] + (sorted_values[hi] - sorted_values[lo]) * (k - lo)
+
+
+def run(url, texts, concurrency, duration, n_requests, allow_cache, timeout, seed=0):
+    endpoint = url.rstrip("/") + "/api/predict"
+    latencies, errors = [], []
+    lock = threading.Lock()
+    counter = iter(range(n_requests)) if n_requests else None
+    deadline = time.perf_counter() + duration
+
+    def worker(wid):
+        rnd = random.Random(seed * 1000 + wid)
+        local_lat, local_err = [], 0
+        while True:
+            if counter is not None:
+                with lock:
+                    if next(counter, None) is None:
+                        break
+            elif time.perf_counter() >= deadline:
+                break
+            text = rnd.choice(texts)
+            if not allow_cache:
+                text = f"{text} #{rnd.getrandbits(48):x}"
+            body = json.dumps({"text": text}, ensure_ascii=False).encode("utf-8")
+            req = urllib.request.Request(endpoint, data=body, headers={"Content-Type": "application/json"})
+            t0 = time.perf_counter()
+            try:
+                with urllib.request.urlopen(req, timeout=timeout) as resp:
+                    resp.read()
+                local_lat.append(time.perf_counter() - t0)
+            except (urllib.error.URLError, OSError):
+                local_err += 1
+        with lock:
+            latencies.extend(local_lat)
+            errors.append(local_err)
+
+    threads = [threading.Thread(target=worker, args=(i,), daemon=True) for i in range(concurrency)]
+    t0 = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    elapsed = time.perf_counter() - t0
+
+    lat = sorted(latencies)
+    ms = lambda q: round(percentile(lat, q) * 1000, 2)
+    return {
+        "concurrency": concurrency,
+        "requests": len(lat),
+        "errors": sum(errors),
+        "seconds": round(elapsed, 3),
+        "rps": round(len(lat) / elapsed, 1) if elapsed else 0.0,
+        "p50_ms": ms(0.50),
+        "p90_ms": ms(0.90),
+        "p99_ms": ms(0.99),
+        "max_ms": round(lat[-1] * 1000, 2) if lat else float("nan"),
+    }
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--url", default="http://127.0.0.1:8000")
+    ap.add_argument("--concurrency", type=int, nargs="+", default=[1, 4, 16])
+    ap.add_argument("--duration", type=float, default=10.0, help="giây cho mỗi mức đồng thời")
+    ap.add_argument("--requests", type=int, default=0, help="số request cố định (thay cho --duration)")
+    ap.add_argument("--warmup", type=int, default=20)
+    ap.add_argument("--timeout", type=float, default=30.0)
+    ap.add_argument("--allow-cache", action="store_true")
+    ap.add_argument("--json-out", default=None)
+    args = ap.parse_args()
+
+    texts = load_texts()
+    run(args.url, texts, 1, 0, args.warmup, args.allow_cache, args.timeout, seed=99)
+
+    rows = []
+    print(f"{'conc':>5} {'req':>7} {'err':>5} {'rps':>8} {'p50 ms':>8} {'p90 ms':>8} {'p99 ms':>8} {'max ms':>8}")
+    for c in args.concurrency:
+        r = run(args.url, texts, c, args.duration, args.requests, args.allow_cache, args.timeout)
+        rows.append(r)
+        print(f"{c:>5} {r['requests']:>7} {r['errors']:>5} {r['rps']:>8.1f} "
+              f"{r['p50_ms']:>8.2f} {r['p90_ms']:>8.2f} {r['p99_ms']:>8.2f} {r['max_ms']:>8.2f}")
+    if args.json_out:
+        with open(args.json_out, "w", encoding="utf-8") as f:
+            json.dump({"url": args.url, "allow_cache": args.allow_cache, "results": rows}, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,160 @@
+# -*- coding: utf-8 -*-
+"""
+Đo thời gian khởi động nguội của app trong tiến trình mới (như một worker vừa
+được autoscale, hoặc eval_offensive.py import app):
+
+- import theo từng gói (gom `python -X importtime` theo gói cấp cao nhất:
+  flask, numpy, ... — phần của chính repo tính theo tên module)
+- các pha của `create_app()`: từ điển, mô hình, warmup (app.STARTUP_MS)
+- request /api/predict đầu tiên
+- các thư viện nặng có bị import khi chưa cần không (pandas, sklearn, scipy,
+  docx, pdfminer, openpyxl chỉ nên nạp khi huấn luyện / upload / export)
+
+Mỗi lần chạy là một tiến trình riêng; báo trung vị của `--runs` lần. Tổng
+(import + create_app) vượt `--budget-ms` thì mã thoát 1, để theo dõi mục tiêu
+khởi động theo thời gian (lưu mốc bằng `--out`, so bằng `--compare`).
+
+Chạy:
+    python benchmarks/startup_profile.py
+    python benchmarks/startup_profile.py --runs 5 --budget-ms 800 --out benchmarks/baselines/startup.json
+    python benchmarks/startup_profile.py --compare benchmarks/baselines/startup.json
+"""
+import argparse, json, os, statistics, subprocess, sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+HEAVY_MODULES = ["pandas", "sklearn", "scipy", "docx", "pdfminer", "openpyxl"]
+MARKER = "@@startup@@"
+
+CHILD = r"""
+import json, sys, time
+t0 = time.perf_counter()
+import app
+import_ms = (time.perf_counter() - t0) * 1000
+app.create_app()
+client = app.app.test_client()
+t0 = time.perf_counter()
+client.post("/api/predict", json={"text": "mày ngu quá"})
+first_ms = (time.perf_counter() - t0) * 1000
+print(%r + json.dumps({
+    "phases": {"import": import_ms, **app.STARTUP_MS, "first_request": first_ms},
+    "heavy_loaded": sorted(m for m in %r if m in sys.modules),
+    "ready": app.is_ready(),
+}))
+""" % (MARKER, HEAVY_MODULES)
+
+
+def _parse_importtime(stderr):
+    """self-time (ms) gom theo gói cấp cao nhất từ output `-X importtime`."""
+    out = {}
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "imported package" in line:
+            continue
+        parts = line[len("import time:"):].split("|")
+        if len(parts) != 3:
+            continue
+        self_us, name = parts[0].strip(), parts[2].strip()
+        if not self_us.isdigit():
+            continue
+        top = name.split(".")[0]
+        out[top] = out.get(top, 0.0) + int(self_us) / 1000
+    return out
+
+
+def _child(importtime):
+    env = dict(os.environ, PYTHONPATH=ROOT + os.pathsep + os.environ.get("PYTHONPATH", ""))
+    env.pop("METRICS_DIR", None)
+    flags = ["-X", "importtime"] if importtime else []
+    proc = subprocess.run(
+        [sys.executable, *flags, "-c", CHILD],
+        cwd=ROOT, env=env, capture_output=True, text=True, encoding="utf-8",
+    )
+    line = next((l for l in proc.stdout.splitlines() if l.startswith(MARKER)), None)
+    if proc.returncode != 0 or line is None:
+        raise SystemExit(f"Tiến trình đo lỗi (mã {proc.returncode}):\n{proc.stderr[-2000:]}")
+    return json.loads(line[len(MARKER):]), proc.stderr
+
+
+def run_once():
+    # -X importtime tự làm chậm import: số đo từng pha lấy từ một lần chạy thường riêng
+    result, _ = _child(importtime=False)
+    _, stderr = _child(importtime=True)
+    result["imports"] = _parse_importtime(stderr)
+    return result
+
+
+def summarize(runs):
+    def median_of(key):
+        names = list(dict.fromkeys(n for r in runs for n in r[key]))
+        return {n: round(statistics.median(r[key].get(n, 0.0) for r in runs), 1) for n in names}
+
+    phases = median_of("phases")
+    total = round(statistics.median(
+        sum(v for k, v in r["phases"].items() if k != "first_request") for r in runs
+    ), 1)
+    return {
+        "runs": len(runs),
+        "total_ms": total,
+        "phases_ms": phases,
+        "imports_ms": dict(sorted(median_of("imports").items(), key=lambda kv: -kv[1])),
+        "heavy_loaded": sorted({m for r in runs for m in r["heavy_loaded"]}),
+        "ready": all(r["ready"] for r in runs),
+        "python": sys.version.split()[0],
+    }
+
+
+def report(summary, top):
+    print(f"Khởi động nguội (trung vị {summary['runs']} lần): {summary['total_ms']:.1f} ms (import + create_app)")
+    print("\nPha:")
+    for name, ms in summary["phases_ms"].items():
+        print(f"  {name:<16}{ms:>9.1f} ms")
+    print(f"\nImport theo gói (top {top}, self-time):")
+    for name, ms in list(summary["imports_ms"].items())[:top]:
+        print(f"  {name:<24}{ms:>9.1f} ms")
+    heavy = summary["heavy_loaded"]
+    print("\nThư viện nặng đã nạp khi khởi động:", ", ".join(heavy) if heavy else "không")
+    if not summary["ready"]:
+        print("CẢNH BÁO: /healthz chưa ready sau create_app()")
+
+
+def compare(base_path, summary):
+    with open(base_path, encoding="utf-8") as f:
+        base = json.load(f)
+    print(f"\nSo với {base_path}:")
+    rows = [("total", base["total_ms"], summary["total_ms"])]
+    rows += [(k, base["phases_ms"].get(k), v) for k, v in summary["phases_ms"].items()]
+    for name, old, new in rows:
+        if old:
+            print(f"  {name:<16}{old:>9.1f} -> {new:>9.1f} ms  ({new / old:.2f}x)")
+        else:
+            print(f"  {name:<16}{'—':>9} -> {new:>9.1f} ms")
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--runs", type=int, default=3)
+    ap.add_argument("--top", type=int, default=15, help="số gói import hiển thị")
+    ap.add_argument("--budget-ms", type=float, default=float(os.environ.get("STARTUP_BUDGET_MS", "1000")),
+                    help="mục tiêu import + create_app (ms); vượt thì mã thoát 1")
+    ap.add_argument("--out", default=None, help="ghi kết quả JSON (mốc)")
+    ap.add_argument("--compare", default=None, help="so với mốc JSON này")
+    args = ap.parse_args()
+
+    run_once()  # lần đầu có thể phải huấn luyện / ghi cache từ điển: không tính
+    summary = summarize([run_once() for _ in range(max(args.runs, 1))])
+    summary["budget_ms"] = args.budget_ms
+    report(summary, args.top)
+    if args.compare:
+        compare(args.compare, summary)
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            json.dump(summary, f, ensure_ascii=False, indent=2)
+        print(f"\nĐã ghi {args.out}")
+    if summary["total_ms"] > args.budget_ms:
+        print(f"\nVƯỢT mục tiêu: {summary['total_ms']:.1f} ms > {args.budget_ms:.0f} ms")
+        sys.exit(1)
+    print(f"\nTrong mục tiêu {args.budget_ms:.0f} ms")
+
+
+if __name__ == "__main__":
+    main()
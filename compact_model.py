@@ -0,0 +1,246 @@
+# -*- coding: utf-8 -*-
+"""
+Định dạng mô hình gọn (compact) để nhiều tiến trình dùng chung bộ nhớ.
+
+`export_compact_model` ghi TF-IDF + LogisticRegression đã huấn luyện thành các
+mảng NumPy (.npy) trong một thư mục:
+
+- vocab.npy    : từ vựng (chuỗi độ rộng cố định) theo thứ tự cột; sklearn vốn sắp
+                 xếp từ vựng theo chữ cái nên tra thẳng bằng searchsorted
+- columns.npy  : (chỉ khi từ vựng chưa sắp xếp) hoán vị sắp xếp của vocab.npy
+- idf.npy, coef.npy, intercept.npy, classes.npy
+- meta.json    : ngram_range, lowercase, token_pattern, norm, sublinear_tf, ...
+
+`load_compact_model(..., mmap=True)` mở các mảng bằng `np.load(mmap_mode="r")`:
+các worker cùng đọc một bản trong page cache của hệ điều hành thay vì mỗi
+worker giữ một dict từ vựng riêng được pickle sang.
+
+`CompactVectorizer`/`CompactClassifier` có cùng giao diện phần app dùng
+(`transform`, `predict_proba`, `coef_`, `get_feature_names_out`, ...) nên
+`app._predict_batch(texts, vec=..., clf=...)` chạy được trên cả hai.
+"""
+from __future__ import annotations
+
+import json
+import os
+import re
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+
+META = "meta.json"
+FORMAT_VERSION = 1
+
+
+class SparseRows:
+    """Ma trận thưa dạng CSR tối giản (indptr/indices/data) cho phần giải thích span."""
+
+    def __init__(self, data: np.ndarray, indices: np.ndarray, indptr: np.ndarray, shape: Tuple[int, int]):
+        self.data = data
+        self.indices = indices
+        self.indptr = indptr
+        self.shape = shape
+
+    def tocsr(self) -> "SparseRows":
+        return self
+
+    def copy(self) -> "SparseRows":
+        return SparseRows(self.data.copy(), self.indices.copy(), self.indptr.copy(), self.shape)
+
+    def row_ids(self) -> np.ndarray:
+        return np.repeat(np.arange(self.shape[0]), np.diff(self.indptr))
+
+
+# =========================
+# Xuất
+# =========================
+def export_compact_model(vectorizer, model, directory: str) -> Dict[str, Any]:
+    """Ghi vectorizer + model ra `directory` (ghi vào thư mục tạm rồi đổi tên)."""
+    if getattr(vectorizer, "analyzer", "word") != "word" or any(
+        getattr(vectorizer, a, None) is not None
+        for a in ("tokenizer", "preprocessor", "strip_accents", "stop_words")
+    ):
+        raise ValueError("Chỉ hỗ trợ TfidfVectorizer analyzer='word' mặc định (không stop_words/tokenizer).")
+    coef = np.asarray(model.coef_, dtype=np.float64)
+    if coef.shape[0] != 1:
+        raise ValueError("Chỉ hỗ trợ LogisticRegression hai lớp.")
+
+    names = np.asarray(vectorizer.get_feature_names_out(), dtype=str)
+    is_sorted = bool(np.all(names[:-1] < names[1:]))
+    use_idf = bool(getattr(vectorizer, "use_idf", True))
+    meta = {
+        "format": FORMAT_VERSION,
+        "ngram_range": list(vectorizer.ngram_range),
+        "lowercase": bool(vectorizer.lowercase),
+        "token_pattern": vectorizer.token_pattern,
+        "norm": vectorizer.norm,
+        "use_idf": use_idf,
+        "sublinear_tf": bool(vectorizer.sublinear_tf),
+        "binary": bool(vectorizer.binary),
+        "dtype": np.dtype(vectorizer.dtype).name,
+        "n_features": int(len(names)),
+    }
+
+    parent = os.path.dirname(os.path.abspath(directory))
+    os.makedirs(parent, exist_ok=True)
+    tmp = directory + f".tmp-{os.getpid()}"
+    os.makedirs(tmp, exist_ok=True)
+    np.save(os.path.join(tmp, "vocab.npy"), names)
+    if not is_sorted:
+        np.save(os.path.join(tmp, "columns.npy"), np.argsort(names, kind="stable").astype(np.int32))
+    if use_idf:
+        np.save(os.path.join(tmp, "idf.npy"), np.asarray(vectorizer.idf_, dtype=np.float64))
+    np.save(os.path.join(tmp, "coef.npy"), coef[0])
+    np.save(os.path.join(tmp, "intercept.npy"), np.asarray(model.intercept_, dtype=np.float64))
+    np.save(os.path.join(tmp, "classes.npy"), np.asarray(model.classes_))
+    with open(os.path.join(tmp, META), "w", encoding="utf-8") as f:
+        json.dump(meta, f, ensure_ascii=False, indent=2)
+    try:
+        os.rename(tmp, directory)
+    except OSError:
+        # tiến trình khác đã xuất xong cùng phiên bản -> dùng bản đó
+        import shutil
+
+        shutil.rmtree(tmp, ignore_errors=True)
+        if not os.path.exists(os.path.join(directory, META)):
+            raise
+    return meta
+
+
+# =========================
+# Runtime
+# =========================
+class CompactVectorizer:
+    """Tái hiện `TfidfVectorizer.transform` (analyzer 'word') trên mảng mmap."""
+
+    analyzer = "word"
+    path: Optional[str] = None  # thư mục compact đã mở (load_compact_model)
+    tokenizer = None
+    preprocessor = None
+    strip_accents = None
+
+    def __init__(
+        self,
+        meta: Dict[str, Any],
+        vocab: np.ndarray,
+        columns: Optional[np.ndarray],
+        idf: Optional[np.ndarray],
+    ):
+        self.meta = meta
+        self.ngram_range: Tuple[int, int] = tuple(meta["ngram_range"])
+        self.lowercase: bool = meta["lowercase"]
+        self.token_pattern: str = meta["token_pattern"]
+        self.norm: Optional[str] = meta["norm"]
+        self.sublinear_tf: bool = meta["sublinear_tf"]
+        self.binary: bool = meta["binary"]
+        self.vocab = vocab
+        self.columns = columns
+        self.idf_ = idf
+        self._token_re = re.compile(self.token_pattern)
+
+    def get_feature_names_out(self) -> np.ndarray:
+        return self.vocab
+
+    def _analyze(self, doc: str) -> List[str]:
+        # giống CountVectorizer._word_ngrams
+        if self.lowercase:
+            doc = doc.lower()
+        tokens = self._token_re.findall(doc)
+        lo, hi = self.ngram_range
+        grams = list(tokens) if lo == 1 else []
+        for n in range(max(lo, 2), min(hi, len(tokens)) + 1):
+            grams.extend(map(" ".join, zip(*(tokens[k:] for k in range(n)))))
+        return grams
+
+    def _lookup(self, grams: List[str]) -> np.ndarray:
+        """Chỉ số cột của từng n-gram (-1 nếu không có trong từ vựng)."""
+        if not grams:
+            return np.empty(0, dtype=np.int64)
+        width = self.vocab.dtype.itemsize // 4
+        # chuỗi dài hơn độ rộng mảng sẽ bị cắt khi ép kiểu -> loại trước
+        fits = np.fromiter(map(len, grams), dtype=np.int64, count=len(grams)) <= width
+        keys = np.asarray(grams, dtype=self.vocab.dtype)
+        pos = np.searchsorted(self.vocab, keys, sorter=self.columns)
+        pos[pos >= len(self.vocab)] = 0
+        cols = pos if self.columns is None else self.columns[pos]
+        found = fits & (self.vocab[cols] == keys)
+        return np.where(found, cols, -1)
+
+    def transform(self, raw_documents) -> SparseRows:
+        # tra từ vựng cho cả lô MỘT lần, rồi đếm theo khoá (dòng, cột)
+        n_features = len(self.vocab)
+        grams: List[str] = []
+        lengths: List[int] = []
+        for doc in raw_documents:
+            g = self._analyze(doc)
+            grams.extend(g)
+            lengths.append(len(g))
+        n_rows = len(lengths)
+        rows = np.repeat(np.arange(n_rows, dtype=np.int64), lengths)
+        cols = self._lookup(grams)
+        keep = cols >= 0
+        keys, counts = np.unique(rows[keep] * n_features + cols[keep], return_counts=True)
+        indptr = np.searchsorted(keys, np.arange(n_rows + 1, dtype=np.int64) * n_features)
+        X = SparseRows(
+            counts.astype(np.float64),
+            (keys % max(n_features, 1)).astype(np.int32),
+            indptr.astype(np.int64),
+            (n_rows, n_features),
+        )
+
+        if self.binary:
+            X.data[:] = 1.0
+        if self.sublinear_tf:
+            np.log(X.data, out=X.data)
+            X.data += 1.0
+        if self.idf_ is not None:
+            X.data *= self.idf_[X.indices]
+        if self.norm:
+            rows = X.row_ids()
+            if self.norm == "l2":
+                sums = np.bincount(rows, weights=X.data * X.data, minlength=X.shape[0])
+                sums = np.sqrt(sums)
+            else:
+                sums = np.bincount(rows, weights=np.abs(X.data), minlength=X.shape[0])
+            sums[sums == 0.0] = 1.0
+            X.data /= sums[rows]
+        return X
+
+
+class CompactClassifier:
+    """LogisticRegression hai lớp: decision = X·coef + b, proba = [1 - σ, σ]."""
+
+    def __init__(self, coef: np.ndarray, intercept: np.ndarray, classes: np.ndarray):
+        self.coef_ = coef.reshape(1, -1)
+        self.intercept_ = intercept
+        self.classes_ = classes
+
+    def decision_function(self, X: SparseRows) -> np.ndarray:
+        w = self.coef_[0]
+        scores = np.bincount(X.row_ids(), weights=X.data * w[X.indices], minlength=X.shape[0])
+        return scores + self.intercept_[0]
+
+    def predict_proba(self, X: SparseRows) -> np.ndarray:
+        p = 1.0 / (1.0 + np.exp(-self.decision_function(X)))
+        return np.column_stack([1.0 - p, p])
+
+    def predict(self, X: SparseRows) -> np.ndarray:
+        return self.classes_[(self.decision_function(X) > 0).astype(int)]
+
+
+def load_compact_model(directory: str, mmap: bool = True) -> Tuple[CompactVectorizer, CompactClassifier]:
+    mode = "r" if mmap else None
+    with open(os.path.join(directory, META), encoding="utf-8") as f:
+        meta = json.load(f)
+    if meta.get("format") != FORMAT_VERSION:
+        raise ValueError(f"Định dạng compact không hỗ trợ: {meta.get('format')}")
+
+    def load(name: str) -> np.ndarray:
+        return np.load(os.path.join(directory, name), mmap_mode=mode)
+
+    idf = load("idf.npy") if meta["use_idf"] else None
+    columns = load("columns.npy") if os.path.exists(os.path.join(directory, "columns.npy")) else None
+    vec = CompactVectorizer(meta, load("vocab.npy"), columns, idf)
+    vec.path = directory
+    clf = CompactClassifier(load("coef.npy"), load("intercept.npy"), load("classes.npy"))
+    return vec, clf
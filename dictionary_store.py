@@ -0,0 +1,286 @@
+# -*- coding: utf-8 -*-
+"""
+Kho từ điển nạp từ các file CSV/XLSX có sẵn trong repo, có phiên bản và đổi
+nóng (hot reload) khi file thay đổi.
+
+- Nguồn viết tắt: DICT_SOURCES (các đường dẫn cách nhau bởi dấu phẩy, tương
+  đối với thư mục app), mặc định master_dict_data.csv (~1.700 mục, đã gộp
+  dict_general/normal/special và abb_dict_*.xlsx). Mỗi file là bảng hai cột
+  abb/abbreviation + meaning. dict_*.csv trong repo thực chất là XLSX nên định
+  dạng được nhận theo chữ ký file chứ không theo đuôi.
+- Từ điển gốc trong code (`profanity_list`, `norm_dict` của app.py) luôn được
+  giữ và ưu tiên khi trùng khoá; file chỉ bổ sung thêm mục.
+- Đọc xlsx bằng pandas chậm (hàng trăm ms mỗi file): bảng đã đọc được lưu
+  dạng nhị phân (pickle) trong artifacts/dict-cache/, khoá theo sha256 nội dung
+  file. Lần khởi động sau chỉ còn hash + unpickle.
+- `DictionarySnapshot` bất biến gói từ điển cùng các bộ dò dựng sẵn cho đúng
+  bản đó (LexiconMatcher, AbbrevIndex, TextNormalizer) và `version` = hash nội
+  dung. Người dùng đọc MỘT tham chiếu snapshot cho mỗi lô nên mọi bộ dò trong
+  lô luôn cùng phiên bản; bản mới dựng xong ngoài khoá rồi mới gán vào, request
+  đang chạy không bị chặn.
+- `start_watcher` kiểm tra (mtime, size) các nguồn mỗi DICT_WATCH_INTERVAL giây
+  (mặc định 2, 0 = tắt) trong luồng nền và gọi `on_change(snapshot)` khi đổi.
+"""
+from __future__ import annotations
+
+import hashlib
+import json
+import logging
+import os
+import pickle
+import tempfile
+import threading
+import time
+from types import MappingProxyType
+from typing import Callable, Dict, Iterable, Mapping, Optional, Sequence, Tuple
+
+import model_store
+from lexicon_matcher import AbbrevIndex, LexiconMatcher
+from text_normalizer import TextNormalizer
+
+log = logging.getLogger(__name__)
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+DICT_SOURCES = [p.strip() for p in os.environ.get("DICT_SOURCES", "master_dict_data.csv").split(",") if p.strip()]
+DICT_WATCH_INTERVAL = float(os.environ.get("DICT_WATCH_INTERVAL", "2"))
+CACHE_DIR = os.path.join(model_store.DEFAULT_DIR, "dict-cache")
+
+_CACHE_FORMAT = 1
+_XLSX_MAGIC = b"PK\x03\x04"
+
+# (cột khoá, cột giá trị) chấp nhận cho từng loại bảng
+ABBREV_COLUMNS = (("abb", "abbreviation"), ("meaning",))
+EMOTICON_COLUMNS = (("character",), ("emoji",))
+EMOJI_WORD_COLUMNS = (("emoji",), ("word_vn",))
+
+Pairs = Tuple[Tuple[str, str], ...]
+# (đường dẫn, mtime_ns, size) của một nguồn; None nếu file không tồn tại
+SourceStat = Tuple[str, Optional[int], Optional[int]]
+
+
+def _stat(path: str) -> SourceStat:
+    try:
+        st = os.stat(path)
+    except OSError:
+        return (path, None, None)
+    return (path, st.st_mtime_ns, st.st_size)
+
+
+def _parse_pairs(path: str, data: bytes, columns: Tuple[Sequence[str], Sequence[str]]) -> Pairs:
+    import io
+
+    import pandas as pd
+
+    buf = io.BytesIO(data)
+    df = pd.read_excel(buf) if data[:4] == _XLSX_MAGIC else pd.read_csv(buf)
+    lower = {str(c).strip().lower(): c for c in df.columns}
+    picked = []
+    for aliases in columns:
+        col = next((lower[a] for a in aliases if a in lower), None)
+        if col is None:
+            raise ValueError(f"{os.path.basename(path)}: thiếu cột {'/'.join(aliases)}")
+        picked.append(col)
+    df = df.dropna(subset=picked)
+    return tuple(
+        (str(k).strip(), str(v).strip())
+        for k, v in zip(df[picked[0]].astype(str), df[picked[1]].astype(str))
+    )
+
+
+def read_pairs(
+    path: str, columns: Tuple[Sequence[str], Sequence[str]], cache_dir: Optional[str] = CACHE_DIR
+) -> Tuple[Pairs, str]:
+    """
+    Đọc bảng hai cột thành ((khoá, giá trị), ...) theo thứ tự dòng; trả kèm
+    sha256 nội dung file. Dùng bản nhị phân trong `cache_dir` nếu có.
+    """
+    with open(path, "rb") as f:
+        data = f.read()
+    sha = hashlib.sha256(data).hexdigest()
+    key = hashlib.sha256(f"{_CACHE_FORMAT}|{sha}|{columns!r}".encode("utf-8")).hexdigest()[:32]
+    cache_path = os.path.join(cache_dir, f"{key}.pkl") if cache_dir else None
+    if cache_path and os.path.exists(cache_path):
+        try:
+            with open(cache_path, "rb") as f:
+                return pickle.load(f), sha
+        except (OSError, pickle.UnpicklingError, EOFError):
+            pass  # bản cache hỏng: đọc lại file gốc
+    pairs = _parse_pairs(path, data, columns)
+    if cache_path:
+        try:
+            os.makedirs(cache_dir, exist_ok=True)
+            fd, tmp = tempfile.mkstemp(dir=cache_dir, prefix=".tmp-")
+            with os.fdopen(fd, "wb") as f:
+                pickle.dump(pairs, f, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(tmp, cache_path)
+        except OSError:
+            pass  # thư mục chỉ đọc: lần sau đọc lại file gốc
+    return pairs, sha
+
+
+class DictionarySnapshot:
+    """
+    Một phiên bản từ điển (bất biến) cùng các bộ dò đã dựng cho đúng bản đó.
+
+    `version`: 12 ký tự đầu sha256 trên toàn bộ nội dung (lexicon, viết tắt,
+    bảng emoji) — cùng nội dung thì cùng phiên bản, kể cả khi nạp lại.
+    """
+
+    __slots__ = ("version", "profanity", "norm_dict", "sources", "lexicon", "abbrev", "normalizer")
+
+    def __init__(
+        self,
+        profanity: Iterable[str],
+        norm_dict: Mapping[str, str],
+        emoticons: Optional[Mapping[str, str]] = None,
+        emoji_words: Optional[Mapping[str, str]] = None,
+        sources: Sequence[SourceStat] = (),
+    ):
+        profanity = tuple(profanity)
+        norm = MappingProxyType(dict(norm_dict))
+        h = hashlib.sha256()
+        h.update(json.dumps(
+            [profanity, list(norm.items()), sorted((emoticons or {}).items()), sorted((emoji_words or {}).items())],
+            ensure_ascii=False,
+        ).encode("utf-8"))
+        lexicon = LexiconMatcher(profanity)
+        object.__setattr__(self, "version", h.hexdigest()[:12])
+        object.__setattr__(self, "profanity", profanity)
+        object.__setattr__(self, "norm_dict", norm)
+        object.__setattr__(self, "sources", tuple(sources))
+        object.__setattr__(self, "lexicon", lexicon)
+        object.__setattr__(self, "abbrev", AbbrevIndex(norm, lexicon))
+        object.__setattr__(self, "normalizer", TextNormalizer(norm, emoticons=emoticons, emoji_words=emoji_words))
+
+    def __setattr__(self, name, value):
+        raise AttributeError("DictionarySnapshot là bất biến; hãy dựng bản mới.")
+
+    def info(self) -> Dict[str, object]:
+        return {
+            "version": self.version,
+            "profanity_terms": len(self.profanity),
+            "abbreviations": len(self.norm_dict),
+            "profane_abbreviations": len(self.abbrev.profane),
+            "sources": [os.path.basename(p) for p, mtime, _ in self.sources if mtime is not None],
+        }
+
+
+class DictionaryStore:
+    """
+    Giữ snapshot đang dùng và dựng bản mới khi file nguồn đổi.
+
+    `current` chỉ là một phép đọc thuộc tính (không khoá); `activate` gán bản
+    mới một lần. Việc dựng bản mới (đọc file, biên dịch regex) được tuần tự hoá
+    bằng khoá riêng, không dính tới đường chấm điểm.
+    """
+
+    def __init__(
+        self,
+        profanity: Iterable[str],
+        norm_dict: Mapping[str, str],
+        sources: Sequence[str] = tuple(DICT_SOURCES),
+        emoji: bool = False,
+        base_dir: str = BASE_DIR,
+        cache_dir: Optional[str] = CACHE_DIR,
+    ):
+        self._profanity = tuple(profanity)
+        self._norm_dict = dict(norm_dict)
+        resolve = lambda p: p if os.path.isabs(p) else os.path.join(base_dir, p)
+        self.sources = tuple(resolve(p) for p in sources)
+        self.emoji_sources = (
+            (resolve("character2emoji.xlsx"), resolve("emoji2word.xlsx")) if emoji else ()
+        )
+        self.cache_dir = cache_dir
+        self._current: Optional[DictionarySnapshot] = None
+        self._failed: Optional[Tuple[SourceStat, ...]] = None
+        self._build_lock = threading.Lock()
+        self._watcher_pid: Optional[int] = None
+
+    def _stats(self) -> Tuple[SourceStat, ...]:
+        return tuple(_stat(p) for p in self.sources + self.emoji_sources)
+
+    def build(self) -> DictionarySnapshot:
+        """Đọc các nguồn và dựng snapshot mới (chưa kích hoạt)."""
+        stats = self._stats()
+        norm = dict(self._norm_dict)
+        for path, mtime, _ in stats[: len(self.sources)]:
+            if mtime is None:
+                log.warning("Không tìm thấy file từ điển %s", path)
+                continue
+            pairs, _ = read_pairs(path, ABBREV_COLUMNS, self.cache_dir)
+            for abb, meaning in pairs:
+                if abb and meaning:
+                    norm.setdefault(abb, meaning)  # từ điển gốc / file đứng trước được ưu tiên
+        emoticons: Dict[str, str] = {}
+        emoji_words: Dict[str, str] = {}
+        if self.emoji_sources:
+            (char_path, char_mtime, _), (word_path, word_mtime, _) = stats[len(self.sources):]
+            if char_mtime is not None:
+                for ch, emo in read_pairs(char_path, EMOTICON_COLUMNS, self.cache_dir)[0]:
+                    emoticons.setdefault(ch.lower(), emo)
+            if word_mtime is not None:
+                for emo, word in read_pairs(word_path, EMOJI_WORD_COLUMNS, self.cache_dir)[0]:
+                    emoji_words.setdefault(emo, word.lower())
+        return DictionarySnapshot(self._profanity, norm, emoticons, emoji_words, sources=stats)
+
+    @property
+    def current(self) -> DictionarySnapshot:
+        snapshot = self._current
+        if snapshot is None:
+            with self._build_lock:
+                if self._current is None:
+                    self._current = self.build()
+                snapshot = self._current
+        return snapshot
+
+    def activate(self, snapshot: DictionarySnapshot) -> None:
+        self._current = snapshot
+
+    def check(self) -> Optional[DictionarySnapshot]:
+        """
+        Snapshot mới nếu file nguồn đã đổi và nội dung khác bản hiện tại, ngược
+        lại None. Chưa kích hoạt: người gọi quyết định khi nào thay vào.
+        File đọc lỗi (vd. đang ghi dở) được bỏ qua tới khi nó đổi tiếp.
+        """
+        stats = self._stats()
+        if stats == self.current.sources or stats == self._failed:
+            return None
+        with self._build_lock:
+            try:
+                snapshot = self.build()
+            except Exception:
+                log.exception("Không nạp được từ điển mới; giữ phiên bản %s", self.current.version)
+                self._failed = stats
+                return None
+            self._failed = None
+            if snapshot.version == self.current.version:
+                # chỉ đổi mtime (touch, ghi lại cùng nội dung): cùng phiên bản, nhớ stat mới
+                self._current = snapshot
+                return None
+            return snapshot
+
+    def start_watcher(
+        self,
+        on_change: Optional[Callable[[DictionarySnapshot], None]] = None,
+        interval: float = DICT_WATCH_INTERVAL,
+    ) -> None:
+        """Luồng nền theo dõi file nguồn; gọi lại an toàn (mỗi tiến trình một luồng, kể cả sau fork)."""
+        if interval <= 0 or self._watcher_pid == os.getpid():
+            return
+        with self._build_lock:
+            if self._watcher_pid == os.getpid():
+                return
+            self._watcher_pid = os.getpid()
+        on_change = on_change or self.activate
+
+        def loop():
+            while True:
+                time.sleep(interval)
+                try:
+                    snapshot = self.check()
+                    if snapshot is not None:
+                        on_change(snapshot)
+                except Exception:
+                    log.exception("Lỗi khi nạp lại từ điển")
+
+        threading.Thread(target=loop, name="dictionary-watch", daemon=True).start()
@@ -2,19 +2,36 @@
 """
 Đánh giá mô hình phát hiện & highlight ngôn ngữ xúc phạm.
 - So sánh 3 mô hình: Lexicon, ML (TFIDF+LR), Hybrid (OR).
-- K-fold cross-validation và tối ưu ngưỡng theo F1 trên train.
-- Nếu có cột 'spans' dạng "start-end|start-end" sẽ chấm thêm F1 ký tự.
+- K-fold cross-validation và tối ưu ngưỡng trên train (F1 mặc định; F-beta hoặc
+  recall tại precision tối thiểu qua --objective), quét chính xác mọi ngưỡng.
+- Nếu có cột 'spans' dạng "start-end|start-end" sẽ chấm thêm F1 ký tự, F1 theo
+  token và F1 khớp chính xác span (micro + macro, xem span_metrics.py).
+- Corpus được chuẩn hoá, dò span Lexicon và đếm n-gram MỘT lần; các fold chạy
+  song song (--jobs) và in thời gian từng giai đoạn.
+- --scoring-modes: chấm cả tập bằng chính app ở các mức detail (full /
+  probability / label, chấm theo tầng) để so F1 và thông lượng.
+- --search: quét lưới vectorizer (word / char n-gram) x classifier qua các
+  fold, song song trong ngân sách thời gian; văn bản chuẩn hoá và ma trận
+  feature từng fold được cache trên đĩa (artifacts/eval-cache/) và dùng lại
+  cho mọi classifier. Ghi bảng xếp hạng độ chính xác vs độ trễ suy luận.
 
 Chạy:
     python eval_offensive.py --csv data_eval.csv --text-col text --label-col label --spans-col spans --k 5
+    python eval_offensive.py --csv data_eval.csv --spans-col spans --k 5 --jobs 4 --timings-json timings.json
+    python eval_offensive.py --csv data_eval.csv --scoring-modes   # F1 + dòng/s của app ở từng mức detail
+    python eval_offensive.py --csv data_eval.csv --search --jobs 4 --budget-s 300 --rank-by hyb_f1
 """
 
-import argparse, re, json, math, statistics as stats
+import argparse, hashlib, re, json, math, time, statistics as stats
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import contextmanager
+from multiprocessing import get_context
+from numbers import Integral
 from typing import List, Tuple, Dict, Any, Optional
 import numpy as np
 import pandas as pd
 from sklearn.model_selection import StratifiedKFold, train_test_split
-from sklearn.feature_extraction.text import TfidfVectorizer
+from sklearn.feature_extraction.text import CountVectorizer, TfidfTransformer, TfidfVectorizer
 from sklearn.linear_model import LogisticRegression
 from sklearn.metrics import (
     precision_recall_fscore_support, roc_auc_score, roc_curve, confusion_matrix
@@ -28,6 +45,8 @@ def import_app_module():
     path = os.path.join(here, "app.py")
     if not os.path.exists(path):
         raise FileNotFoundError("Không tìm thấy app.py bên cạnh script.")
+    if here not in sys.path:  # app.py import các module cùng thư mục (lexicon_matcher, ...)
+        sys.path.insert(0, here)
     spec = importlib.util.spec_from_file_location("app_module", path)
     mod = importlib.util.module_from_spec(spec)
     sys.modules["app_module"] = mod
@@ -35,19 +54,17 @@ def import_app_module():
     return mod
 
 app = import_app_module()
+import span_metrics  # cùng thư mục với app.py
 
 # ==== Chuẩn hoá text giống app ====
 def normalize_text(s: str) -> str:
-    t = str(s).lower().strip()
-    for abb, meaning in app.norm_dict.items():
-        t = re.sub(r'\b' + re.escape(abb) + r'\b', str(meaning), t, flags=re.IGNORECASE)
-    return t
+    return app.normalize_text(s)
 
 # ==== Dự đoán theo Lexicon/Abbrev ====
 def lexicon_spans(text: str):
     spans = []
     spans += app.find_spans_lexicon(text)
-    spans += app.find_spans_abbrev(text, app.norm_dict)
+    spans += app.find_spans_abbrev(text)
     return merge_spans(spans, text)
 
 # (tuỳ chọn) ML gợi ý span giống app
@@ -70,15 +87,7 @@ def merge_spans(spans, text):
         m["source"] = sorted(list(m["source"])) if isinstance(m["source"], set) else m.get("source", [])
     return merged
 
-# ==== Chấm F1 ký tự cho spans (char-level) ====
-def spans_to_charset(spans: List[Dict[str, Any]]) -> set:
-    chars = set()
-    for s in spans:
-        a, b = int(s["start"]), int(s["end"])
-        for i in range(max(0,a), max(0,b)):
-            chars.add(i)
-    return chars
-
+# ==== Chấm F1 ký tự cho spans (char-level, xem span_metrics.py) ====
 def parse_gt_spans(s: str) -> List[Dict[str,int]]:
     # "10-15|20-25" -> [{"start":10,"end":15},{"start":20,"end":25}]
     out = []
@@ -95,64 +104,211 @@ def parse_gt_spans(s: str) -> List[Dict[str,int]]:
     return out
 
 def char_f1(pred_spans: List[Dict[str,int]], gt_spans: List[Dict[str,int]]) -> Tuple[float,float,float]:
-    P = spans_to_charset(pred_spans)
-    G = spans_to_charset(gt_spans)
-    if len(P) == 0 and len(G) == 0:
-        return 1.0, 1.0, 1.0
-    if len(P) == 0:
-        return 0.0, 0.0, 0.0
-    tp = len(P & G); fp = len(P - G); fn = len(G - P)
-    prec = tp / (tp + fp) if (tp+fp)>0 else 0.0
-    rec  = tp / (tp + fn) if (tp+fn)>0 else 0.0
-    f1   = 2*prec*rec/(prec+rec) if (prec+rec)>0 else 0.0
-    return prec, rec, f1
-
-# ==== Tối ưu ngưỡng theo F1 trên tập train ====
+    # tính trên khoảng đã gộp, không dựng tập từng vị trí ký tự
+    return span_metrics.char_prf(pred_spans, gt_spans)
+
+# ==== Tối ưu ngưỡng trên tập train (quét điểm đã sắp xếp) ====
+THRESHOLD_OBJECTIVES = ("f1", "fbeta", "recall@precision")
+
+def threshold_sweep(y_true, scores):
+    """
+    Mọi ngưỡng phân biệt trong O(n log n): sắp xếp điểm giảm dần MỘT lần rồi
+    cộng dồn TP/FP (như precision_recall_curve). Trả về (thresholds giảm dần,
+    tp, fp, n_pos); tại thresholds[i] dự đoán 1 khi score >= thresholds[i].
+    """
+    y = np.asarray(y_true).astype(bool).ravel()
+    s = np.asarray(scores, dtype=float).ravel()
+    order = np.argsort(-s, kind="mergesort")
+    s = s[order]; y = y[order]
+    last = np.r_[np.flatnonzero(np.diff(s)), len(s) - 1]  # phần tử cuối mỗi nhóm điểm bằng nhau
+    tp = np.cumsum(y)[last]
+    fp = (last + 1) - tp
+    return s[last], tp, fp, int(y.sum())
+
+def best_threshold(y_true, scores, objective="f1", beta=1.0, min_precision=0.9):
+    """
+    Ngưỡng tối ưu chính xác trên mọi điểm phân biệt, trả về (ngưỡng, giá trị mục tiêu).
+    - "f1" / "fbeta": tối đa F-beta (beta > 1 ưu tiên recall).
+    - "recall@precision": recall lớn nhất với precision >= min_precision;
+      không ngưỡng nào đạt thì lấy ngưỡng precision cao nhất (giá trị = recall tại đó).
+    Bằng điểm thì chọn ngưỡng thấp nhất (giữ recall), như cách quét cũ. Ngưỡng
+    trả về nằm giữa điểm được chọn và điểm phân biệt liền dưới: cùng cách chia
+    trên train nhưng không dính sát vào một mẫu train.
+    """
+    if objective not in THRESHOLD_OBJECTIVES:
+        raise ValueError(f"objective phải là một trong {THRESHOLD_OBJECTIVES}")
+    if len(scores) == 0:
+        return 0.5, 0.0
+    thr, tp, fp, n_pos = threshold_sweep(y_true, scores)
+    fn = n_pos - tp
+    recall = tp / n_pos if n_pos else np.zeros(len(tp))
+    if objective == "recall@precision":
+        precision = tp / (tp + fp)
+        ok = precision >= min_precision
+        key = np.where(ok, recall, -1.0) if ok.any() else precision
+        value = recall
+    else:
+        b2 = 1.0 if objective == "f1" else float(beta) ** 2
+        denom = (1 + b2) * tp + b2 * fn + fp
+        value = np.divide((1 + b2) * tp, denom, out=np.zeros(len(tp)), where=denom > 0)
+        key = value
+    i = len(key) - 1 - int(np.argmax(key[::-1]))  # ngưỡng thấp nhất đạt giá trị lớn nhất
+    t = (thr[i] + thr[i + 1]) / 2 if i + 1 < len(thr) else thr[i]
+    return float(t), float(value[i])
+
 def best_threshold_by_f1(y_true, scores):
-    # quét 101 ngưỡng 0..1
-    best_t, best_f1 = 0.5, -1.0
-    for t in np.linspace(0,1,101):
-        yhat = (scores >= t).astype(int)
-        p, r, f1, _ = precision_recall_fscore_support(y_true, yhat, average="binary", zero_division=0)
-        if f1 > best_f1:
-            best_f1, best_t = f1, t
-    return float(best_t), float(best_f1)
+    return best_threshold(y_true, scores, "f1")
 
-# ==== Đánh giá một fold ====
-def eval_fold(train_df, test_df, text_col, label_col, spans_col=None, topk_span=3):
-    # Train ML trên train_df
-    X_train = [normalize_text(s) for s in train_df[text_col].astype(str).tolist()]
-    y_train = train_df[label_col].astype(int).to_numpy()
+# ==== Engine: chuẩn bị corpus MỘT lần cho mọi fold ====
+TFIDF_PARAMS: Dict[str, Any] = {"ngram_range": (1, 2), "min_df": 1, "max_df": 0.95}
+LOGREG_PARAMS: Dict[str, Any] = {"max_iter": 200}
 
-    vec = TfidfVectorizer(ngram_range=(1,2), min_df=1, max_df=0.95)
-    Xtr = vec.fit_transform(X_train)
+# tham số quyết định cách tách n-gram -> đếm MỘT lần trên cả corpus; phần lọc
+# (min_df/max_df/max_features) và trọng số tf-idf tính lại theo tập train mỗi fold
+_COUNT_KEYS = (
+    "input", "encoding", "decode_error", "strip_accents", "lowercase", "preprocessor",
+    "tokenizer", "analyzer", "stop_words", "token_pattern", "ngram_range", "dtype",
+)
 
-    clf = LogisticRegression(max_iter=200)
-    clf.fit(Xtr, y_train)
+class StageTimer:
+    """Cộng dồn thời gian (wall, giây) theo từng giai đoạn."""
+    def __init__(self):
+        self.seconds: Dict[str, float] = {}
 
-    # Tối ưu ngưỡng theo F1 (dựa trên train)
-    train_scores = clf.predict_proba(Xtr)[:,1]
-    thr, _ = best_threshold_by_f1(y_train, train_scores)
+    @contextmanager
+    def __call__(self, name: str):
+        t0 = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.seconds[name] = self.seconds.get(name, 0.0) + time.perf_counter() - t0
+
+    def add(self, seconds: Dict[str, float]):
+        for k, v in seconds.items():
+            self.seconds[k] = self.seconds.get(k, 0.0) + v
+
+def prepare_corpus(texts, labels, gt_spans=None, timer: Optional[StageTimer] = None) -> Dict[str, Any]:
+    """
+    Phần không phụ thuộc fold, tính một lần: chuẩn hoá, span Lexicon/Abbrev
+    (cache theo văn bản, câu trùng chỉ dò một lần), ground-truth spans.
+    """
+    timer = timer if timer is not None else StageTimer()
+    texts = [str(t) for t in texts]
+    with timer("normalize"):
+        normalized = app._dictionaries().normalizer.normalize_many(texts)
+    with timer("lexicon_spans"):
+        cache: Dict[str, List[Dict[str, Any]]] = {}
+        lex = []
+        for t in texts:
+            spans = cache.get(t)
+            if spans is None:
+                spans = cache[t] = lexicon_spans(t)
+            lex.append(spans)
+    return {
+        "texts": texts,
+        "normalized": normalized,
+        "labels": np.asarray(labels, dtype=int),
+        "lex_spans": lex,
+        "gt_spans": gt_spans,
+        "counts": {},
+    }
 
-    # ---- Dự đoán trên test ----
-    texts_test = test_df[text_col].astype(str).tolist()
-    y_true = test_df[label_col].astype(int).to_numpy()
+def _count_params(tfidf_params: Dict[str, Any]) -> Dict[str, Any]:
+    full = TfidfVectorizer(**tfidf_params).get_params()
+    return {k: full[k] for k in _COUNT_KEYS if k in full}
+
+def corpus_counts(corpus: Dict[str, Any], tfidf_params: Dict[str, Any]):
+    """Ma trận đếm n-gram của cả corpus (cache theo cách tách n-gram)."""
+    cparams = _count_params(tfidf_params)
+    key = repr(sorted(cparams.items()))
+    if key not in corpus["counts"]:
+        cv = CountVectorizer(**cparams)
+        X = cv.fit_transform(corpus["normalized"]).tocsr()
+        corpus["counts"][key] = (X, cv.get_feature_names_out())
+    return corpus["counts"][key]
+
+def fold_tfidf(corpus, tr, te, tfidf_params: Dict[str, Any]):
+    """
+    TF-IDF của một fold lấy từ ma trận đếm chung: giữ các n-gram có trong tập
+    train, lọc min_df/max_df/max_features và tính idf trên tập train — đúng
+    những gì `TfidfVectorizer.fit` làm, nhưng không tách token lại mỗi fold.
+    Trả về (vectorizer đã "fit", Xtr, Xte).
+    """
+    counts, names = corpus_counts(corpus, tfidf_params)
+    vec = TfidfVectorizer(**tfidf_params)
+    Ctr = counts[tr]
+    if vec.binary:
+        Ctr = Ctr.copy(); Ctr.data.fill(1)
+    n_doc = Ctr.shape[0]
+    df = np.bincount(Ctr.indices, minlength=Ctr.shape[1])
+    max_doc = vec.max_df if isinstance(vec.max_df, Integral) else vec.max_df * n_doc
+    min_doc = vec.min_df if isinstance(vec.min_df, Integral) else vec.min_df * n_doc
+    if max_doc < min_doc:
+        raise ValueError("max_df corresponds to < documents than min_df")
+    present = df > 0
+    mask = present & (df <= max_doc) & (df >= min_doc)
+    if vec.max_features is not None and mask.sum() > vec.max_features:
+        # cùng phép chọn như CountVectorizer._limit_features trên từ vựng của train
+        tfs = np.asarray(Ctr[:, present].sum(axis=0)).ravel()
+        sub = mask[present]
+        keep = (-tfs[sub]).argsort()[:vec.max_features]
+        new_sub = np.zeros(len(sub), dtype=bool)
+        new_sub[np.where(sub)[0][keep]] = True
+        mask = np.zeros_like(mask)
+        mask[np.where(present)[0][new_sub]] = True
+    cols = np.where(mask)[0]
+    if len(cols) == 0:
+        raise ValueError("After pruning, no terms remain. Try a lower min_df or a higher max_df.")
+
+    vec.vocabulary_ = {str(t): i for i, t in enumerate(names[cols])}
+    vec.fixed_vocabulary_ = False
+    Xtr = Ctr[:, cols].astype(vec.dtype)
+    Cte = counts[te][:, cols].astype(vec.dtype)
+    if vec.binary:
+        Cte.data.fill(1)
+    tfidf = TfidfTransformer(norm=vec.norm, use_idf=vec.use_idf,
+                             smooth_idf=vec.smooth_idf, sublinear_tf=vec.sublinear_tf)
+    tfidf.fit(Xtr)
+    vec._tfidf = tfidf  # như TfidfVectorizer.fit -> vec.transform dùng được cho văn bản mới
+    return vec, tfidf.transform(Xtr, copy=False), tfidf.transform(Cte, copy=False)
+
+# ==== Đánh giá một fold ====
+def eval_fold_indices(corpus, tr, te, topk_span=3, tfidf_params=None, logreg_params=None, threshold_kw=None):
+    """
+    Đánh giá fold (tr, te) trên corpus đã chuẩn bị; trả về (kết quả, thời gian từng giai đoạn).
+    `threshold_kw`: tham số cho best_threshold (mặc định tối đa F1).
+    """
+    timer = StageTimer()
+    tfidf_params = TFIDF_PARAMS if tfidf_params is None else tfidf_params
+    logreg_params = LOGREG_PARAMS if logreg_params is None else logreg_params
+    y_train = corpus["labels"][tr]
+    y_true = corpus["labels"][te]
+    texts_test = [corpus["texts"][i] for i in te]
+
+    with timer("tfidf"):
+        vec, Xtr, Xte = fold_tfidf(corpus, tr, te, tfidf_params)
+    with timer("fit"):
+        clf = LogisticRegression(**logreg_params)
+        clf.fit(Xtr, y_train)
+
+    # Tối ưu ngưỡng (dựa trên train)
+    with timer("threshold"):
+        train_scores = clf.predict_proba(Xtr)[:,1]
+        thr, _ = best_threshold(y_train, train_scores, **(threshold_kw or {}))
 
-    Xte = vec.transform([normalize_text(s) for s in texts_test])
-    ml_scores = clf.predict_proba(Xte)[:,1]
-    ml_pred   = (ml_scores >= thr).astype(int)
+    # ---- Dự đoán trên test ----
+    with timer("predict"):
+        ml_scores = clf.predict_proba(Xte)[:,1]
+        ml_pred   = (ml_scores >= thr).astype(int)
 
-    # Lexicon predictions
-    lex_pred = []
-    for t in texts_test:
-        spans = lexicon_spans(t)
-        lex_pred.append(1 if len(spans)>0 else 0)
-    lex_pred = np.array(lex_pred, dtype=int)
-    lex_scores = lex_pred.astype(float)  # 0/1 để vẫn tính AUC
+        # Lexicon predictions (span đã tính sẵn cho cả corpus)
+        lex_test = [corpus["lex_spans"][i] for i in te]
+        lex_pred = np.array([1 if len(s)>0 else 0 for s in lex_test], dtype=int)
+        lex_scores = lex_pred.astype(float)  # 0/1 để vẫn tính AUC
 
-    # Hybrid
-    hyb_pred = ((ml_scores >= thr) | (lex_pred==1)).astype(int)
-    hyb_scores = np.maximum(ml_scores, lex_scores)
+        # Hybrid
+        hyb_pred = ((ml_scores >= thr) | (lex_pred==1)).astype(int)
+        hyb_scores = np.maximum(ml_scores, lex_scores)
 
     # --- Metrics: Precision, Recall, F1, AUC ---
     def four_metrics(y, scores, yhat):
@@ -163,36 +319,430 @@ def eval_fold(train_df, test_df, text_col, label_col, spans_col=None, topk_span=
             auc = float("nan")
         return p, r, f1, auc
 
-    lex_m = four_metrics(y_true, lex_scores, lex_pred)
-    ml_m  = four_metrics(y_true, ml_scores, ml_pred)
-    hyb_m = four_metrics(y_true, hyb_scores, hyb_pred)
+    with timer("metrics"):
+        lex_m = four_metrics(y_true, lex_scores, lex_pred)
+        ml_m  = four_metrics(y_true, ml_scores, ml_pred)
+        hyb_m = four_metrics(y_true, hyb_scores, hyb_pred)
 
     # --- Span F1 ký tự (nếu có) ---
     span_res = None
-    if spans_col and spans_col in test_df.columns:
-        lex_f1s, ml_f1s, hyb_f1s = [], [], []
-        gt_list = [parse_gt_spans(s) for s in test_df[spans_col].fillna("").astype(str).tolist()]
-        for t, gt in zip(texts_test, gt_list):
-            s_lex = lexicon_spans(t)
-            s_ml  = ml_spans(t, clf, vec, top_k=topk_span)
+    if corpus["gt_spans"] is not None:
+        with timer("ml_spans"):
+            # đóng góp feature cho cả tập test từ chính Xte, giống find_spans_ml từng câu
+            explainer = app.MLExplainer(vec, clf)
+            C = explainer.contributions(Xte)
+            ml_test = []
+            for r, t in enumerate(texts_test):
+                lo, hi = C.indptr[r], C.indptr[r + 1]
+                ml_test.append(explainer.row_spans(t, C.indices[lo:hi], C.data[lo:hi], topk_span))
+        with timer("span_f1"):
+            gts = [corpus["gt_spans"][i] for i in te]
             # union cho hybrid
-            s_hyb = merge_spans(s_lex + s_ml, t)
-            _, _, f1_lex = char_f1(s_lex, gt)
-            _, _, f1_ml  = char_f1(s_ml,  gt)
-            _, _, f1_hyb = char_f1(s_hyb, gt)
-            lex_f1s.append(f1_lex); ml_f1s.append(f1_ml); hyb_f1s.append(f1_hyb)
-        span_res = {
-            "lex_charF1": float(np.mean(lex_f1s)),
-            "ml_charF1":  float(np.mean(ml_f1s)),
-            "hyb_charF1": float(np.mean(hyb_f1s)),
-        }
-
-    return {
+            hyb_test = [merge_spans(s_lex + s_ml, t) for t, s_lex, s_ml in zip(texts_test, lex_test, ml_test)]
+            # char / token / exact, micro + macro; charF1 = macro char F1 như trước
+            reports = span_metrics.span_reports(texts_test, gts, {"lex": lex_test, "ml": ml_test, "hyb": hyb_test})
+            span_res = {}
+            for name, report in reports.items():
+                span_res[f"{name}_charF1"] = report["char"]["macro"]["f1"]
+                span_res[f"{name}_report"] = report
+
+    res = {
         "lex": {"precision":lex_m[0], "recall":lex_m[1], "f1":lex_m[2], "auc":lex_m[3]},
         "ml":  {"precision":ml_m[0],  "recall":ml_m[1],  "f1":ml_m[2],  "auc":ml_m[3], "thr":thr},
         "hyb": {"precision":hyb_m[0], "recall":hyb_m[1], "f1":hyb_m[2], "auc":hyb_m[3]},
         "span": span_res
     }
+    return res, timer.seconds
+
+def eval_fold(train_df, test_df, text_col, label_col, spans_col=None, topk_span=3):
+    """Giao diện cũ theo DataFrame: ghép train + test thành một corpus rồi đánh giá."""
+    df = pd.concat([train_df, test_df], ignore_index=True)
+    gt = None
+    if spans_col and spans_col in test_df.columns:
+        gt = [parse_gt_spans(s) for s in df[spans_col].fillna("").astype(str).tolist()]
+    corpus = prepare_corpus(df[text_col].astype(str).tolist(), df[label_col].astype(int).to_numpy(), gt)
+    tr = np.arange(len(train_df)); te = np.arange(len(train_df), len(df))
+    res, _ = eval_fold_indices(corpus, tr, te, topk_span=topk_span)
+    return res
+
+# ==== Chạy các fold song song (mỗi tiến trình nhận corpus một lần) ====
+_FOLD_CORPUS: Optional[Dict[str, Any]] = None
+
+def _init_fold_worker(corpus):
+    global _FOLD_CORPUS
+    from threadpoolctl import threadpool_limits
+    threadpool_limits(1)  # mỗi fold một lõi, không để BLAS tranh CPU giữa các tiến trình
+    _FOLD_CORPUS = corpus
+
+def _run_fold(tr, te, topk_span, tfidf_params, logreg_params, threshold_kw):
+    return eval_fold_indices(_FOLD_CORPUS, tr, te, topk_span, tfidf_params, logreg_params, threshold_kw)
+
+def run_folds(corpus, splits, jobs=1, topk_span=3, tfidf_params=None, logreg_params=None, threshold_kw=None):
+    """Kết quả từng fold theo đúng thứ tự `splits`; jobs > 1 -> pool tiến trình (spawn)."""
+    tfidf_params = TFIDF_PARAMS if tfidf_params is None else tfidf_params
+    corpus_counts(corpus, tfidf_params)  # đếm n-gram trước khi chia cho worker
+    args = (topk_span, tfidf_params, logreg_params, threshold_kw)
+    if jobs <= 1 or len(splits) <= 1:
+        return [eval_fold_indices(corpus, tr, te, *args) for tr, te in splits]
+    with ProcessPoolExecutor(max_workers=min(jobs, len(splits)), mp_context=get_context("spawn"),
+                             initializer=_init_fold_worker, initargs=(corpus,)) as ex:
+        futures = [ex.submit(_run_fold, tr, te, *args) for tr, te in splits]
+        return [f.result() for f in futures]
+
+# ==== Chế độ tìm cấu hình (--search): quét vectorizer x classifier qua các fold ====
+SEARCH_CACHE_DIR = os.path.join(app.model_store.DEFAULT_DIR, "eval-cache")
+
+# lưới mặc định; ghi đè bằng --search-grid grid.json ({"vectorizers": [...], "classifiers": [...]})
+SEARCH_VECTORIZERS: List[Dict[str, Any]] = [
+    {"name": "word1-2", **TFIDF_PARAMS},
+    {"name": "word1", "ngram_range": (1, 1), "min_df": 1, "max_df": 0.95},
+    {"name": "word1-3-sublinear", "ngram_range": (1, 3), "min_df": 1, "max_df": 0.95, "sublinear_tf": True},
+    # n-gram ký tự bắt được teencode / viết sai chính tả ("ngu" ~ "nguuu", "đm" ~ "dm")
+    {"name": "char_wb2-4", "analyzer": "char_wb", "ngram_range": (2, 4), "min_df": 1, "max_df": 0.95, "sublinear_tf": True},
+    {"name": "char_wb2-5", "analyzer": "char_wb", "ngram_range": (2, 5), "min_df": 2, "max_df": 0.95, "sublinear_tf": True},
+    {"name": "char1-3", "analyzer": "char", "ngram_range": (1, 3), "min_df": 1, "max_df": 0.95, "sublinear_tf": True},
+]
+SEARCH_CLASSIFIERS: List[Dict[str, Any]] = [
+    {"name": "logreg", "kind": "logreg", **LOGREG_PARAMS},
+    {"name": "logreg-C0.25", "kind": "logreg", "C": 0.25, "max_iter": 200},
+    {"name": "logreg-C4", "kind": "logreg", "C": 4.0, "max_iter": 500},
+    {"name": "logreg-balanced", "kind": "logreg", "class_weight": "balanced", "max_iter": 200},
+    {"name": "linear_svc", "kind": "linear_svc", "C": 0.5, "dual": True},
+    {"name": "complement_nb", "kind": "complement_nb", "alpha": 0.3},
+]
+SEARCH_METRICS = ("f1", "hyb_f1", "auc", "accuracy")
+
+def _vectorizer_params(cfg: Dict[str, Any]) -> Dict[str, Any]:
+    return {k: tuple(v) if k == "ngram_range" else v for k, v in cfg.items() if k != "name"}
+
+def _config_key(cfg: Dict[str, Any]) -> str:
+    """Tên thư mục cache: tên cấu hình + hash tham số (đổi tham số -> thư mục mới)."""
+    digest = hashlib.sha256(json.dumps(cfg, sort_keys=True, default=str).encode()).hexdigest()[:10]
+    return re.sub(r"[^\w.-]", "_", str(cfg.get("name", "cfg"))) + "-" + digest
+
+def make_classifier(cfg: Dict[str, Any]):
+    params = {k: v for k, v in cfg.items() if k not in ("name", "kind")}
+    kind = cfg.get("kind", "logreg")
+    if kind == "logreg":
+        return LogisticRegression(**params)
+    if kind == "linear_svc":
+        from sklearn.svm import LinearSVC
+        return LinearSVC(**params)
+    if kind == "complement_nb":
+        from sklearn.naive_bayes import ComplementNB
+        return ComplementNB(**params)
+    raise ValueError(f"kind classifier không hỗ trợ: {kind!r} (logreg, linear_svc, complement_nb)")
+
+def classifier_scores(clf, X):
+    """Điểm để quét ngưỡng / tính AUC: xác suất lớp 1, hoặc decision_function nếu không có."""
+    if hasattr(clf, "predict_proba"):
+        return clf.predict_proba(X)[:, 1]
+    return clf.decision_function(X)
+
+def _best_of(fn, repeat=3) -> float:
+    best = math.inf
+    for _ in range(repeat):
+        t0 = time.perf_counter(); fn(); best = min(best, time.perf_counter() - t0)
+    return best
+
+def _atomic_json(path: str, obj: Any):
+    tmp = f"{path}.{os.getpid()}.tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(obj, f, ensure_ascii=False, indent=2)
+    os.replace(tmp, path)
+
+def cached_search_corpus(texts, labels, k: int, seed: int, cache_dir: str, timer: StageTimer):
+    """
+    Corpus cho --search, lấy từ cache đĩa nếu có: văn bản đã chuẩn hoá + nhãn
+    Lexicon/Abbrev (cho F1 Hybrid). Khoá = nội dung dữ liệu, cách chia fold và
+    phiên bản từ điển. Trả về (corpus, thư mục cache của tập dữ liệu này).
+    """
+    texts = [str(t) for t in texts]
+    labels = np.asarray(labels, dtype=int)
+    key = hashlib.sha256(json.dumps(
+        [texts, labels.tolist(), k, seed, app._dictionaries().version], ensure_ascii=False
+    ).encode()).hexdigest()[:16]
+    root = os.path.join(cache_dir, key)
+    os.makedirs(root, exist_ok=True)
+    path = os.path.join(root, "corpus.json")
+    if os.path.exists(path):
+        with timer("load_corpus_cache"), open(path, encoding="utf-8") as f:
+            cached = json.load(f)
+        normalized, lex_pred = cached["normalized"], cached["lex_pred"]
+    else:
+        prepared = prepare_corpus(texts, labels, timer=timer)
+        normalized = prepared["normalized"]
+        lex_pred = [1 if s else 0 for s in prepared["lex_spans"]]
+        _atomic_json(path, {"normalized": normalized, "lex_pred": lex_pred})
+    corpus = {"texts": texts, "normalized": normalized, "labels": labels, "lex_spans": None,
+              "gt_spans": None, "counts": {}, "lex_pred": np.asarray(lex_pred, dtype=int)}
+    return corpus, root
+
+def build_fold_features(root: str, vec_cfg: Dict[str, Any], splits) -> Dict[str, Any]:
+    """
+    Ma trận TF-IDF (train, test) từng fold cho một cấu hình vectorizer, ghi ra
+    `<root>/<cấu hình>/fold<i>_{train,test}.npz` để mọi classifier dùng lại (và
+    lần chạy sau không đếm n-gram lại). Đo luôn độ trễ transform (µs/văn bản).
+    meta.json lưu thư mục tương đối so với `root` (chuyển thư mục cache vẫn dùng được).
+    """
+    import scipy.sparse as sp
+    splits = list(splits)
+    if not splits:
+        raise ValueError("Cần ít nhất một fold để dựng đặc trưng.")
+    key = _config_key(vec_cfg)
+    d = os.path.join(root, key)
+    meta_path = os.path.join(d, "meta.json")
+    if os.path.exists(meta_path):
+        with open(meta_path, encoding="utf-8") as f:
+            return {**json.load(f), "dir": d, "cached": True}
+    os.makedirs(d, exist_ok=True)
+    corpus = _FOLD_CORPUS
+    params = _vectorizer_params(vec_cfg)
+    t0 = time.perf_counter()
+    n_features = []
+    transform_us = None
+    for i, (tr, te) in enumerate(splits):
+        vec, Xtr, Xte = fold_tfidf(corpus, tr, te, params)
+        for part, X in (("train", Xtr), ("test", Xte)):
+            tmp = os.path.join(d, f"fold{i}_{part}.{os.getpid()}.tmp.npz")
+            sp.save_npz(tmp, X.tocsr())
+            os.replace(tmp, os.path.join(d, f"fold{i}_{part}.npz"))
+        n_features.append(int(Xtr.shape[1]))
+        if i == 0:
+            docs = [corpus["normalized"][j] for j in te]
+            transform_us = _best_of(lambda: vec.transform(docs)) / max(len(docs), 1) * 1e6
+    meta = {"name": vec_cfg.get("name"), "params": vec_cfg, "dir": key, "n_features": n_features,
+            "transform_us": transform_us, "build_s": time.perf_counter() - t0}
+    _atomic_json(meta_path, meta)
+    return {**meta, "dir": d, "cached": False}
+
+def eval_search_config(feat_dir: str, splits, clf_cfg: Dict[str, Any], threshold_kw=None) -> Dict[str, Any]:
+    """Một classifier trên ma trận đã cache của một vectorizer, qua mọi fold."""
+    import scipy.sparse as sp
+    corpus = _FOLD_CORPUS
+    folds = []
+    predict_us = None
+    for i, (tr, te) in enumerate(splits):
+        Xtr = sp.load_npz(os.path.join(feat_dir, f"fold{i}_train.npz"))
+        Xte = sp.load_npz(os.path.join(feat_dir, f"fold{i}_test.npz"))
+        y_train, y_true = corpus["labels"][tr], corpus["labels"][te]
+        clf = make_classifier(clf_cfg)
+        t0 = time.perf_counter()
+        clf.fit(Xtr, y_train)
+        fit_s = time.perf_counter() - t0
+        thr, _ = best_threshold(y_train, classifier_scores(clf, Xtr), **(threshold_kw or {}))
+        scores = classifier_scores(clf, Xte)
+        if i == 0:
+            predict_us = _best_of(lambda: classifier_scores(clf, Xte)) / max(Xte.shape[0], 1) * 1e6
+        pred = (scores >= thr).astype(int)
+        hyb = (pred | corpus["lex_pred"][te]).astype(int)
+        _, _, f1, _ = precision_recall_fscore_support(y_true, pred, average="binary", zero_division=0)
+        _, _, hyb_f1, _ = precision_recall_fscore_support(y_true, hyb, average="binary", zero_division=0)
+        try:
+            auc = roc_auc_score(y_true, scores)
+        except ValueError:
+            auc = float("nan")
+        folds.append({"f1": f1, "hyb_f1": hyb_f1, "auc": auc,
+                      "accuracy": float(np.mean(pred == y_true)), "fit_s": fit_s})
+    out = {m: (float(np.nanmean([f[m] for f in folds])), float(np.nanstd([f[m] for f in folds])))
+           for m in SEARCH_METRICS}
+    out["fit_s"] = float(np.mean([f["fit_s"] for f in folds]))
+    out["predict_us"] = predict_us
+    return out
+
+class _InlineExecutor:
+    """Chạy ngay trong tiến trình chính (--jobs 1), cùng giao diện submit/shutdown."""
+    def submit(self, fn, *args):
+        from concurrent.futures import Future
+        f = Future()
+        try:
+            f.set_result(fn(*args))
+        except Exception as e:
+            f.set_exception(e)
+        return f
+
+    def shutdown(self, wait=True, cancel_futures=False):
+        pass
+
+def run_search(corpus, root, splits, vectorizers, classifiers, jobs=1, budget_s=600.0, threshold_kw=None):
+    """
+    Dựng (hoặc lấy từ cache) ma trận từng vectorizer, rồi chấm mọi classifier
+    trên đó; các tác vụ chạy song song trên `jobs` tiến trình. Hết `budget_s`
+    giây thì không bắt đầu tác vụ mới (tác vụ đang chạy được chạy nốt); cấu
+    hình chưa kịp chấm có status "skipped". Trả về danh sách dòng kết quả.
+    """
+    from concurrent.futures import FIRST_COMPLETED, wait
+    global _FOLD_CORPUS
+    deadline = time.perf_counter() + budget_s
+    if jobs <= 1:
+        _FOLD_CORPUS = corpus
+        ex = _InlineExecutor()
+    else:
+        ex = ProcessPoolExecutor(max_workers=jobs, mp_context=get_context("spawn"),
+                                 initializer=_init_fold_worker, initargs=(corpus,))
+    rows: Dict[Tuple[str, str], Dict[str, Any]] = {
+        (v["name"], c["name"]): {"vectorizer": v["name"], "classifier": c["name"], "status": "skipped"}
+        for v in vectorizers for c in classifiers
+    }
+    features: Dict[str, Dict[str, Any]] = {}
+    pending: Dict[Any, Tuple] = {}
+
+    def submit(tag, fn, *args):
+        if time.perf_counter() < deadline:
+            pending[ex.submit(fn, *args)] = tag
+
+    try:
+        for v in vectorizers:
+            submit(("features", v), build_fold_features, root, v, splits)
+        while pending:
+            done, _ = wait(list(pending), timeout=max(0.0, deadline - time.perf_counter()),
+                           return_when=FIRST_COMPLETED)
+            if not done:  # hết ngân sách: huỷ tác vụ chưa bắt đầu, chờ tác vụ đang chạy
+                for f in list(pending):
+                    if f.cancel():
+                        del pending[f]
+                done, _ = wait(list(pending))
+            for f in done:
+                tag = pending.pop(f)
+                if tag[0] == "features":
+                    v = tag[1]
+                    try:
+                        features[v["name"]] = f.result()
+                    except Exception as e:
+                        for c in classifiers:
+                            rows[(v["name"], c["name"])].update(status="error", error=str(e))
+                        continue
+                    for c in classifiers:
+                        submit(("eval", v, c), eval_search_config, features[v["name"]]["dir"],
+                               splits, c, threshold_kw)
+                else:
+                    _, v, c = tag
+                    row = rows[(v["name"], c["name"])]
+                    try:
+                        res = f.result()
+                    except Exception as e:
+                        row.update(status="error", error=str(e))
+                        continue
+                    feat = features[v["name"]]
+                    row.update(status="ok", **res, transform_us=feat["transform_us"],
+                               latency_us=feat["transform_us"] + res["predict_us"],
+                               n_features=int(np.mean(feat["n_features"])),
+                               features_cached=feat["cached"], vectorizer_params=v, classifier_params=c)
+    finally:
+        ex.shutdown(wait=True, cancel_futures=True)
+    return list(rows.values())
+
+def rank_leaderboard(rows, metric="f1"):
+    """
+    Xếp hạng theo `metric` (trung bình các fold, giảm dần), bằng nhau thì độ
+    trễ thấp hơn đứng trước. `pareto` = không cấu hình nào vừa tốt hơn hoặc
+    bằng về chỉ số vừa nhanh hơn hoặc bằng (và hơn hẳn ở một trong hai).
+    Chỉ số NaN (vd. AUC khi mọi fold test chỉ có một lớp) xếp cuối như -inf,
+    không tính vào Pareto.
+    """
+    def score(r):
+        v = r[metric][0]
+        return -math.inf if math.isnan(v) else v
+
+    ok = [r for r in rows if r["status"] == "ok"]
+    ok.sort(key=lambda r: (-score(r), r["latency_us"]))
+    for i, r in enumerate(ok, start=1):
+        r["rank"] = i
+        r["pareto"] = score(r) > -math.inf and not any(
+            score(o) >= score(r) and o["latency_us"] <= r["latency_us"]
+            and (score(o) > score(r) or o["latency_us"] < r["latency_us"])
+            for o in ok
+        )
+    return ok + [r for r in rows if r["status"] != "ok"]
+
+def print_leaderboard(rows, metric="f1", top=20):
+    print(f"\n=== Bảng xếp hạng cấu hình (theo {metric}, trung bình các fold) ===")
+    print("| # | Vectorizer | Classifier | F1 | Hybrid F1 | AUC | Accuracy | Độ trễ µs/văn bản | Số feature | Pareto |")
+    print("|---:|---|---|---:|---:|---:|---:|---:|---:|:---:|")
+    ok = [r for r in rows if r["status"] == "ok"]
+    for r in ok[:top]:
+        print(f"| {r['rank']} | {r['vectorizer']} | {r['classifier']} | "
+              f"{r['f1'][0]:.3f} ± {r['f1'][1]:.3f} | {r['hyb_f1'][0]:.3f} | {r['auc'][0]:.3f} | "
+              f"{r['accuracy'][0]:.3f} | {r['latency_us']:.1f} ({r['transform_us']:.1f} + {r['predict_us']:.1f}) | "
+              f"{r['n_features']} | {'★' if r['pareto'] else ''} |")
+    skipped = [r for r in rows if r["status"] == "skipped"]
+    failed = [r for r in rows if r["status"] == "error"]
+    if skipped:
+        print(f"Bỏ qua {len(skipped)} cấu hình vì hết ngân sách thời gian (--budget-s).")
+    for r in failed:
+        print(f"Lỗi {r['vectorizer']} / {r['classifier']}: {r['error']}")
+
+def load_search_grid(path: Optional[str]):
+    if not path:
+        return SEARCH_VECTORIZERS, SEARCH_CLASSIFIERS
+    with open(path, encoding="utf-8") as f:
+        grid = json.load(f)
+    vectorizers = grid.get("vectorizers", SEARCH_VECTORIZERS)
+    classifiers = grid.get("classifiers", SEARCH_CLASSIFIERS)
+    for i, cfg in enumerate(vectorizers):
+        cfg.setdefault("name", f"vec{i}")
+    for i, cfg in enumerate(classifiers):
+        cfg.setdefault("name", f"clf{i}")
+    return vectorizers, classifiers
+
+# ==== Chấm theo tầng trong app: F1 + thông lượng từng mức `detail` ====
+def eval_scoring_modes(texts, labels, details=None, repeat=5) -> Dict[str, Dict[str, Any]]:
+    """
+    Chấm cả tập bằng `app._predict_batch` (mô hình đang phục vụ, không qua cache)
+    ở từng mức chi tiết "full" / "probability" / "label"; trả về P/R/F1 của
+    nhãn cuối, thông lượng (lấy lần nhanh nhất trong `repeat` lần) và số dòng
+    theo tầng quyết định (`decided_by`).
+    """
+    texts = [str(t) for t in texts]
+    out = {}
+    for detail in details or app.SCORING_DETAILS:
+        best = math.inf
+        for _ in range(max(repeat, 1)):
+            t0 = time.perf_counter()
+            res = app._predict_batch(texts, detail=detail)
+            best = min(best, time.perf_counter() - t0)
+        pred = [r["prediction"] for r in res]
+        p, r, f1, _ = precision_recall_fscore_support(labels, pred, average="binary", zero_division=0)
+        decided: Dict[str, int] = {}
+        for x in res:
+            decided[x["decided_by"]] = decided.get(x["decided_by"], 0) + 1
+        out[detail] = {"precision": float(p), "recall": float(r), "f1": float(f1),
+                       "ms": best * 1000, "texts_per_s": len(texts) / best if best else float("inf"),
+                       "decided_by": decided}
+    return out
+
+def print_scoring_modes(modes: Dict[str, Dict[str, Any]]):
+    base = modes.get("full")
+    print("\n=== Chấm theo tầng trong app (mô hình đang phục vụ) ===")
+    print("| detail | Precision | Recall | F1 | ΔF1 | dòng/s | tăng tốc | decided_by |")
+    print("|---|---:|---:|---:|---:|---:|---:|---|")
+    for detail, m in modes.items():
+        df1 = f"{m['f1'] - base['f1']:+.3f}" if base else "—"
+        speed = f"{m['texts_per_s'] / base['texts_per_s']:.2f}x" if base else "—"
+        decided = ", ".join(f"{k}={v}" for k, v in sorted(m["decided_by"].items()))
+        print(f"| {detail} | {m['precision']:.3f} | {m['recall']:.3f} | {m['f1']:.3f} | {df1} | "
+              f"{m['texts_per_s']:.0f} | {speed} | {decided} |")
+
+def run_search_cli(args, texts, y, skf, timer: StageTimer, t_start: float):
+    vectorizers, classifiers = load_search_grid(args.search_grid)
+    corpus, root = cached_search_corpus(texts, y, args.k, 42, args.cache_dir, timer)
+    splits = list(skf.split(np.zeros(len(y)), y))
+    jobs = args.jobs if args.jobs is not None else (os.cpu_count() or 1)
+    threshold_kw = {"objective": args.objective, "beta": args.beta, "min_precision": args.min_precision}
+    with timer("search"):
+        rows = run_search(corpus, root, splits, vectorizers, classifiers, jobs=jobs,
+                          budget_s=args.budget_s, threshold_kw=threshold_kw)
+    rows = rank_leaderboard(rows, args.rank_by)
+    print_leaderboard(rows, args.rank_by)
+    with open(args.leaderboard, "w", encoding="utf-8") as f:
+        json.dump({"rank_by": args.rank_by, "k": args.k, "rows": len(y), "cache": root,
+                   "latency_note": "µs/văn bản khi chấm theo lô (transform + classifier, chưa gồm chuẩn hoá)",
+                   "leaderboard": rows}, f, ensure_ascii=False, indent=2, default=str)
+    total = time.perf_counter() - t_start
+    print(f"\nĐã ghi {args.leaderboard}; cache: {root}")
+    print(f"[Thời gian] tổng {total:.2f}s ({len(y)} dòng, {args.k} fold, {jobs} tiến trình)")
+    for name, sec in timer.seconds.items():
+        print(f"  {name:<18} {sec:8.3f}s")
 
 def main():
     ap = argparse.ArgumentParser()
@@ -201,23 +751,59 @@ def main():
     ap.add_argument("--label-col", default="label")
     ap.add_argument("--spans-col", default=None)
     ap.add_argument("--k", type=int, default=5)
+    ap.add_argument("--jobs", type=int, default=None,
+                    help="Số tiến trình chạy fold song song (mặc định min(k, số CPU))")
+    ap.add_argument("--timings-json", default=None, help="Ghi thời gian từng giai đoạn ra file JSON")
+    ap.add_argument("--objective", choices=THRESHOLD_OBJECTIVES, default="f1",
+                    help="Mục tiêu chọn ngưỡng ML trên train")
+    ap.add_argument("--beta", type=float, default=1.0, help="beta cho --objective fbeta (>1 ưu tiên recall)")
+    ap.add_argument("--min-precision", type=float, default=0.9,
+                    help="precision tối thiểu cho --objective recall@precision")
+    ap.add_argument("--scoring-modes", nargs="*", choices=app.SCORING_DETAILS, default=None,
+                    help="Chấm thêm cả tập bằng app ở các mức detail (không kèm tên = cả ba): F1 + thông lượng")
+    ap.add_argument("--scoring-repeat", type=int, default=5, help="Số lần chấm mỗi mức, lấy lần nhanh nhất")
+    ap.add_argument("--search", action="store_true",
+                    help="Tìm cấu hình: quét vectorizer x classifier qua các fold, in bảng xếp hạng")
+    ap.add_argument("--search-grid", default=None,
+                    help='File JSON {"vectorizers": [...], "classifiers": [...]} thay lưới mặc định')
+    ap.add_argument("--budget-s", type=float, default=600.0,
+                    help="Ngân sách thời gian cho --search (giây); hết thì không bắt đầu cấu hình mới")
+    ap.add_argument("--cache-dir", default=SEARCH_CACHE_DIR,
+                    help="Thư mục cache văn bản chuẩn hoá + ma trận feature từng fold cho --search")
+    ap.add_argument("--rank-by", choices=SEARCH_METRICS, default="f1", help="Chỉ số xếp hạng cho --search")
+    ap.add_argument("--leaderboard", default="search_leaderboard.json", help="File JSON bảng xếp hạng --search")
     args = ap.parse_args()
+    timer = StageTimer()
+    t_start = time.perf_counter()
 
-    df = pd.read_csv(args.csv)
+    with timer("load"):
+        df = pd.read_csv(args.csv)
     if args.text_col not in df.columns or args.label_col not in df.columns:
         raise ValueError("Thiếu cột text/label. Dùng --text-col và --label-col nếu tên khác.")
 
     y = df[args.label_col].astype(int).to_numpy()
     skf = StratifiedKFold(n_splits=args.k, shuffle=True, random_state=42)
+    if args.search:
+        run_search_cli(args, df[args.text_col].astype(str).tolist(), y, skf, timer, t_start)
+        return
+
+    gt = None
+    if args.spans_col and args.spans_col in df.columns:
+        gt = [parse_gt_spans(s) for s in df[args.spans_col].fillna("").astype(str).tolist()]
+    corpus = prepare_corpus(df[args.text_col].astype(str).tolist(), y, gt, timer=timer)
+    with timer("count_ngrams"):
+        corpus_counts(corpus, TFIDF_PARAMS)
+
+    jobs = args.jobs if args.jobs is not None else min(args.k, os.cpu_count() or 1)
+    with timer("folds"):
+        threshold_kw = {"objective": args.objective, "beta": args.beta, "min_precision": args.min_precision}
+        fold_results = run_folds(corpus, list(skf.split(df, y)), jobs=jobs, threshold_kw=threshold_kw)
 
     results = {"lex": [], "ml": [], "hyb": [], "span": []}
+    fold_timer = StageTimer()
 
-    for fold, (tr, te) in enumerate(skf.split(df, y), start=1):
-        res = eval_fold(
-            df.iloc[tr].reset_index(drop=True),
-            df.iloc[te].reset_index(drop=True),
-            text_col=args.text_col, label_col=args.label_col, spans_col=args.spans_col
-        )
+    for fold, (res, seconds) in enumerate(fold_results, start=1):
+        fold_timer.add(seconds)
         for key in ["lex","ml","hyb"]:
             results[key].append(res[key])
         results["span"].append(res["span"])
@@ -261,14 +847,44 @@ def main():
             hyb_span = [s["hyb_charF1"] for s in valid]
             print("\n[Span] F1 ký tự (trung bình các fold):")
             print(f"Lexicon: {np.mean(lex_span):.3f}  |  ML: {np.mean(ml_span):.3f}  |  Hybrid: {np.mean(hyb_span):.3f}")
+            print("[Span] F1 theo mức (macro / micro, trung bình các fold):")
+            for level in ("char", "token", "exact"):
+                parts = []
+                for name, label in (("lex", "Lexicon"), ("ml", "ML"), ("hyb", "Hybrid")):
+                    ma = np.mean([s[f"{name}_report"][level]["macro"]["f1"] for s in valid])
+                    mi = np.mean([s[f"{name}_report"][level]["micro"]["f1"] for s in valid])
+                    parts.append(f"{label}: {ma:.3f} / {mi:.3f}")
+                print(f"  {level:<5}  " + "  |  ".join(parts))
+
+    modes = None
+    if args.scoring_modes is not None:
+        with timer("scoring_modes"):
+            modes = eval_scoring_modes(df[args.text_col].astype(str).tolist(), y,
+                                       args.scoring_modes or None, args.scoring_repeat)
+        print_scoring_modes(modes)
 
     # Lưu summary
     summary = {
         "lex": lex_agg, "ml": ml_agg, "hyb": hyb_agg,
         "notes": "Điền số (cột mean) vào bảng báo cáo; bạn có thể giữ phần ±std ở slide phụ lục."
     }
+    if modes is not None:
+        summary["scoring_modes"] = modes
     with open("metrics_summary.json", "w", encoding="utf-8") as f:
         json.dump(summary, f, ensure_ascii=False, indent=2)
 
+    # Thời gian từng giai đoạn (các giai đoạn trong fold: tổng của mọi fold)
+    total = time.perf_counter() - t_start
+    print(f"\n[Thời gian] tổng {total:.2f}s ({len(df)} dòng, {args.k} fold, {jobs} tiến trình)")
+    for name, sec in timer.seconds.items():
+        print(f"  {name:<14} {sec:8.3f}s")
+    for name, sec in fold_timer.seconds.items():
+        print(f"  fold:{name:<9} {sec:8.3f}s")
+    if args.timings_json:
+        with open(args.timings_json, "w", encoding="utf-8") as f:
+            json.dump({"total": total, "rows": len(df), "k": args.k, "jobs": jobs,
+                       "stages": timer.seconds, "fold_stages": fold_timer.seconds},
+                      f, ensure_ascii=False, indent=2)
+
 if __name__ == "__main__":
     main()
@@ -0,0 +1,75 @@
+# -*- coding: utf-8 -*-
+"""
+Cấu hình gunicorn (Linux/macOS):
+
+    gunicorn -c gunicorn.conf.py wsgi:app
+
+- preload_app: master import wsgi.py -> nạp mô hình, dựng explainer / bộ chuẩn
+  hoá một lần; worker fork ra dùng chung các trang bộ nhớ đó (copy-on-write).
+  `gc.freeze()` trước khi fork để GC của worker không ghi vào (và làm nhân bản)
+  các object của master.
+- WEB_WORKERS (mặc định = số lõi), WEB_BIND (mặc định 127.0.0.1:8000),
+  WEB_TIMEOUT, WEB_GRACEFUL_TIMEOUT.
+- WEB_THREADS (mặc định 1 = worker sync): chấm điểm tốn CPU và giữ GIL nên
+  thêm luồng không tăng RPS; >1 (gthread) chỉ nên dùng khi có nhiều upload
+  stream dài. Lưu ý gthread có thể đóng vài kết nối đang xếp hàng khi reload.
+  Ngoại lệ: khi bật micro-batching (MICROBATCH_WINDOW_MS > 0, micro_batcher.py)
+  cần WEB_THREADS > 1 để các request /api/predict đồng thời gom được vào một lô.
+- Nạp lại mô hình + từ điển không gián đoạn: `kill -HUP <pid master>`. Hook
+  `on_reload` nạp bản mới trong master rồi gunicorn mới fork worker mới; worker
+  cũ phục vụ nốt request đang dở rồi mới thoát.
+- METRICS_DIR (tuỳ chọn): thư mục snapshot số đo để /metrics cộng dồn mọi worker.
+- Job nền: mỗi worker có pool tiến trình job riêng (jobs.py), tổng cộng tới
+  WEB_WORKERS x JOBS_WORKERS tiến trình. Nếu không đặt JOBS_WORKERS, ngân sách
+  chung JOBS_WORKERS_TOTAL (mặc định nửa số lõi) được chia đều cho các worker
+  (ít nhất 1 mỗi worker).
+"""
+import gc
+import multiprocessing
+import os
+
+bind = os.environ.get("WEB_BIND", "127.0.0.1:8000")
+workers = int(os.environ.get("WEB_WORKERS", str(multiprocessing.cpu_count())))
+threads = int(os.environ.get("WEB_THREADS", "1"))
+worker_class = "gthread" if threads > 1 else "sync"
+preload_app = True
+timeout = int(os.environ.get("WEB_TIMEOUT", "120"))
+graceful_timeout = int(os.environ.get("WEB_GRACEFUL_TIMEOUT", "30"))
+keepalive = 5
+accesslog = os.environ.get("WEB_ACCESS_LOG") or None
+errorlog = "-"
+
+# phải đặt trước khi preload import app (jobs.py đọc JOBS_WORKERS lúc import)
+if "JOBS_WORKERS" not in os.environ:
+    _jobs_total = int(os.environ.get("JOBS_WORKERS_TOTAL", str(max(1, multiprocessing.cpu_count() // 2))))
+    os.environ["JOBS_WORKERS"] = str(max(1, _jobs_total // max(workers, 1)))
+
+
+def on_starting(server):
+    # chưa worker nào chạy: job dở dang từ lần trước đều không còn chủ
+    import jobs
+    import metrics
+
+    metrics.clear_dir()
+    n = jobs.release_unfinished()
+    if n:
+        server.log.info("%d job dở dang sẽ được worker nhận lại", n)
+
+
+def on_reload(server):
+    import app
+
+    info = app.reload_resources()
+    server.log.info("Đã nạp lại mô hình %(model_version)s, từ điển %(dict_version)s", info)
+
+
+def pre_fork(server, worker):
+    gc.freeze()
+
+
+def post_fork(server, worker):
+    import app
+    import metrics
+
+    metrics.REGISTRY.reset()
+    app.start_dictionary_watcher()
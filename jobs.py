@@ -0,0 +1,379 @@
+# -*- coding: utf-8 -*-
+"""
+Job phân tích hàng loạt chạy nền (cho file lớn / danh sách văn bản dài).
+
+- Trạng thái và kết quả lưu trong SQLite (JOBS_DIR/jobs.sqlite3) nên vẫn còn sau
+  khi khởi động lại; job dở dang được chạy tiếp từ dòng đã xong.
+- Một pool tiến trình có giới hạn (JOBS_WORKERS) xử lý job, chấm từng khối qua
+  `app._score_texts(..., parallel=False)` như /api/upload: đi qua cache
+  kết quả (RESULT_CACHE, riêng trong mỗi tiến trình worker) và gom văn bản
+  trùng / gần trùng trong khối (DEDUP_MODE) trước khi gọi `_predict_batch`.
+  Tiến trình worker được hạ độ ưu tiên (nice) và giới hạn 1 luồng BLAS để
+  /api/predict không bị chậm khi job chạy.
+- Mỗi job ghi pid tiến trình web đã nhận nó (owner_pid). Khi chạy nhiều worker
+  web (gunicorn), job dở dang chỉ được một worker nhận lại, không chạy trùng.
+- Pool tạo riêng trong MỖI tiến trình web (lần đầu có job): dưới gunicorn tổng
+  số tiến trình job tối đa là WEB_WORKERS x JOBS_WORKERS. gunicorn.conf.py chia
+  sẵn ngân sách chung JOBS_WORKERS_TOTAL cho các worker nếu không đặt JOBS_WORKERS.
+- Dọn đĩa: bản sao file input (JOBS_DIR/inputs/) bị xoá ngay khi job xong hoặc
+  lỗi; job đã kết thúc quá JOBS_RETENTION_HOURS giờ (mặc định 72, 0 = giữ mãi)
+  bị xoá cùng kết quả trong SQLite (quét tối đa mỗi giờ một lần, khi nhận job mới).
+"""
+from __future__ import annotations
+
+import contextlib
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from concurrent.futures import ProcessPoolExecutor
+from itertools import islice
+from multiprocessing import get_context
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+JOBS_DIR = os.environ.get("JOBS_DIR", os.path.join(ROOT, "jobs_data"))
+JOBS_WORKERS = int(os.environ.get("JOBS_WORKERS", str(max(1, (os.cpu_count() or 2) // 2))))
+JOBS_CHUNK_SIZE = int(os.environ.get("JOBS_CHUNK_SIZE", "500"))
+JOBS_RETENTION_HOURS = float(os.environ.get("JOBS_RETENTION_HOURS", "72"))
+JOBS_SWEEP_INTERVAL = 3600  # giây giữa hai lần dọn job cũ
+
+UNFINISHED = ("queued", "running")
+
+log = logging.getLogger(__name__)
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id TEXT PRIMARY KEY,
+    status TEXT NOT NULL,
+    source TEXT,
+    input_path TEXT NOT NULL,
+    total INTEGER,
+    done INTEGER NOT NULL DEFAULT 0,
+    error TEXT,
+    owner_pid INTEGER,
+    created_at REAL NOT NULL,
+    updated_at REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS results (
+    job_id TEXT NOT NULL,
+    idx INTEGER NOT NULL,
+    item TEXT NOT NULL,
+    PRIMARY KEY (job_id, idx)
+);
+"""
+
+
+class JobStore:
+    """Lưu job + kết quả vào SQLite (an toàn khi nhiều tiến trình cùng ghi)."""
+
+    def __init__(self, directory: str = JOBS_DIR):
+        self.directory = directory
+        os.makedirs(os.path.join(directory, "inputs"), exist_ok=True)
+        self.path = os.path.join(directory, "jobs.sqlite3")
+        with self._connect() as con:
+            con.executescript(_SCHEMA)
+            cols = {r["name"] for r in con.execute("PRAGMA table_info(jobs)")}
+            if "owner_pid" not in cols:  # CSDL tạo trước khi có cột này
+                con.execute("ALTER TABLE jobs ADD COLUMN owner_pid INTEGER")
+
+    @contextlib.contextmanager
+    def _connect(self) -> Iterator[sqlite3.Connection]:
+        con = sqlite3.connect(self.path, timeout=30)
+        try:
+            con.execute("PRAGMA journal_mode=WAL")
+            con.row_factory = sqlite3.Row
+            with con:  # commit/rollback
+                yield con
+        finally:
+            con.close()
+
+    def create(self, source: str, input_path: str, total: Optional[int] = None, job_id: Optional[str] = None) -> str:
+        job_id = job_id or uuid.uuid4().hex
+        now = time.time()
+        with self._connect() as con:
+            con.execute(
+                "INSERT INTO jobs (id, status, source, input_path, total, owner_pid, created_at, updated_at)"
+                " VALUES (?, 'queued', ?, ?, ?, ?, ?, ?)",
+                (job_id, source, input_path, total, os.getpid(), now, now),
+            )
+        return job_id
+
+    def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        with self._connect() as con:
+            row = con.execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        return dict(row) if row else None
+
+    def update(self, job_id: str, **fields) -> None:
+        fields["updated_at"] = time.time()
+        cols = ", ".join(f"{k} = ?" for k in fields)
+        with self._connect() as con:
+            con.execute(f"UPDATE jobs SET {cols} WHERE id = ?", (*fields.values(), job_id))
+
+    def add_results(self, job_id: str, items: List[Dict[str, Any]]) -> None:
+        """Ghi một lô kết quả và cập nhật tiến độ trong cùng một transaction."""
+        if not items:
+            return
+        with self._connect() as con:
+            con.executemany(
+                "INSERT OR REPLACE INTO results (job_id, idx, item) VALUES (?, ?, ?)",
+                [(job_id, it["index"], json.dumps(it, ensure_ascii=False)) for it in items],
+            )
+            con.execute(
+                "UPDATE jobs SET done = ?, updated_at = ? WHERE id = ?",
+                (items[-1]["index"] + 1, time.time(), job_id),
+            )
+
+    def results(self, job_id: str, offset: int = 0, limit: Optional[int] = None) -> List[Dict[str, Any]]:
+        with self._connect() as con:
+            rows = con.execute(
+                "SELECT item FROM results WHERE job_id = ? AND idx >= ? ORDER BY idx LIMIT ?",
+                (job_id, offset, -1 if limit is None else limit),
+            ).fetchall()
+        return [json.loads(r["item"]) for r in rows]
+
+    def iter_results(self, job_id: str, page_size: int = 1000) -> Iterator[Dict[str, Any]]:
+        """Duyệt toàn bộ kết quả theo trang (xuất báo cáo job lớn không nạp hết vào RAM)."""
+        offset = 0
+        while True:
+            page = self.results(job_id, offset=offset, limit=page_size)
+            yield from page
+            if len(page) < page_size:
+                return
+            offset = page[-1]["index"] + 1
+
+    def unfinished(self) -> List[str]:
+        with self._connect() as con:
+            rows = con.execute(
+                "SELECT id FROM jobs WHERE status IN (?, ?) ORDER BY created_at", UNFINISHED
+            ).fetchall()
+        return [r["id"] for r in rows]
+
+    def release_unfinished(self) -> int:
+        """Trả mọi job dở dang về hàng đợi không chủ (chỉ gọi khi chưa tiến trình nào chạy job)."""
+        with self._connect() as con:
+            cur = con.execute(
+                "UPDATE jobs SET status = 'queued', owner_pid = NULL, updated_at = ?"
+                " WHERE status IN (?, ?)",
+                (time.time(), *UNFINISHED),
+            )
+        return cur.rowcount
+
+    def adopt_orphans(self, pid: int) -> List[str]:
+        """Nhận các job không chủ về tiến trình `pid`; mỗi job chỉ một tiến trình nhận được."""
+        adopted = []
+        with self._connect() as con:
+            rows = con.execute(
+                "SELECT id FROM jobs WHERE status = 'queued' AND owner_pid IS NULL ORDER BY created_at"
+            ).fetchall()
+            for r in rows:
+                cur = con.execute(
+                    "UPDATE jobs SET owner_pid = ?, updated_at = ? WHERE id = ? AND owner_pid IS NULL",
+                    (pid, time.time(), r["id"]),
+                )
+                if cur.rowcount:
+                    adopted.append(r["id"])
+        return adopted
+
+    def purge(self, older_than: float) -> int:
+        """
+        Xoá job đã kết thúc (kèm kết quả, file input) cập nhật lần cuối trước
+        `older_than` (epoch), và file input mồ côi cũ hơn mốc đó. Trả số job đã xoá.
+        """
+        with self._connect() as con:
+            rows = con.execute(
+                "SELECT id, input_path FROM jobs WHERE status NOT IN (?, ?) AND updated_at < ?",
+                (*UNFINISHED, older_than),
+            ).fetchall()
+            ids = [(r["id"],) for r in rows]
+            con.executemany("DELETE FROM results WHERE job_id = ?", ids)
+            con.executemany("DELETE FROM jobs WHERE id = ?", ids)
+            live = {r["id"] for r in con.execute("SELECT id FROM jobs")}
+        for r in rows:
+            remove_input(r["input_path"])
+        inputs = os.path.join(self.directory, "inputs")
+        for name in os.listdir(inputs):
+            path = os.path.join(inputs, name)
+            # file ghi dở khi tiến trình chết trước lúc tạo job (không có dòng trong CSDL)
+            with contextlib.suppress(OSError):
+                if name.split(".")[0] not in live and os.path.getmtime(path) < older_than:
+                    os.remove(path)
+        return len(rows)
+
+
+def remove_input(path: Optional[str]) -> None:
+    """Xoá bản sao input của job đã kết thúc (không còn cần để chạy tiếp)."""
+    if path:
+        with contextlib.suppress(FileNotFoundError):
+            os.remove(path)
+
+
+# True khi tiến trình cha (gunicorn master) đã gọi `release_unfinished` trước khi
+# fork worker: worker chỉ nhận job không chủ, không giành job worker khác đang chạy
+_RELEASED_AT_STARTUP = False
+
+
+def release_unfinished(directory: str = JOBS_DIR) -> int:
+    global _RELEASED_AT_STARTUP
+    n = JobStore(directory).release_unfinished()
+    _RELEASED_AT_STARTUP = True
+    return n
+
+
+# =========================
+# Worker (chạy trong tiến trình con)
+# =========================
+def _worker_init() -> None:
+    for var in ("OMP_NUM_THREADS", "OPENBLAS_NUM_THREADS", "MKL_NUM_THREADS"):
+        os.environ.setdefault(var, "1")
+    try:
+        os.nice(10)
+    except (AttributeError, OSError):
+        pass
+
+
+def _iter_input(job: Dict[str, Any], detect_columns) -> Iterator[Tuple[str, Optional[Dict[str, int]]]]:
+    """(văn bản, vị trí trong file gốc); job tạo từ danh sách texts không có vị trí."""
+    path = job["input_path"]
+    if path.endswith(".jsonl"):
+        with open(path, encoding="utf-8") as f:
+            for line in f:
+                yield json.loads(line), None
+        return
+    from upload_reader import iter_upload_segments
+
+    with open(path, "rb") as f:
+        yield from iter_upload_segments(f, job["source"] or path, detect_columns)
+
+
+def run_job(directory: str, job_id: str) -> None:
+    import app as scoring  # mô hình được nạp lười từ artifact (model_store)
+    from upload_reader import chunked
+
+    store = JobStore(directory)
+    job = store.get(job_id)
+    if job is None or job["status"] not in UNFINISHED:
+        return
+    store.update(job_id, status="running")
+    try:
+        scoring.refresh_dictionaries()  # worker sống lâu: nhận file từ điển mới nếu vừa đổi
+        index = job["done"]  # chạy tiếp từ dòng đã xong (sau khi khởi động lại)
+        texts = islice(_iter_input(job, scoring._detect_columns), index, None)
+        for batch in chunked(texts, JOBS_CHUNK_SIZE):
+            results = scoring._score_texts([t for t, _ in batch], parallel=False)
+            items = [
+                {"index": index + i, "text": t, **res, **({"location": loc} if loc else {})}
+                for i, ((t, loc), res) in enumerate(zip(batch, results))
+            ]
+            store.add_results(job_id, items)
+            index += len(items)
+        store.update(job_id, status="done", total=index, done=index)
+    except Exception as e:
+        store.update(job_id, status="failed", error=str(e))
+    remove_input(job["input_path"])
+
+
+# =========================
+# Điều phối (tiến trình web)
+# =========================
+class JobManager:
+    def __init__(self, directory: str = JOBS_DIR, max_workers: int = JOBS_WORKERS):
+        self.store = JobStore(directory)
+        self.max_workers = max_workers
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._lock = threading.Lock()
+        self._last_sweep = 0.0
+
+    def _pool(self) -> ProcessPoolExecutor:
+        with self._lock:
+            if self._executor is None:
+                # spawn: không fork tiến trình web đang chạy nhiều luồng
+                self._executor = ProcessPoolExecutor(
+                    max_workers=self.max_workers,
+                    mp_context=get_context("spawn"),
+                    initializer=_worker_init,
+                )
+            return self._executor
+
+    def _dispatch(self, job_id: str) -> None:
+        future = self._pool().submit(run_job, self.store.directory, job_id)
+        future.add_done_callback(lambda f, job_id=job_id: self._on_done(job_id, f))
+
+    def _on_done(self, job_id: str, future) -> None:
+        # worker chết hoặc lỗi ngoài run_job (vd. import) -> đánh dấu failed thay vì treo "queued"
+        if future.cancelled():
+            return
+        exc = future.exception()
+        if exc is not None:
+            log.error("Job %s lỗi: %s", job_id, exc)
+            job = self.store.get(job_id)
+            if job is not None and job["status"] in UNFINISHED:
+                self.store.update(job_id, status="failed", error=str(exc))
+                remove_input(job["input_path"])
+
+    def sweep(self, force: bool = False) -> int:
+        """Xoá job cũ hơn JOBS_RETENTION_HOURS (tối đa mỗi JOBS_SWEEP_INTERVAL giây một lần)."""
+        now = time.time()
+        if JOBS_RETENTION_HOURS <= 0 or (not force and now - self._last_sweep < JOBS_SWEEP_INTERVAL):
+            return 0
+        self._last_sweep = now
+        try:
+            n = self.store.purge(now - JOBS_RETENTION_HOURS * 3600)
+        except (OSError, sqlite3.Error) as e:
+            log.warning("Không dọn được job cũ: %s", e)
+            return 0
+        if n:
+            log.info("Đã xoá %d job cũ hơn %g giờ", n, JOBS_RETENTION_HOURS)
+        return n
+
+    def _input_path(self, job_id: str, ext: str) -> str:
+        return os.path.join(self.store.directory, "inputs", f"{job_id}.{ext}")
+
+    def submit_file(self, stream, filename: str) -> str:
+        self.sweep()
+        job_id = uuid.uuid4().hex
+        ext = (filename or "").split(".")[-1].lower()
+        path = self._input_path(job_id, ext)
+        with open(path, "wb") as out:
+            for block in iter(lambda: stream.read(1 << 20), b""):
+                out.write(block)
+        self.store.create(filename, path, job_id=job_id)
+        self._dispatch(job_id)
+        return job_id
+
+    def submit_texts(self, texts: Iterable[Any]) -> str:
+        self.sweep()
+        job_id = uuid.uuid4().hex
+        path = self._input_path(job_id, "jsonl")
+        n = 0
+        with open(path, "w", encoding="utf-8") as out:
+            for t in texts:
+                out.write(json.dumps(str(t), ensure_ascii=False) + "\n")
+                n += 1
+        self.store.create("texts", path, total=n, job_id=job_id)
+        self._dispatch(job_id)
+        return job_id
+
+    def recover(self) -> List[str]:
+        """
+        Đưa lại các job chưa xong (queued/running) vào pool sau khi khởi động lại.
+        Chạy một tiến trình: mọi job dở dang đều là của lần chạy trước. Dưới
+        gunicorn, master đã trả chúng về hàng đợi; mỗi worker chỉ nhận phần chưa
+        có chủ.
+        """
+        if not _RELEASED_AT_STARTUP:
+            self.store.release_unfinished()
+        ids = self.store.adopt_orphans(os.getpid())
+        for job_id in ids:
+            self._dispatch(job_id)
+        self.sweep(force=True)
+        return ids
+
+    def shutdown(self) -> None:
+        with self._lock:
+            if self._executor is not None:
+                self._executor.shutdown(wait=False, cancel_futures=True)
+                self._executor = None
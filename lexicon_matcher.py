@@ -0,0 +1,207 @@
+# -*- coding: utf-8 -*-
+"""
+Bộ dò từ điển một lượt (single-pass) cho lexicon ngôn từ xúc phạm.
+
+Thay vì chạy `finditer` riêng cho từng từ khoá, toàn bộ từ điển được gộp thành
+MỘT regex có cấu trúc trie (các tiền tố chung được dùng lại), quét văn bản một
+lần và trả về span DÀI NHẤT tại mọi vị trí bắt đầu có từ khớp:
+- từ khoá không có `*`: trie thuần, các nhánh loại trừ nhau nên khớp đầu tiên
+  regex tìm được là khớp dài nhất;
+- từ khoá có `*`: nhánh đại diện có thể khớp ngắn hơn và che mất từ khoá khác
+  cùng vị trí bắt đầu, nên tại vị trí regex chung đã khớp, nhóm từ khoá không
+  `*` và từng từ khoá có `*` (gom theo ký tự đầu) được dò lại; lấy điểm kết
+  thúc xa nhất.
+
+Giữ nguyên ngữ nghĩa của `_term_to_regex` cũ:
+- `*` trong từ khoá  -> `[\\w\\.]*`  (ký tự đại diện, ví dụ "đ*m", "v*l")
+- khoảng trắng      -> `\\s+`
+- không phân biệt hoa/thường, có ranh giới từ `\\b` ở hai đầu.
+"""
+from __future__ import annotations
+
+import re
+from types import MappingProxyType
+from typing import Dict, Iterable, Iterator, List, Mapping, Optional, Tuple
+
+_WILD = ("wild",)
+_SPACE = ("space",)
+_END = ""  # khoá đánh dấu "kết thúc từ khoá" trong node trie
+
+
+def _term_atoms(term: str, literal: bool = False) -> Tuple[tuple, ...]:
+    """Tách từ khoá thành dãy atom: ký tự thường / ký tự đại diện / khoảng trắng."""
+    atoms = []
+    for ch in term:
+        if not literal and ch == "*":
+            if atoms and atoms[-1] == _WILD:
+                continue
+            atoms.append(_WILD)
+        elif not literal and ch.isspace():
+            if atoms and atoms[-1] == _SPACE:
+                continue
+            atoms.append(_SPACE)
+        else:
+            low = ch.lower()
+            atoms.append(("char", low if len(low) == 1 else ch))
+    return tuple(atoms)
+
+
+def _atom_regex(atom: tuple) -> str:
+    if atom == _WILD:
+        return r"[\w\.]*"
+    if atom == _SPACE:
+        return r"\s+"
+    return re.escape(atom[1])
+
+
+def term_to_regex(term: str, literal: bool = False) -> "re.Pattern[str]":
+    """Regex cho MỘT từ khoá (dùng làm đối chứng / benchmark với cách dò cũ)."""
+    body = "".join(_atom_regex(a) for a in _term_atoms(term, literal))
+    return re.compile(r"(?i)\b" + body + r"\b")
+
+
+def _atom_order(atom: tuple):
+    # thứ tự nhánh cố định (đại diện, khoảng trắng, ký tự); với trie không có `*`
+    # các nhánh loại trừ nhau nên thứ tự không đổi kết quả
+    if atom == _WILD:
+        return (0, "")
+    if atom == _SPACE:
+        return (1, "")
+    return (2, atom[1])
+
+
+def _trie_regex(node: Dict) -> str:
+    branches = [
+        _atom_regex(atom) + _trie_regex(child)
+        for atom, child in sorted(
+            ((a, c) for a, c in node.items() if a != _END), key=lambda x: _atom_order(x[0])
+        )
+    ]
+    if not branches:
+        return ""
+    body = branches[0] if len(branches) == 1 else "(?:" + "|".join(branches) + ")"
+    if _END in node:
+        # từ khoá có thể dừng ở đây; nhánh dài hơn được thử trước (greedy)
+        body = "(?:" + body + ")?"
+    return body
+
+
+def trie_pattern(terms: Iterable[str], literal: bool = False) -> str:
+    """Thân regex dạng trie (chưa có ranh giới từ) cho danh sách từ khoá; "" nếu rỗng."""
+    trie: Dict = {}
+    for t in terms:
+        node = trie
+        for atom in _term_atoms(t, literal):
+            node = node.setdefault(atom, {})
+        node[_END] = True
+    return _trie_regex(trie)
+
+
+class LexiconMatcher:
+    """
+    Bộ dò nhiều từ khoá trong một lượt quét.
+
+    `literal=True` coi mọi ký tự (kể cả `*` và khoảng trắng) là ký tự thường,
+    dùng cho từ viết tắt như "v*l".
+    """
+
+    def __init__(self, terms: Iterable[str], literal: bool = False):
+        seen = {}
+        for t in terms:
+            t = str(t)
+            if t.strip():
+                seen.setdefault(t, None)
+        self.terms: Tuple[str, ...] = tuple(seen)
+        self.literal = literal
+
+        body = trie_pattern(self.terms, literal)
+        # lookahead rỗng để bắt được cả các khớp chồng lấn (mỗi vị trí bắt đầu một khớp)
+        self._pattern = re.compile(r"(?i)(?=\b(" + body + r")\b)") if body else None
+        # từ khoá có `*`: dò lại tại vị trí đã khớp, mỗi từ khoá một nhóm bắt; gom
+        # theo ký tự đầu để mỗi vị trí chỉ thử vài từ khoá (None = bắt đầu bằng `*`)
+        self._plain: "Optional[re.Pattern[str]]" = None
+        self._wild: Dict[Optional[str], "re.Pattern[str]"] = {}
+        wild: Dict[Optional[str], List[str]] = {}
+        plain = []
+        for t in self.terms:
+            atoms = _term_atoms(t, literal)
+            if _WILD in atoms:
+                wild.setdefault(atoms[0][1] if atoms[0][0] == "char" else None, []).append(t)
+            else:
+                plain.append(t)
+        if wild:
+            if plain:
+                self._plain = re.compile(r"(?i)(?:" + trie_pattern(plain, literal) + r")\b")
+            for first, group in wild.items():
+                self._wild[first] = re.compile(r"(?i)" + "".join(
+                    r"(?:(?=(" + trie_pattern([t], literal) + r")\b))?" for t in group
+                ))
+
+    def __len__(self) -> int:
+        return len(self.terms)
+
+    def __bool__(self) -> bool:
+        return self._pattern is not None
+
+    def finditer(self, text: str) -> Iterator[Tuple[int, int]]:
+        """Sinh (start, end) cho mọi khớp, theo thứ tự vị trí bắt đầu."""
+        if self._pattern is None:
+            return
+        if not self._wild:
+            for m in self._pattern.finditer(text):
+                if m.end(1) > m.start(1):
+                    yield m.start(1), m.end(1)
+            return
+        lead = self._wild.get(None)
+        for m in self._pattern.finditer(text):
+            start = m.start()
+            end = m.end(1)  # khớp của trie chung: nhánh `*` có thể che mất từ khoá dài hơn
+            if self._plain is not None:
+                p = self._plain.match(text, start)
+                if p is not None:
+                    end = max(end, p.end())
+            for w in (self._wild.get(text[start].lower()), lead):
+                if w is not None:
+                    wm = w.match(text, start)
+                    end = max(end, *(e for _, e in wm.regs[1:]))
+            if end > start:
+                yield start, end
+
+    def search(self, text: str) -> bool:
+        if self._pattern is None:
+            return False
+        for _ in self.finditer(text):
+            return True
+        return False
+
+    def find_spans(self, text: str, source: str = "lexicon") -> List[Dict]:
+        return [{"start": a, "end": b, "source": {source}} for a, b in self.finditer(text)]
+
+
+class AbbrevIndex:
+    """
+    Chỉ mục (bất biến) các từ viết tắt có nghĩa xúc phạm.
+
+    Dựng MỘT lần khi nạp từ điển: lọc các mục `norm_dict` có nghĩa khớp lexicon
+    và gộp chúng vào một bộ dò duy nhất. Mỗi request chỉ còn một lượt quét văn bản.
+    """
+
+    __slots__ = ("source", "lexicon", "profane", "matcher")
+
+    def __init__(self, norm_dict: Mapping[str, str], lexicon: LexiconMatcher):
+        source = MappingProxyType(dict(norm_dict))
+        profane = {}
+        for abb, meaning in source.items():
+            if lexicon.search(str(meaning)):
+                profane[str(abb)] = str(meaning)
+        object.__setattr__(self, "source", source)
+        object.__setattr__(self, "lexicon", lexicon)
+        object.__setattr__(self, "profane", MappingProxyType(profane))
+        # viết tắt khớp nguyên văn (kể cả '*', ví dụ "v*l")
+        object.__setattr__(self, "matcher", LexiconMatcher(profane, literal=True))
+
+    def __setattr__(self, name, value):
+        raise AttributeError("AbbrevIndex là bất biến; hãy dựng chỉ mục mới.")
+
+    def find_spans(self, text: str, source: str = "abbrev") -> List[Dict]:
+        return self.matcher.find_spans(text, source=source)
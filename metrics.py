@@ -0,0 +1,279 @@
+# -*- coding: utf-8 -*-
+"""
+Số đo vận hành cho pipeline chấm điểm, xuất dạng Prometheus text (GET /metrics),
+không cần thư viện ngoài.
+
+- Histogram thời gian từng công đoạn (`scoring_stage_seconds{stage=...}`): chuẩn
+  hoá, TF-IDF transform, predict_proba, ba bộ dò span, gộp span, render HTML.
+- Histogram thời gian request theo endpoint, kích thước lô; counter số request
+  và số văn bản (từ cache / chấm mới). Micro-batch /api/predict: kích thước lô
+  gom được, thời gian chờ hàng đợi, số request bị từ chối. Gauge (cache, phiên bản mô hình) do app
+  truyền vào lúc scrape.
+- Nhiều worker (gunicorn): đặt METRICS_DIR, mỗi tiến trình ghi snapshot của nó
+  ra METRICS_DIR/<pid>.json (tối đa mỗi giây một lần) và /metrics cộng dồn mọi
+  file, nên scrape trúng worker nào cũng thấy số liệu toàn server.
+"""
+from __future__ import annotations
+
+import bisect
+import glob
+import json
+import math
+import os
+import tempfile
+import threading
+import time
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
+
+METRICS_DIR = os.environ.get("METRICS_DIR", "")
+FLUSH_INTERVAL = 1.0
+
+TIME_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+SIZE_BUCKETS = (1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, 2000, 5000, 10000)
+
+Labels = Tuple[str, ...]
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _fmt_labels(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    parts = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+def _fmt_value(v: float) -> str:
+    if v == math.inf:
+        return "+Inf"
+    return repr(float(v)) if isinstance(v, float) and not float(v).is_integer() else str(int(v))
+
+
+class Counter:
+    kind = "counter"
+
+    def __init__(self, name: str, help: str, labelnames: Sequence[str] = ()):
+        self.name, self.help, self.labelnames = name, help, tuple(labelnames)
+        self._values: Dict[Labels, float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, *labels: str, amount: float = 1.0) -> None:
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0.0) + amount
+
+    def state(self) -> List[Any]:
+        with self._lock:
+            return [[list(k), v] for k, v in self._values.items()]
+
+    @staticmethod
+    def merge(states: Iterable[List[Any]]) -> Dict[Labels, float]:
+        out: Dict[Labels, float] = {}
+        for state in states:
+            for labels, v in state:
+                out[tuple(labels)] = out.get(tuple(labels), 0.0) + v
+        return out
+
+    def render(self, merged: Dict[Labels, float]) -> List[str]:
+        return [f"{self.name}{_fmt_labels(self.labelnames, k)} {_fmt_value(v)}" for k, v in sorted(merged.items())]
+
+
+class Histogram:
+    kind = "histogram"
+
+    def __init__(self, name: str, help: str, labelnames: Sequence[str] = (), buckets: Sequence[float] = TIME_BUCKETS):
+        self.name, self.help, self.labelnames = name, help, tuple(labelnames)
+        self.buckets = tuple(sorted(buckets))
+        # nhãn -> [số đếm từng bucket (không cộng dồn), tổng, số lần]
+        self._values: Dict[Labels, List[Any]] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, *labels: str) -> None:
+        i = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            entry = self._values.get(labels)
+            if entry is None:
+                entry = self._values[labels] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            entry[0][i] += 1
+            entry[1] += value
+            entry[2] += 1
+
+    def state(self) -> List[Any]:
+        with self._lock:
+            return [[list(k), list(v[0]), v[1], v[2]] for k, v in self._values.items()]
+
+    def merge(self, states: Iterable[List[Any]]) -> Dict[Labels, List[Any]]:
+        out: Dict[Labels, List[Any]] = {}
+        for state in states:
+            for labels, counts, total, n in state:
+                if len(counts) != len(self.buckets) + 1:
+                    continue  # snapshot từ phiên bản bucket khác
+                entry = out.setdefault(tuple(labels), [[0] * len(counts), 0.0, 0])
+                entry[0] = [a + b for a, b in zip(entry[0], counts)]
+                entry[1] += total
+                entry[2] += n
+        return out
+
+    def render(self, merged: Dict[Labels, List[Any]]) -> List[str]:
+        lines = []
+        for labels, (counts, total, n) in sorted(merged.items()):
+            acc = 0
+            for le, c in zip(self.buckets + (math.inf,), counts):
+                acc += c
+                le_label = 'le="%s"' % _fmt_value(le)
+                lines.append(f"{self.name}_bucket{_fmt_labels(self.labelnames, labels, le_label)} {acc}")
+            lines.append(f"{self.name}_sum{_fmt_labels(self.labelnames, labels)} {repr(float(total))}")
+            lines.append(f"{self.name}_count{_fmt_labels(self.labelnames, labels)} {n}")
+        return lines
+
+
+class Registry:
+    def __init__(self, directory: str = METRICS_DIR):
+        self.directory = directory
+        self._metrics: Dict[str, Any] = {}
+        self._flusher_pid: Optional[int] = None
+        self._lock = threading.Lock()
+
+    def counter(self, name: str, help: str, labelnames: Sequence[str] = ()) -> Counter:
+        return self._register(Counter(name, help, labelnames))
+
+    def histogram(self, name: str, help: str, labelnames: Sequence[str] = (), buckets: Sequence[float] = TIME_BUCKETS) -> Histogram:
+        return self._register(Histogram(name, help, labelnames, buckets))
+
+    def _register(self, metric):
+        self._metrics[metric.name] = metric
+        return metric
+
+    def reset(self) -> None:
+        """Xoá số đo đã ghi (worker vừa fork không kế thừa số đo của master)."""
+        for m in self._metrics.values():
+            with m._lock:
+                m._values.clear()
+
+    # ---- snapshot nhiều tiến trình ----
+    def snapshot(self) -> Dict[str, Any]:
+        return {name: m.state() for name, m in self._metrics.items()}
+
+    def flush(self) -> None:
+        if not self.directory:
+            return
+        os.makedirs(self.directory, exist_ok=True)
+        fd, tmp = tempfile.mkstemp(dir=self.directory, prefix=".tmp-")
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            json.dump(self.snapshot(), f)
+        os.replace(tmp, os.path.join(self.directory, f"{os.getpid()}.json"))
+
+    def start_flusher(self) -> None:
+        """Luồng nền ghi snapshot định kỳ; gọi lại an toàn (mỗi tiến trình một luồng, kể cả sau fork)."""
+        if not self.directory or self._flusher_pid == os.getpid():
+            return
+        with self._lock:
+            if self._flusher_pid == os.getpid():
+                return
+            self._flusher_pid = os.getpid()
+
+            def loop():
+                while True:
+                    time.sleep(FLUSH_INTERVAL)
+                    try:
+                        self.flush()
+                    except OSError:
+                        pass
+
+            threading.Thread(target=loop, name="metrics-flush", daemon=True).start()
+
+    def _states(self) -> Dict[str, List[List[Any]]]:
+        if not self.directory:
+            return {name: [state] for name, state in self.snapshot().items()}
+        self.flush()
+        out: Dict[str, List[List[Any]]] = {}
+        for path in glob.glob(os.path.join(self.directory, "*.json")):
+            try:
+                with open(path, encoding="utf-8") as f:
+                    snap = json.load(f)
+            except (OSError, ValueError):
+                continue
+            for name, state in snap.items():
+                out.setdefault(name, []).append(state)
+        return out
+
+    def render(self, gauges: Sequence[Tuple[str, str, Dict[str, str], float]] = ()) -> str:
+        """Prometheus text format; `gauges` = [(tên, mô tả, nhãn, giá trị)] của tiến trình hiện tại."""
+        states = self._states()
+        lines: List[str] = []
+        for name, m in self._metrics.items():
+            lines.append(f"# HELP {name} {m.help}")
+            lines.append(f"# TYPE {name} {m.kind}")
+            lines.extend(m.render(m.merge(states.get(name, []))))
+        seen = set()
+        for name, help, labels, value in gauges:
+            if name not in seen:
+                seen.add(name)
+                lines.append(f"# HELP {name} {help}")
+                lines.append(f"# TYPE {name} gauge")
+            lines.append(f"{name}{_fmt_labels(list(labels), list(labels.values()))} {_fmt_value(value)}")
+        return "\n".join(lines) + "\n"
+
+
+def clear_dir(directory: str = METRICS_DIR) -> None:
+    """Xoá snapshot của lần chạy trước (gọi ở gunicorn master trước khi fork)."""
+    if directory:
+        for path in glob.glob(os.path.join(directory, "*.json")):
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+
+# =========================
+# Số đo của pipeline chấm điểm
+# =========================
+REGISTRY = Registry()
+
+STAGE_SECONDS = REGISTRY.histogram(
+    "scoring_stage_seconds", "Thời gian từng công đoạn chấm điểm (mỗi lô)", ["stage"]
+)
+REQUEST_SECONDS = REGISTRY.histogram(
+    "http_request_duration_seconds", "Thời gian xử lý request", ["endpoint", "method"]
+)
+REQUESTS_TOTAL = REGISTRY.counter(
+    "http_requests_total", "Số request theo endpoint và mã trạng thái", ["endpoint", "method", "status"]
+)
+BATCH_SIZE = REGISTRY.histogram(
+    "scoring_batch_size", "Số văn bản mỗi lần gọi chấm điểm", [], buckets=SIZE_BUCKETS
+)
+TEXTS_TOTAL = REGISTRY.counter(
+    "scoring_texts_total", "Số văn bản đã chấm theo nguồn kết quả", ["source"]
+)
+MICROBATCH_SIZE = REGISTRY.histogram(
+    "microbatch_size", "Số request /api/predict được gom vào mỗi lô", [], buckets=SIZE_BUCKETS
+)
+MICROBATCH_QUEUE_SECONDS = REGISTRY.histogram(
+    "microbatch_queue_seconds", "Thời gian request chờ trong hàng đợi micro-batch"
+)
+MICROBATCH_REJECTED = REGISTRY.counter(
+    "microbatch_rejected_total", "Số request micro-batch bị từ chối", ["reason"]
+)
+
+
+class StageTimes:
+    """Cộng dồn thời gian theo công đoạn trong một lần chấm (giây)."""
+
+    def __init__(self):
+        self.seconds: Dict[str, float] = {}
+
+    def add(self, stage: str, seconds: float) -> None:
+        self.seconds[stage] = self.seconds.get(stage, 0.0) + seconds
+
+    def merge(self, other: "StageTimes") -> None:
+        for stage, s in other.seconds.items():
+            self.add(stage, s)
+
+    def observe(self) -> None:
+        """Ghi mỗi công đoạn vào histogram (một mẫu cho cả lô)."""
+        for stage, s in self.seconds.items():
+            STAGE_SECONDS.observe(s, stage)
+
+    def as_ms(self) -> Dict[str, float]:
+        return {stage: round(s * 1000, 3) for stage, s in self.seconds.items()}
@@ -0,0 +1,156 @@
+# -*- coding: utf-8 -*-
+"""
+Gom các request /api/predict đồng thời thành một lô (micro-batching).
+
+Mỗi request chấm riêng một dòng thì chi phí cố định của mỗi lần gọi
+(transform, predict_proba, dựng explainer) bị trả lại cho từng request. Khi có
+nhiều request cùng lúc (gunicorn `WEB_THREADS` > 1, server dev nhiều luồng):
+
+- Request đưa văn bản vào hàng đợi rồi chờ kết quả (Future).
+- Một luồng nền lấy văn bản đầu tiên, gom thêm các văn bản tới trong vòng
+  MICROBATCH_WINDOW_MS (hoặc tới khi đủ MICROBATCH_MAX_BATCH), chấm cả lô một
+  lần rồi trả từng kết quả về đúng request.
+- Chỉ chờ khi còn request đang tới (đã vào handler qua `incoming()`, đang đọc
+  body, chưa gửi văn bản): một client đơn lẻ không phải chờ hết cửa sổ.
+- Chống quá tải: hàng đợi tối đa MICROBATCH_MAX_QUEUE văn bản, đầy thì request
+  bị từ chối ngay (`Overloaded` -> HTTP 503) thay vì xếp hàng vô hạn; request
+  chờ quá MICROBATCH_TIMEOUT giây cũng bị huỷ.
+- Số đo: kích thước lô, thời gian chờ trong hàng đợi, số request bị từ chối
+  (xem metrics.py).
+
+Bật bằng MICROBATCH_WINDOW_MS > 0 (mặc định 0 = tắt, mỗi request chấm ngay).
+Đổi lại mỗi request chờ thêm tối đa một cửa sổ.
+"""
+from __future__ import annotations
+
+import contextlib
+import os
+import queue
+import threading
+import time
+from concurrent.futures import Future, TimeoutError as FutureTimeout
+from typing import Any, Callable, Iterator, List, Optional, Tuple
+
+from metrics import MICROBATCH_QUEUE_SECONDS, MICROBATCH_REJECTED, MICROBATCH_SIZE
+
+MICROBATCH_WINDOW_MS = float(os.environ.get("MICROBATCH_WINDOW_MS", "0"))
+MICROBATCH_MAX_BATCH = int(os.environ.get("MICROBATCH_MAX_BATCH", "64"))
+MICROBATCH_MAX_QUEUE = int(os.environ.get("MICROBATCH_MAX_QUEUE", "1024"))
+MICROBATCH_TIMEOUT = float(os.environ.get("MICROBATCH_TIMEOUT", "30"))
+
+
+class Overloaded(RuntimeError):
+    """Hàng đợi micro-batch đầy hoặc request chờ quá lâu."""
+
+
+class MicroBatcher:
+    def __init__(
+        self,
+        score: Callable[[List[str]], List[Any]],
+        window_ms: float = MICROBATCH_WINDOW_MS,
+        max_batch: int = MICROBATCH_MAX_BATCH,
+        max_queue: int = MICROBATCH_MAX_QUEUE,
+        timeout: float = MICROBATCH_TIMEOUT,
+    ):
+        self._score = score
+        self.window = max(window_ms, 0.0) / 1000.0
+        self.max_batch = max(max_batch, 1)
+        self.timeout = timeout
+        self._queue: "queue.Queue[Tuple[str, Future, float]]" = queue.Queue(maxsize=max(max_queue, 1))
+        self._thread_pid: Optional[int] = None
+        self._lock = threading.Lock()
+        self._arriving = 0  # request đã vào handler nhưng chưa gửi văn bản
+
+    def _ensure_thread(self) -> None:
+        # mỗi tiến trình một luồng gom lô (worker gunicorn fork ra không có luồng của master)
+        if self._thread_pid == os.getpid():
+            return
+        with self._lock:
+            if self._thread_pid != os.getpid():
+                self._thread_pid = os.getpid()
+                threading.Thread(target=self._loop, name="micro-batcher", daemon=True).start()
+
+    def submit(self, text: str) -> Future:
+        self._ensure_thread()
+        fut: Future = Future()
+        try:
+            self._queue.put_nowait((text, fut, time.perf_counter()))
+        except queue.Full:
+            MICROBATCH_REJECTED.inc("queue_full")
+            raise Overloaded("Máy chủ đang quá tải, vui lòng thử lại sau.") from None
+        return fut
+
+    def _arrived(self, n: int) -> None:
+        with self._lock:
+            self._arriving += n
+
+    @contextlib.contextmanager
+    def incoming(self) -> Iterator[Callable[[str], Any]]:
+        """
+        Bao cả handler: báo có request đang tới để luồng gom lô chờ nó, trả về
+        hàm `score` của request đó.
+        """
+        pending = [True]
+
+        def score(text: str) -> Any:
+            if pending[0]:
+                pending[0] = False
+                self._arrived(-1)
+            return self.score(text)
+
+        self._arrived(1)
+        try:
+            yield score
+        finally:
+            if pending[0]:
+                self._arrived(-1)
+
+    def score(self, text: str) -> Any:
+        """Chấm một văn bản qua lô chung; chặn tới khi có kết quả."""
+        fut = self.submit(text)
+        try:
+            return fut.result(self.timeout)
+        except FutureTimeout:
+            fut.cancel()  # còn trong hàng đợi thì luồng gom lô sẽ bỏ qua
+            MICROBATCH_REJECTED.inc("timeout")
+            raise Overloaded("Hết thời gian chờ chấm điểm, vui lòng thử lại sau.") from None
+
+    def _loop(self) -> None:
+        while True:
+            batch = [self._queue.get()]
+            deadline = time.perf_counter() + self.window
+            while len(batch) < self.max_batch:
+                try:
+                    batch.append(self._queue.get_nowait())
+                    continue
+                except queue.Empty:
+                    pass
+                remaining = deadline - time.perf_counter()
+                with self._lock:
+                    arriving = self._arriving
+                if remaining <= 0 or arriving <= 0:
+                    break  # hết cửa sổ, hoặc không còn request nào đang tới để chờ
+                try:
+                    batch.append(self._queue.get(timeout=min(remaining, 0.0005)))
+                except queue.Empty:
+                    pass
+            self._run(batch)
+
+    def _run(self, batch: List[Tuple[str, Future, float]]) -> None:
+        now = time.perf_counter()
+        live = []
+        for text, fut, queued_at in batch:
+            MICROBATCH_QUEUE_SECONDS.observe(now - queued_at)
+            if fut.set_running_or_notify_cancel():
+                live.append((text, fut))
+        if not live:
+            return
+        MICROBATCH_SIZE.observe(len(live))
+        try:
+            results = self._score([text for text, _ in live])
+        except BaseException as e:  # lỗi chấm trả về cho mọi request trong lô
+            for _, fut in live:
+                fut.set_exception(e)
+            return
+        for (_, fut), res in zip(live, results):
+            fut.set_result(res)
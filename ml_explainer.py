@@ -0,0 +1,98 @@
+# -*- coding: utf-8 -*-
+"""
+Giải thích span ML (TF-IDF + LogisticRegression), dựng MỘT lần cho mỗi mô hình.
+
+- Giữ sẵn mảng từ vựng (`get_feature_names_out`) và vector hệ số, không tạo lại
+  mảng cỡ từ vựng ở mỗi request.
+- Chọn top-k đóng góp bằng `np.argpartition` thay vì sắp xếp toàn bộ.
+- Ánh xạ feature n-gram về vị trí ký tự bằng CHÍNH cách tách token của
+  vectorizer (token_pattern), không biên dịch regex mỗi request; chỉ dò các
+  n-gram top-k trên dãy token thay vì dựng mọi n-gram của văn bản.
+"""
+from __future__ import annotations
+
+import re
+from functools import lru_cache
+from typing import Dict, List, Sequence, Tuple
+
+import numpy as np
+
+
+@lru_cache(maxsize=4096)
+def _token_regex(tok: str) -> "re.Pattern[str]":
+    return re.compile(r"(?i)\b" + re.escape(tok) + r"\b")
+
+
+class MLExplainer:
+    def __init__(self, vectorizer, model):
+        self.vectorizer = vectorizer
+        self.model = model
+        self.feature_names = vectorizer.get_feature_names_out()
+        self.coef = np.asarray(model.coef_[0], dtype=np.float64)
+        self.ngram_range: Tuple[int, int] = tuple(getattr(vectorizer, "ngram_range", (1, 1)))
+        self.lowercase = bool(getattr(vectorizer, "lowercase", True))
+        # chỉ tự tách token khi vectorizer dùng analyzer "word" mặc định;
+        # trường hợp khác quay về dò regex theo từng token như trước
+        self._token_re = None
+        if (
+            getattr(vectorizer, "analyzer", "word") == "word"
+            and getattr(vectorizer, "tokenizer", None) is None
+            and getattr(vectorizer, "preprocessor", None) is None
+            and getattr(vectorizer, "strip_accents", None) is None
+        ):
+            self._token_re = re.compile(vectorizer.token_pattern)
+
+    def contributions(self, X):
+        """Ma trận CSR đóng góp từng feature (X * coef) cho cả lô, tính một lần."""
+        X = X.tocsr()
+        C = X.copy()
+        C.data = X.data * self.coef[X.indices]
+        return C
+
+    def top_features(self, cols: Sequence[int], contribs: np.ndarray, top_k: int = 3) -> List[int]:
+        """
+        Chỉ số feature có đóng góp dương lớn nhất (giảm dần). Bằng điểm thì cột
+        lớn hơn đứng trước — đúng thứ tự sklearn trả về trong mỗi dòng, và không
+        phụ thuộc cách ma trận lưu indices (sklearn hay runtime compact).
+        """
+        n = len(contribs)
+        if n == 0 or top_k <= 0:
+            return []
+        cols = np.asarray(cols)
+        if n > top_k:
+            kth = -np.partition(-contribs, top_k - 1)[top_k - 1]
+            cand = np.flatnonzero(contribs >= kth)
+        else:
+            cand = np.arange(n)
+        cand = cand[np.lexsort((-cols[cand], -contribs[cand]))][:top_k]
+        return [int(cols[j]) for j in cand if contribs[j] > 0]
+
+    def _tokens(self, text: str) -> Tuple[List[str], List[Tuple[int, int]]]:
+        words, offsets = [], []
+        for m in self._token_re.finditer(text):
+            words.append(m.group().lower() if self.lowercase else m.group())
+            offsets.append(m.span())
+        return words, offsets
+
+    def locate(self, original_text: str, features: Sequence[int]) -> List[Dict]:
+        """Vị trí ký tự của các feature trong văn bản gốc (span nguồn "ml")."""
+        spans = []
+        if not features:
+            return spans
+        if self._token_re is not None:
+            # chỉ dò đúng top-k n-gram cần tìm trên dãy token, không dựng mọi n-gram của văn bản
+            words, offsets = self._tokens(original_text)
+            for f in features:
+                gram = str(self.feature_names[f]).split(" ")
+                n = len(gram)
+                for i in range(len(words) - n + 1):
+                    if words[i] == gram[0] and words[i:i + n] == gram:
+                        spans.append({"start": offsets[i][0], "end": offsets[i + n - 1][1], "source": {"ml"}})
+        else:
+            for f in features:
+                for m in _token_regex(str(self.feature_names[f])).finditer(original_text):
+                    spans.append({"start": m.start(), "end": m.end(), "source": {"ml"}})
+        return spans
+
+    def row_spans(self, original_text: str, cols, contribs, top_k: int = 3) -> List[Dict]:
+        return self.locate(original_text, self.top_features(cols, contribs, top_k))
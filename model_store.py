@@ -0,0 +1,166 @@
+# -*- coding: utf-8 -*-
+"""
+Kho artifact mô hình (TF-IDF + LogisticRegression) có phiên bản.
+
+- Mỗi artifact được đặt tên theo dấu vân tay (hash) của: dữ liệu huấn luyện,
+  từ điển (lexicon + norm_dict), cấu hình huấn luyện và phiên bản sklearn.
+- `current.json` trỏ tới artifact đang dùng; app chỉ huấn luyện lại khi hash
+  không khớp hoặc khi chạy lệnh `flask --app app train-model`.
+- Kèm mỗi artifact là bản compact NumPy (`compact-<version>/`, xem
+  compact_model.py): tiến trình phục vụ mở thẳng bản này bằng mmap, không cần
+  unpickle (và import) sklearn.
+- Ghi file theo kiểu atomic (file tạm + os.replace) và khoá file khi huấn luyện
+  để nhiều worker khởi động cùng lúc không cùng train một bản.
+"""
+from __future__ import annotations
+
+import contextlib
+import hashlib
+import json
+import os
+import pickle
+import tempfile
+import time
+from typing import Any, Dict, Iterable, Optional, Tuple
+
+try:  # khoá file chỉ có trên POSIX; Windows chạy không khoá
+    import fcntl
+except ImportError:  # pragma: no cover
+    fcntl = None
+
+DEFAULT_DIR = os.environ.get(
+    "MODEL_ARTIFACT_DIR",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "artifacts"),
+)
+MANIFEST = "current.json"
+
+
+def fingerprint(data_paths: Iterable[Optional[str]], extra: Any = None) -> str:
+    """sha256 trên nội dung các file dữ liệu + phần cấu hình `extra` (JSON hoá được)."""
+    h = hashlib.sha256()
+    for p in data_paths:
+        h.update(b"\0path\0")
+        if p and os.path.exists(p):
+            with open(p, "rb") as f:
+                for block in iter(lambda: f.read(1 << 20), b""):
+                    h.update(block)
+        else:
+            h.update(b"<missing>")
+    h.update(json.dumps(extra, ensure_ascii=False, sort_keys=True, default=str).encode("utf-8"))
+    return h.hexdigest()
+
+
+def _atomic_write(path: str, data: bytes) -> None:
+    fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path), prefix=".tmp-")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(data)
+        os.replace(tmp, path)
+    except BaseException:
+        with contextlib.suppress(OSError):
+            os.remove(tmp)
+        raise
+
+
+def read_manifest(directory: str = DEFAULT_DIR) -> Optional[Dict[str, Any]]:
+    try:
+        with open(os.path.join(directory, MANIFEST), encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def load_artifact(fp: str, directory: str = DEFAULT_DIR) -> Optional[Tuple[Any, Any, Dict[str, Any]]]:
+    """Trả về (vectorizer, model, manifest) nếu artifact hiện tại khớp hash `fp`."""
+    manifest = read_manifest(directory)
+    if not manifest or manifest.get("fingerprint") != fp:
+        return None
+    path = os.path.join(directory, manifest.get("file", ""))
+    try:
+        with open(path, "rb") as f:
+            payload = pickle.load(f)
+        return payload["vectorizer"], payload["model"], manifest
+    except Exception:
+        return None
+
+
+def compact_dir(version: str, directory: str = DEFAULT_DIR) -> str:
+    return os.path.join(directory, f"compact-{version}")
+
+
+def ensure_compact_export(vectorizer, model, version: str, directory: str = DEFAULT_DIR) -> str:
+    """Xuất mô hình sang định dạng compact nếu phiên bản này chưa có; trả về thư mục."""
+    from compact_model import META, export_compact_model
+
+    path = compact_dir(version, directory)
+    if not os.path.exists(os.path.join(path, META)):
+        try:
+            export_compact_model(vectorizer, model, path)
+        except OSError:
+            # thư mục artifact chỉ đọc -> xuất vào thư mục tạm của hệ thống
+            path = compact_dir(version, tempfile.gettempdir())
+            if not os.path.exists(os.path.join(path, META)):
+                export_compact_model(vectorizer, model, path)
+    return path
+
+
+def load_compact_artifact(fp: str, directory: str = DEFAULT_DIR) -> Optional[Tuple[Any, Any, Dict[str, Any]]]:
+    """
+    Trả về (CompactVectorizer, CompactClassifier, manifest) mở bằng mmap nếu
+    artifact hiện tại khớp hash `fp` và đã có bản compact; None thì gọi
+    `load_artifact` rồi `ensure_compact_export`.
+    """
+    from compact_model import META, load_compact_model
+
+    manifest = read_manifest(directory)
+    if not manifest or manifest.get("fingerprint") != fp:
+        return None
+    for parent in (directory, tempfile.gettempdir()):
+        path = compact_dir(manifest["version"], parent)
+        if os.path.exists(os.path.join(path, META)):
+            try:
+                vec, clf = load_compact_model(path, mmap=True)
+            except (OSError, ValueError, KeyError):
+                continue
+            return vec, clf, manifest
+    return None
+
+
+def save_artifact(vectorizer, model, fp: str, directory: str = DEFAULT_DIR, **meta) -> Dict[str, Any]:
+    """Lưu artifact mới và chuyển `current.json` sang nó."""
+    import sklearn
+
+    os.makedirs(directory, exist_ok=True)
+    version = fp[:12]
+    filename = f"model-{version}.pkl"
+    _atomic_write(
+        os.path.join(directory, filename),
+        pickle.dumps({"vectorizer": vectorizer, "model": model}, protocol=pickle.HIGHEST_PROTOCOL),
+    )
+    manifest = {
+        "version": version,
+        "fingerprint": fp,
+        "file": filename,
+        "created_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "sklearn": sklearn.__version__,
+        **meta,
+    }
+    _atomic_write(
+        os.path.join(directory, MANIFEST),
+        json.dumps(manifest, ensure_ascii=False, indent=2).encode("utf-8"),
+    )
+    return manifest
+
+
+@contextlib.contextmanager
+def training_lock(directory: str = DEFAULT_DIR):
+    """Khoá liên tiến trình trong lúc huấn luyện/ghi artifact."""
+    os.makedirs(directory, exist_ok=True)
+    with open(os.path.join(directory, ".train.lock"), "a+") as f:
+        if fcntl is not None:
+            fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            if fcntl is not None:
+                fcntl.flock(f.fileno(), fcntl.LOCK_UN)
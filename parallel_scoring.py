@@ -0,0 +1,121 @@
+# -*- coding: utf-8 -*-
+"""
+Chấm điểm song song nhiều lõi cho lô lớn (upload/batch).
+
+- Mô hình hiện tại được xuất một lần sang định dạng compact
+  (`artifacts/compact-<version>/`, xem compact_model.py). Mỗi worker mở các mảng
+  từ vựng / idf / hệ số bằng mmap chỉ đọc: mọi worker dùng chung một bản trong
+  page cache, không pickle vectorizer + dict từ vựng sang từng tiến trình.
+- Văn bản được chia thành các lô PARALLEL_CHUNK_SIZE dòng, chấm bằng đúng lõi
+  `app._predict_batch` trong pool tiến trình (spawn), kết quả trả về đúng thứ tự.
+- Bật bằng PARALLEL_WORKERS=N (mặc định 0 = tắt). Lô nhỏ hơn PARALLEL_MIN_BATCH
+  vẫn chấm tại chỗ vì chi phí gửi qua tiến trình lớn hơn phần tiết kiệm.
+"""
+from __future__ import annotations
+
+import os
+import threading
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import get_context
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
+
+from compact_model import load_compact_model
+from model_store import ensure_compact_export
+from upload_reader import chunked
+
+PARALLEL_WORKERS = int(os.environ.get("PARALLEL_WORKERS", "0"))
+PARALLEL_MIN_BATCH = int(os.environ.get("PARALLEL_MIN_BATCH", "1000"))
+PARALLEL_CHUNK_SIZE = int(os.environ.get("PARALLEL_CHUNK_SIZE", "250"))
+
+
+# =========================
+# Worker (chạy trong tiến trình con)
+# =========================
+_worker_model = None
+
+
+def _worker_init(path: str) -> None:
+    global _worker_model
+    # mỗi worker một lõi: không để BLAS tự mở thêm luồng tranh CPU
+    for var in ("OMP_NUM_THREADS", "OPENBLAS_NUM_THREADS", "MKL_NUM_THREADS"):
+        os.environ.setdefault(var, "1")
+    _worker_model = load_compact_model(path, mmap=True)
+
+
+def _score_chunk(texts: List[str], top_k: int, detail: str = "full") -> List[Dict[str, Any]]:
+    import app as scoring
+
+    vec, clf = _worker_model
+    return scoring._predict_batch(texts, top_k, vec=vec, clf=clf, detail=detail)
+
+
+# =========================
+# Điều phối
+# =========================
+class ParallelScorer:
+    def __init__(self, max_workers: int = PARALLEL_WORKERS, chunk_size: int = PARALLEL_CHUNK_SIZE):
+        self.max_workers = max(1, max_workers)
+        self.chunk_size = chunk_size
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._model_path: Optional[str] = None
+        self._lock = threading.Lock()
+
+    def _pool(self, path: str) -> ProcessPoolExecutor:
+        with self._lock:
+            if self._executor is not None and self._model_path != path:
+                # mô hình đã đổi phiên bản -> worker mới mở bản compact mới
+                self._executor.shutdown(wait=False)
+                self._executor = None
+            if self._executor is None:
+                self._executor = ProcessPoolExecutor(
+                    max_workers=self.max_workers,
+                    mp_context=get_context("spawn"),
+                    initializer=_worker_init,
+                    initargs=(path,),
+                )
+                self._model_path = path
+            return self._executor
+
+    def _current_model_path(self) -> str:
+        import app as scoring
+
+        vec, clf, version = scoring._current_model()
+        # app đang phục vụ bằng chính bản compact -> worker mở lại đúng thư mục đó
+        return getattr(vec, "path", None) or ensure_compact_export(vec, clf, version)
+
+    def iter_batches(
+        self, texts: Iterable[str], top_k: int = 3, detail: str = "full"
+    ) -> Iterator[Tuple[List[str], List[Dict[str, Any]]]]:
+        """
+        Chấm theo lô, trả (lô văn bản, kết quả) theo đúng thứ tự đầu vào. Số lô
+        đang chờ bị giới hạn (2 x số worker) nên đọc được nguồn văn bản rất dài.
+        """
+        pool = self._pool(self._current_model_path())
+        pending: deque = deque()
+        for batch in chunked((str(t) for t in texts), self.chunk_size):
+            pending.append((batch, pool.submit(_score_chunk, batch, top_k, detail)))
+            if len(pending) >= 2 * self.max_workers:
+                batch, future = pending.popleft()
+                yield batch, future.result()
+        while pending:
+            batch, future = pending.popleft()
+            yield batch, future.result()
+
+    def score(self, texts: Iterable[str], top_k: int = 3, detail: str = "full") -> List[Dict[str, Any]]:
+        results: List[Dict[str, Any]] = []
+        for _, batch_results in self.iter_batches(texts, top_k, detail):
+            results.extend(batch_results)
+        return results
+
+    def warmup(self) -> None:
+        """Khởi động đủ worker (import app + mở mmap) trước khi đo/nhận tải."""
+        pool = self._pool(self._current_model_path())
+        for f in [pool.submit(_score_chunk, ["warmup"], 1) for _ in range(self.max_workers)]:
+            f.result()
+
+    def shutdown(self) -> None:
+        with self._lock:
+            if self._executor is not None:
+                self._executor.shutdown(wait=True, cancel_futures=True)
+                self._executor = None
@@ -0,0 +1,225 @@
+# -*- coding: utf-8 -*-
+"""
+Xuất báo cáo kết quả phân tích (văn bản + span bị gắn cờ) ra DOCX / XLSX / CSV / HTML.
+
+- Nguồn item: danh sách `items` client gửi lên hoặc kết quả job nền đọc dần
+  theo trang từ SQLite (`JobStore.iter_results`) — client không phải gửi lại
+  kết quả của file lớn.
+- CSV, HTML: sinh từng đoạn (response streaming), bộ nhớ không phụ thuộc số dòng.
+- XLSX: openpyxl chế độ write_only (ghi từng hàng, không giữ cây ô trong RAM).
+- DOCX: python-docx giữ cả document trong bộ nhớ nên giới hạn
+  EXPORT_DOCX_MAX_ITEMS item; báo cáo lớn hơn dùng XLSX/CSV/HTML.
+- File nhị phân (DOCX/XLSX) ghi vào `SpooledTemporaryFile`: nằm trong RAM tới
+  EXPORT_SPOOL_MB rồi mới tràn ra file tạm vô danh (đã unlink), đóng là mất —
+  không còn file tạm nào sót lại trên đĩa dù request thành công hay lỗi.
+"""
+from __future__ import annotations
+
+import contextlib
+import csv
+import io
+import os
+import re
+import tempfile
+from html import escape
+from typing import IO, Any, Callable, Dict, Iterable, Iterator, List, Tuple
+
+EXPORT_DOCX_MAX_ITEMS = int(os.environ.get("EXPORT_DOCX_MAX_ITEMS", "20000"))
+EXPORT_SPOOL_MB = int(os.environ.get("EXPORT_SPOOL_MB", "32"))
+
+# định dạng -> (mimetype, tên file tải về)
+FORMATS: Dict[str, Tuple[str, str]] = {
+    "docx": (
+        "application/vnd.openxmlformats-officedocument.wordprocessingml.document",
+        "bao_cao_highlight.docx",
+    ),
+    "xlsx": (
+        "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+        "bao_cao_highlight.xlsx",
+    ),
+    "csv": ("text/csv; charset=utf-8", "bao_cao_highlight.csv"),
+    "html": ("text/html; charset=utf-8", "bao_cao_highlight.html"),
+}
+STREAMING_FORMATS = {"csv", "html"}
+# nguồn span hợp lệ (lexicon / viết tắt / ML); nguồn khác từ client bị bỏ
+SPAN_SOURCES = ("lexicon", "abbrev", "ml")
+
+# ký tự điều khiển không hợp lệ trong XML (vd. \x0b từ file upload): DOCX/XLSX báo lỗi nếu giữ
+_XML_ILLEGAL = re.compile("[\x00-\x08\x0b\x0c\x0e-\x1f]")
+
+REPORT_TITLE = "BÁO CÁO PHÂN TÍCH NGÔN TỪ XÚC PHẠM"
+# cùng cột với nút "Export CSV" phía client (static/app.js)
+TABLE_HEADER = ["index", "probability", "prediction", "text", "spans_text", "spans_pos"]
+
+
+def clean_spans(text: str, spans: Any) -> List[Dict[str, Any]]:
+    """
+    Span hợp lệ, đã sắp xếp, không chồng lấn, nằm trong văn bản, nguồn thuộc
+    SPAN_SOURCES (dữ liệu client không tin được).
+    """
+    out: List[Dict[str, Any]] = []
+    candidates = []
+    for s in spans if isinstance(spans, list) else []:
+        try:
+            start, end = int(s["start"]), int(s["end"])
+        except (KeyError, TypeError, ValueError):
+            continue
+        start, end = max(0, start), min(len(text), end)
+        if start < end:
+            candidates.append((start, end, s))
+    last = 0
+    for start, end, s in sorted(candidates, key=lambda c: (c[0], c[1])):
+        source = s.get("source", [])
+        source = [x for x in (source if isinstance(source, (list, tuple)) else [source]) if x in SPAN_SOURCES]
+        if start < last or not source:
+            continue
+        out.append({
+            "start": start,
+            "end": end,
+            "text": text[start:end],
+            "source": source,
+        })
+        last = end
+    return out
+
+
+def iter_report_items(items: Iterable[Any]) -> Iterator[Dict[str, Any]]:
+    """Chuẩn hoá item (từ client hoặc job) về {index, text, spans, probability_profane, prediction}."""
+    for pos, it in enumerate(items):
+        if not isinstance(it, dict):
+            continue
+        text = str(it.get("text", ""))
+        try:
+            index = int(it.get("index", pos))
+        except (TypeError, ValueError):
+            index = pos
+        prob = it.get("probability_profane")
+        yield {
+            "index": index,
+            "text": text,
+            "spans": clean_spans(text, it.get("spans")),
+            "probability_profane": prob if isinstance(prob, (int, float)) else None,
+            "prediction": 1 if it.get("prediction") == 1 else 0,
+        }
+
+
+def _row(it: Dict[str, Any]) -> List[Any]:
+    spans = it["spans"]
+    return [
+        it["index"] + 1,
+        "" if it["probability_profane"] is None else it["probability_profane"],
+        it["prediction"],
+        it["text"],
+        "|".join(s["text"] for s in spans),
+        "|".join(f"[{s['start']},{s['end']})" for s in spans),
+    ]
+
+
+def _label(it: Dict[str, Any]) -> str:
+    prob = it["probability_profane"]
+    return (f"Dòng #{it['index'] + 1} — Xác suất: {prob if prob is not None else 'N/A'}% — "
+            f"Kết luận: {'Xúc phạm' if it['prediction'] == 1 else 'Không'}")
+
+
+# =========================
+# Định dạng streaming (CSV / HTML)
+# =========================
+def iter_csv(items: Iterable[Dict[str, Any]], flush_rows: int = 500) -> Iterator[str]:
+    """CSV UTF-8 có BOM (Excel mở đúng tiếng Việt), trả theo khối `flush_rows` dòng."""
+    buf = io.StringIO()
+    writer = csv.writer(buf)
+    buf.write("\ufeff")
+    writer.writerow(TABLE_HEADER)
+    for n, it in enumerate(items, 1):
+        writer.writerow(_row(it))
+        if n % flush_rows == 0:
+            yield buf.getvalue()
+            buf.seek(0)
+            buf.truncate()
+    yield buf.getvalue()
+
+
+def iter_html(
+    items: Iterable[Dict[str, Any]], highlight: Callable[[str, List[Dict[str, Any]]], str], flush_rows: int = 200
+) -> Iterator[str]:
+    """Trang HTML độc lập; highlight dựng lại từ text + span (không dùng HTML client gửi lên)."""
+    parts = [
+        "<!DOCTYPE html>\n<html lang='vi'><head><meta charset='utf-8'>"
+        f"<title>{escape(REPORT_TITLE)}</title><style>"
+        "body{font-family:sans-serif;margin:2em}mark{background:#ffeb3b}"
+        ".item{margin:0 0 1em}.meta{color:#555;font-size:.9em}</style></head><body>"
+        f"<h1>{escape(REPORT_TITLE)}</h1>\n"
+    ]
+    for n, it in enumerate(items, 1):
+        parts.append(
+            f"<div class='item'><div class='meta'>{escape(_label(it))}</div>"
+            f"<div>{highlight(it['text'], it['spans'])}</div></div>\n"
+        )
+        if n % flush_rows == 0:
+            yield "".join(parts)
+            parts = []
+    parts.append("</body></html>\n")
+    yield "".join(parts)
+
+
+# =========================
+# Định dạng nhị phân (DOCX / XLSX) -> file spooled
+# =========================
+def write_docx(items: Iterable[Dict[str, Any]], fp: IO[bytes], max_items: int = EXPORT_DOCX_MAX_ITEMS) -> None:
+    from docx import Document
+    from docx.enum.text import WD_COLOR_INDEX
+
+    doc = Document()
+    doc.add_heading(REPORT_TITLE, level=1)
+    for n, it in enumerate(items, 1):
+        if n > max_items:
+            raise ValueError(
+                f"DOCX tối đa {max_items} dòng; báo cáo lớn hơn hãy dùng format=xlsx, csv hoặc html."
+            )
+        text = it["text"]
+        doc.add_paragraph("• " + _label(it))
+        # paragraph có highlight
+        p = doc.add_paragraph()
+        last = 0
+        for s in it["spans"]:
+            if s["start"] > last:
+                p.add_run(_XML_ILLEGAL.sub("", text[last:s["start"]]))
+            r = p.add_run(_XML_ILLEGAL.sub("", text[s["start"]:s["end"]]))
+            r.font.highlight_color = WD_COLOR_INDEX.YELLOW
+            last = s["end"]
+        if last < len(text):
+            p.add_run(_XML_ILLEGAL.sub("", text[last:]))
+    doc.save(fp)
+
+
+def write_xlsx(items: Iterable[Dict[str, Any]], fp: IO[bytes]) -> None:
+    from openpyxl import Workbook
+
+    wb = Workbook(write_only=True)
+    ws = wb.create_sheet("ket_qua")
+    try:
+        ws.append(TABLE_HEADER)
+        for it in items:
+            ws.append([_XML_ILLEGAL.sub("", v) if isinstance(v, str) else v for v in _row(it)])
+        wb.save(fp)
+    except BaseException:
+        # write_only ghi sheet ra file tạm và chỉ tự xoá khi save xong
+        writer = getattr(ws, "_writer", None)
+        if writer is not None and isinstance(getattr(writer, "out", None), str):
+            with contextlib.suppress(Exception):
+                writer.close()
+                writer.cleanup()
+        raise
+
+
+def spooled_report(fmt: str, items: Iterable[Dict[str, Any]]) -> IO[bytes]:
+    """Ghi báo cáo DOCX/XLSX vào file spooled, trả về file đã seek(0); lỗi thì đóng (xoá) luôn."""
+    writer = {"docx": write_docx, "xlsx": write_xlsx}[fmt]
+    fp = tempfile.SpooledTemporaryFile(max_size=EXPORT_SPOOL_MB << 20)
+    try:
+        writer(items, fp)
+        fp.seek(0)
+    except BaseException:
+        fp.close()
+        raise
+    return fp
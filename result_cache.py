@@ -0,0 +1,130 @@
+# -*- coding: utf-8 -*-
+"""
+Cache kết quả phân tích theo văn bản (LRU, giới hạn số mục và dung lượng).
+
+Phản hồi sinh viên có rất nhiều câu trùng lặp ("ok", "cảm ơn thầy", bình luận
+theo mẫu, file upload lại): kết quả đã tính được dùng lại thay vì chuẩn hoá,
+transform, predict và dò span lại từ đầu.
+
+- Khoá = blake2b(văn bản) + biến thể (top_k, mức chi tiết): nhiều biến thể của
+  cùng văn bản nằm chung cache, client trộn ?detail= không xoá cache của nhau.
+- Phiên bản (mô hình, từ điển) chung cho cả cache: khi đổi (huấn luyện lại /
+  đổi từ điển) mọi mục cũ không còn đúng và bị xoá.
+- Giới hạn RESULT_CACHE_SIZE mục (0 = tắt) và RESULT_CACHE_MAX_MB (ước lượng).
+- Đếm hit / miss / eviction để theo dõi tỉ lệ trúng cache.
+"""
+from __future__ import annotations
+
+import hashlib
+import sys
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, Hashable, Optional
+
+RESULT_CACHE_SIZE_DEFAULT = 10000
+RESULT_CACHE_MAX_MB_DEFAULT = 64
+
+
+def text_key(text: str) -> bytes:
+    return hashlib.blake2b(text.encode("utf-8", "surrogatepass"), digest_size=16).digest()
+
+
+def _approx_size(text: str, result: Dict[str, Any]) -> int:
+    # ước lượng thô, đủ để chặn bộ nhớ; không duyệt sâu từng object
+    size = 200 + sys.getsizeof(text)
+    for v in result.values():
+        if isinstance(v, str):
+            size += sys.getsizeof(v)
+        elif isinstance(v, list):
+            size += 64 + 160 * len(v)
+        else:
+            size += 32
+    return size
+
+
+def _copy(value: Any) -> Any:
+    # chép sâu phần dict / list (span, đặc trưng ML); giá trị lá (str, số) bất biến nên dùng chung
+    if isinstance(value, dict):
+        return {k: _copy(v) for k, v in value.items()}
+    if isinstance(value, list):
+        return [_copy(v) for v in value]
+    return value
+
+
+class ResultCache:
+    def __init__(self, max_items: int = RESULT_CACHE_SIZE_DEFAULT, max_bytes: int = RESULT_CACHE_MAX_MB_DEFAULT << 20):
+        self.max_items = max_items
+        self.max_bytes = max_bytes
+        self._data: OrderedDict = OrderedDict()  # (biến thể, băm văn bản) -> (kết quả, kích thước)
+        self._version: Optional[Hashable] = None
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_items > 0 and self.max_bytes > 0
+
+    def _check_version(self, version: Hashable) -> None:
+        if version != self._version:
+            self._data.clear()
+            self._bytes = 0
+            self._version = version
+
+    def get(self, text: str, version: Hashable, variant: Hashable = ()) -> Optional[Dict[str, Any]]:
+        """Bản sao của kết quả đã lưu (sửa span của bản sao không đụng tới cache), hoặc None."""
+        if not self.enabled:
+            return None
+        key = (variant, text_key(text))
+        with self._lock:
+            self._check_version(version)
+            entry = self._data.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self._data.move_to_end(key)
+            self.hits += 1
+        return _copy(entry[0])
+
+    def put(self, text: str, version: Hashable, result: Dict[str, Any], variant: Hashable = ()) -> None:
+        if not self.enabled:
+            return
+        key = (variant, text_key(text))
+        size = _approx_size(text, result)
+        if size > self.max_bytes:
+            return
+        stored = _copy(result)  # người gọi vẫn giữ và có thể sửa `result`
+        with self._lock:
+            self._check_version(version)
+            old = self._data.pop(key, None)
+            if old is not None:
+                self._bytes -= old[1]
+            self._data[key] = (stored, size)
+            self._bytes += size
+            while len(self._data) > self.max_items or self._bytes > self.max_bytes:
+                _, (_, evicted) = self._data.popitem(last=False)
+                self._bytes -= evicted
+                self.evictions += 1
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+            self._bytes = 0
+            self._version = None
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "enabled": self.enabled,
+                "items": len(self._data),
+                "bytes": self._bytes,
+                "max_items": self.max_items,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_rate": round(self.hits / total, 4) if total else 0.0,
+            }
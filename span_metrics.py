@@ -0,0 +1,212 @@
+# -*- coding: utf-8 -*-
+"""
+Chấm span (dự đoán vs ground-truth) không cần tập ký tự.
+
+- Mức ký tự: TP/FP/FN tính thẳng trên danh sách khoảng [start, end) đã sắp xếp
+  và gộp (hai con trỏ, O(số span)), hoặc bằng mặt nạ boolean NumPy cho cả lô
+  (`batch_char_counts`). Kết quả giống hệt cách cũ dựng `set` từng vị trí ký tự.
+- Mức token: token (mặc định `\\w+`) được tính là dương nếu chạm vào một span.
+- Khớp chính xác: span dự đoán trùng khít (start, end) với span thật.
+- Tổng hợp toàn corpus: micro (cộng TP/FP/FN rồi tính) hoặc macro (trung bình
+  F1 từng văn bản, quy ước như char_f1 cũ: cả hai rỗng -> 1, dự đoán rỗng -> 0).
+"""
+from __future__ import annotations
+
+import re
+from typing import Any, Dict, Iterable, List, Mapping, Optional, Sequence, Tuple
+
+import numpy as np
+
+Interval = Tuple[int, int]
+Counts = Tuple[int, int, int]  # (tp, fp, fn)
+
+_TOKEN_RE = re.compile(r"\w+")
+
+
+def to_intervals(spans: Iterable[Any]) -> List[Interval]:
+    """Span dạng dict {"start","end"} hoặc tuple (start, end) -> khoảng đã sắp xếp, gộp, bỏ rỗng."""
+    raw = []
+    for s in spans:
+        a, b = (s["start"], s["end"]) if isinstance(s, (dict, Mapping)) else s
+        a, b = max(0, int(a)), max(0, int(b))
+        if b > a:
+            raw.append((a, b))
+    raw.sort()
+    merged: List[Interval] = []
+    for a, b in raw:
+        if merged and a <= merged[-1][1]:
+            if b > merged[-1][1]:
+                merged[-1] = (merged[-1][0], b)
+        else:
+            merged.append((a, b))
+    return merged
+
+
+def _length(intervals: Sequence[Interval]) -> int:
+    return sum(b - a for a, b in intervals)
+
+
+def _overlap(P: Sequence[Interval], G: Sequence[Interval]) -> int:
+    i = j = total = 0
+    while i < len(P) and j < len(G):
+        a = max(P[i][0], G[j][0])
+        b = min(P[i][1], G[j][1])
+        if b > a:
+            total += b - a
+        if P[i][1] < G[j][1]:
+            i += 1
+        else:
+            j += 1
+    return total
+
+
+# =========================
+# Đếm TP/FP/FN
+# =========================
+def char_counts(pred: Iterable[Any], gt: Iterable[Any]) -> Counts:
+    P, G = to_intervals(pred), to_intervals(gt)
+    tp = _overlap(P, G)
+    return tp, _length(P) - tp, _length(G) - tp
+
+
+def batch_char_counts(preds: Sequence[Iterable[Any]], gts: Sequence[Iterable[Any]]) -> np.ndarray:
+    """
+    TP/FP/FN mức ký tự cho cả lô bằng mặt nạ NumPy: mọi văn bản được trải trên
+    một trục chung, mỗi span cộng +1/-1 vào mảng hiệu rồi cumsum ra mặt nạ.
+    Trả về mảng (n, 3) các cột tp, fp, fn.
+    """
+    return _batch_char_counts([to_intervals(p) for p in preds], [to_intervals(g) for g in gts])
+
+
+def _batch_char_counts(Ps: List[List[Interval]], Gs: List[List[Interval]]) -> np.ndarray:
+    n = len(Ps)
+    ends = [max([b for _, b in P] + [b for _, b in G] + [0]) for P, G in zip(Ps, Gs)]
+    offsets = np.concatenate([[0], np.cumsum(ends)]).astype(np.int64)
+    total = int(offsets[-1])
+
+    def mask(all_intervals: List[List[Interval]]) -> np.ndarray:
+        diff = np.zeros(total + 1, dtype=np.int32)
+        starts = [offsets[d] + a for d, iv in enumerate(all_intervals) for a, _ in iv]
+        stops = [offsets[d] + b for d, iv in enumerate(all_intervals) for _, b in iv]
+        np.add.at(diff, np.asarray(starts, dtype=np.int64), 1)
+        np.add.at(diff, np.asarray(stops, dtype=np.int64), -1)
+        return np.cumsum(diff[:-1]) > 0
+
+    P, G = mask(Ps), mask(Gs)
+    doc = np.repeat(np.arange(n), ends)
+    out = np.zeros((n, 3), dtype=np.int64)
+    out[:, 0] = np.bincount(doc[P & G], minlength=n)
+    out[:, 1] = np.bincount(doc[P & ~G], minlength=n)
+    out[:, 2] = np.bincount(doc[~P & G], minlength=n)
+    return out
+
+
+def _token_hits(intervals: List[Interval], tokens: List[Interval]) -> List[bool]:
+    if not intervals:
+        return [False] * len(tokens)
+    out, k = [], 0
+    for a, b in tokens:
+        while k < len(intervals) and intervals[k][1] <= a:
+            k += 1
+        out.append(k < len(intervals) and intervals[k][0] < b)
+    return out
+
+
+def _token_counts(tokens: List[Interval], P: List[Interval], gt_hits: List[bool]) -> Counts:
+    tp = fp = fn = 0
+    for p, g in zip(_token_hits(P, tokens), gt_hits):
+        tp += p and g
+        fp += p and not g
+        fn += g and not p
+    return tp, fp, fn
+
+
+def token_counts(text: str, pred: Iterable[Any], gt: Iterable[Any], token_re: "re.Pattern[str]" = _TOKEN_RE) -> Counts:
+    """Token chạm vào span dự đoán / span thật -> TP/FP/FN theo token."""
+    tokens = [m.span() for m in token_re.finditer(text)]
+    return _token_counts(tokens, to_intervals(pred), _token_hits(to_intervals(gt), tokens))
+
+
+def _exact_counts(P: List[Interval], G: List[Interval]) -> Counts:
+    tp = len(set(P) & set(G))
+    return tp, len(P) - tp, len(G) - tp
+
+
+def exact_counts(pred: Iterable[Any], gt: Iterable[Any]) -> Counts:
+    """Span (đã gộp) dự đoán trùng khít span thật."""
+    return _exact_counts(to_intervals(pred), to_intervals(gt))
+
+
+# =========================
+# Precision / Recall / F1
+# =========================
+def prf(counts: Counts) -> Tuple[float, float, float]:
+    """Quy ước như char_f1 cũ: không có gì để chấm -> 1; dự đoán rỗng -> 0."""
+    tp, fp, fn = (int(c) for c in counts)
+    if tp + fp == 0 and tp + fn == 0:
+        return 1.0, 1.0, 1.0
+    if tp + fp == 0:
+        return 0.0, 0.0, 0.0
+    prec = tp / (tp + fp)
+    rec = tp / (tp + fn) if tp + fn else 0.0
+    f1 = 2 * prec * rec / (prec + rec) if prec + rec else 0.0
+    return prec, rec, f1
+
+
+def char_prf(pred: Iterable[Any], gt: Iterable[Any]) -> Tuple[float, float, float]:
+    return prf(char_counts(pred, gt))
+
+
+def aggregate(counts: Iterable[Counts], average: str = "macro") -> Dict[str, float]:
+    """
+    Gộp nhiều văn bản: "micro" cộng TP/FP/FN rồi tính P/R/F1; "macro" lấy trung
+    bình P/R/F1 từng văn bản. Không có văn bản nào -> nan cho cả hai cách (như
+    np.mean([]) của cách cũ).
+    """
+    counts = list(counts)
+    if average not in ("micro", "macro"):
+        raise ValueError("average phải là 'micro' hoặc 'macro'")
+    if not counts:
+        return {"precision": float("nan"), "recall": float("nan"), "f1": float("nan")}
+    if average == "micro":
+        tp, fp, fn = (sum(int(c[i]) for c in counts) for i in range(3))
+        p, r, f1 = prf((tp, fp, fn))
+    else:
+        scores = [prf(c) for c in counts]
+        p, r, f1 = (float(np.mean([s[i] for s in scores])) for i in range(3))
+    return {"precision": p, "recall": r, "f1": f1}
+
+
+def span_reports(
+    texts: Sequence[str], gts: Sequence[Iterable[Any]], systems: Mapping[str, Sequence[Iterable[Any]]],
+    token_re: Optional["re.Pattern[str]"] = None,
+) -> Dict[str, Dict[str, Dict[str, Dict[str, float]]]]:
+    """
+    Bảng đầy đủ cho nhiều hệ thống trên cùng một tập (token và span thật chỉ
+    xử lý một lần): {tên: {char|token|exact: {micro|macro: {precision, recall, f1}}}}.
+    """
+    token_re = token_re or _TOKEN_RE
+    Gs = [to_intervals(g) for g in gts]
+    tokens = [[m.span() for m in token_re.finditer(t)] for t in texts]
+    gt_hits = [_token_hits(G, tok) for G, tok in zip(Gs, tokens)]
+    out = {}
+    for name, preds in systems.items():
+        Ps = [to_intervals(p) for p in preds]
+        levels = {
+            "char": [tuple(c) for c in _batch_char_counts(Ps, Gs)],
+            "token": [_token_counts(tok, P, gh) for tok, P, gh in zip(tokens, Ps, gt_hits)],
+            "exact": [_exact_counts(P, G) for P, G in zip(Ps, Gs)],
+        }
+        out[name] = {
+            level: {avg: aggregate(c, avg) for avg in ("micro", "macro")}
+            for level, c in levels.items()
+        }
+    return out
+
+
+def span_report(
+    texts: Sequence[str], preds: Sequence[Iterable[Any]], gts: Sequence[Iterable[Any]],
+    token_re: Optional["re.Pattern[str]"] = None,
+) -> Dict[str, Dict[str, Dict[str, float]]]:
+    """Bảng đầy đủ cho một hệ thống: {char|token|exact: {micro|macro: {precision, recall, f1}}}."""
+    return span_reports(texts, gts, {"_": preds}, token_re)["_"]
@@ -158,26 +158,33 @@
   }
 
   // ----- Batch rendering -----
-  function renderBatch(data){
-    const items = Array.isArray(data.items) ? data.items : [];
-    lastBatchData = data;
+  function effectiveProb(it){
+    return (typeof it.probability_profane === 'number') ? Number(it.probability_profane) : (it.prediction ? 100 : 0);
+  }
 
+  function isOffensive(it, threshold){
+    return (effectiveProb(it) >= threshold) || it.is_profane_by_list || (Array.isArray(it.spans) && it.spans.length>0);
+  }
+
+  function updateBatchChart(items){
     // Count for doughnut (theo ngưỡng + span)
     const threshold = Number(thSlider.value);
     let off = 0, clean = 0;
-    items.forEach(it => {
-      const p = (typeof it.probability_profane === 'number') ? Number(it.probability_profane) : (it.prediction ? 100 : 0);
-      const eff = (p >= threshold) || it.is_profane_by_list || (Array.isArray(it.spans) && it.spans.length>0);
-      if (eff) off++; else clean++;
-    });
-    destroyChart(batchChart);
-    batchChart = doughnut(document.getElementById('batchChart').getContext('2d'), [off, clean]);
+    items.forEach(it => { if (isOffensive(it, threshold)) off++; else clean++; });
+    if (batchChart) {
+      batchChart.data.datasets[0].data = [off, clean];
+      batchChart.update('none');
+    } else {
+      batchChart = doughnut(document.getElementById('batchChart').getContext('2d'), [off, clean]);
+    }
+  }
 
-    // Bảng tổng hợp — hiển thị TỐI ĐA 200 dòng (server cũng đã giới hạn 200)
-    batchBody.innerHTML = '';
+  function appendBatchRows(items){
+    const threshold = Number(thSlider.value);
+    const frag = document.createDocumentFragment();
     items.forEach(it => {
-      const p = (typeof it.probability_profane === 'number') ? Number(it.probability_profane) : (it.prediction ? 100 : 0);
-      const eff = (p >= threshold) || it.is_profane_by_list || (Array.isArray(it.spans) && it.spans.length>0);
+      const p = effectiveProb(it);
+      const eff = isOffensive(it, threshold);
       const tr = document.createElement('tr');
       const textCell = document.createElement('td');
 
@@ -189,17 +196,70 @@
       }
 
       tr.innerHTML = `
-        <td>${it.index + 1}</td>
+        <td title="${escapeHtml(locationLabel(it.location))}">${it.index + 1}</td>
         <td>${p}</td>
         <td>${eff ? 'Độc hại' : 'Không độc hại'}</td>
       `;
       tr.appendChild(textCell);
-      batchBody.appendChild(tr);
+      frag.appendChild(tr);
     });
+    batchBody.appendChild(frag);
+  }
+
+  // vị trí trong file gốc do /api/upload trả về (trang/dòng PDF, đoạn DOCX, hàng CSV/XLSX)
+  function locationLabel(loc){
+    if (!loc) return '';
+    if (loc.page) return `Trang ${loc.page}, dòng ${loc.line}`;
+    if (loc.paragraph) return `Đoạn ${loc.paragraph}`;
+    if (loc.row) return `Hàng ${loc.row}`;
+    if (loc.line) return `Dòng ${loc.line}`;
+    return '';
+  }
+
+  function renderBatch(data){
+    const items = Array.isArray(data.items) ? data.items : [];
+    lastBatchData = data;
+
+    destroyChart(batchChart);
+    batchChart = null;
+    updateBatchChart(items);
+
+    batchBody.innerHTML = '';
+    appendBatchRows(items);
 
     batchCard.style.display = 'block';
   }
 
+  // Đọc NDJSON theo luồng: mỗi dòng là 1 item, dòng cuối {done, count} hoặc {error}
+  async function readNdjson(res, onItems){
+    const decoder = new TextDecoder('utf-8');
+    let buf = '';
+    const flush = (text, final) => {
+      buf += text;
+      const lines = buf.split('\n');
+      buf = final ? '' : lines.pop();
+      const items = [];
+      lines.forEach(line => {
+        if (!line.trim()) return;
+        const obj = JSON.parse(line);
+        if (obj.error) throw new Error(obj.error);
+        if (!obj.done) items.push(obj);
+      });
+      if (items.length) onItems(items);
+    };
+    if (!res.body || !res.body.getReader) {
+      flush(await res.text(), true);
+      return;
+    }
+    const reader = res.body.getReader();
+    for (;;) {
+      const { value, done } = await reader.read();
+      if (done) break;
+      flush(decoder.decode(value, { stream: true }), false);
+    }
+    flush(decoder.decode(), true);
+  }
+
   // ----- Events -----
   btnPredict.addEventListener('click', async () => {
     const val = (txt.value || '').trim();
@@ -248,15 +308,23 @@
     form.append('file', file);
 
     try{
-      const res = await fetch('/api/upload', { method: 'POST', body: form });
-      const data = await res.json();
-      if(data.error){ throw new Error(data.error); }
+      const res = await fetch('/api/upload?stream=1', { method: 'POST', body: form });
+      if(!res.ok){
+        const data = await res.json().catch(() => ({}));
+        throw new Error(data.error || 'Tải lên thất bại');
+      }
 
-      lastBatchData = data;
-      renderBatch(data);
+      // hiển thị dần từng lô kết quả ngay khi server trả về
+      lastBatchData = { items: [] };
+      renderBatch(lastBatchData);
+      await readNdjson(res, items => {
+        lastBatchData.items.push(...items);
+        appendBatchRows(items);
+        updateBatchChart(lastBatchData.items);
+      });
     } catch (e) {
       alert('Lỗi: ' + (e.message || 'không xác định'));
-      batchCard.style.display = 'none';
+      if(!lastBatchData || !lastBatchData.items.length){ batchCard.style.display = 'none'; }
     }
   });
 
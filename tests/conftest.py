@@ -0,0 +1,8 @@
+# -*- coding: utf-8 -*-
+import os
+import sys
+
+# các module của repo nằm phẳng ở thư mục gốc
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
@@ -0,0 +1,59 @@
+# -*- coding: utf-8 -*-
+import csv
+import os
+
+import numpy as np
+import pytest
+from sklearn.feature_extraction.text import TfidfVectorizer
+from sklearn.linear_model import LogisticRegression
+
+from compact_model import export_compact_model, load_compact_model
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+VECTORIZERS = [
+    dict(ngram_range=(1, 2), min_df=1, max_df=0.95),
+    dict(ngram_range=(1, 3), sublinear_tf=True),
+    dict(norm="l1", binary=True),
+    dict(ngram_range=(1, 2), smooth_idf=False, lowercase=False),
+]
+
+
+@pytest.fixture(scope="module")
+def corpus():
+    with open(os.path.join(ROOT, "data_eval.csv"), encoding="utf-8") as f:
+        rows = list(csv.DictReader(f))
+    texts = [r["text"] for r in rows]
+    labels = [int(r["label"]) for r in rows]
+    # văn bản chưa thấy khi huấn luyện: từ lạ, dấu câu, hoa/thường, rỗng
+    unseen = ["", "   ", "Thầy DẠY hay!!! 👍", "x_y z-1 đm,vcl", "ngu ngu ngu ngu"]
+    return texts, labels, texts + unseen
+
+
+@pytest.mark.parametrize("params", VECTORIZERS, ids=lambda p: ",".join(f"{k}={v}" for k, v in p.items()))
+def test_predict_proba_matches_sklearn(params, corpus, tmp_path):
+    texts, labels, probe = corpus
+    vec = TfidfVectorizer(**params)
+    clf = LogisticRegression(max_iter=1000).fit(vec.fit_transform(texts), labels)
+    export_compact_model(vec, clf, str(tmp_path / "compact"))
+    cvec, cclf = load_compact_model(str(tmp_path / "compact"))
+
+    expected = clf.predict_proba(vec.transform(probe))
+    got = cclf.predict_proba(cvec.transform(probe))
+    assert np.max(np.abs(got - expected)) < 1e-9
+    assert list(cclf.predict(cvec.transform(probe))) == list(clf.predict(vec.transform(probe)))
+
+
+@pytest.mark.parametrize("params", [
+    dict(analyzer="char"),
+    dict(analyzer="char_wb", ngram_range=(2, 4)),
+    dict(stop_words=["và"]),
+    dict(tokenizer=str.split, token_pattern=None),
+])
+def test_unsupported_vectorizer_rejected(params, corpus, tmp_path):
+    texts, labels, _ = corpus
+    vec = TfidfVectorizer(**params)
+    clf = LogisticRegression(max_iter=1000).fit(vec.fit_transform(texts), labels)
+    with pytest.raises(ValueError):
+        export_compact_model(vec, clf, str(tmp_path / "compact"))
+    assert not (tmp_path / "compact").exists()
@@ -0,0 +1,38 @@
+# -*- coding: utf-8 -*-
+import os
+import time
+
+import jobs
+
+
+def _texts_job(store, texts):
+    path = os.path.join(store.directory, "inputs", "t.jsonl")
+    with open(path, "w", encoding="utf-8") as f:
+        f.writelines(f'"{t}"\n' for t in texts)
+    return store.create("texts", path, total=len(texts), job_id="t"), path
+
+
+def test_input_removed_when_job_finishes(tmp_path):
+    store = jobs.JobStore(str(tmp_path))
+    job_id, path = _texts_job(store, ["mày ngu quá", "cảm ơn thầy"])
+    jobs.run_job(str(tmp_path), job_id)
+    assert store.get(job_id)["status"] == "done"
+    assert len(store.results(job_id)) == 2
+    assert not os.path.exists(path)
+
+
+def test_purge_drops_old_finished_jobs(tmp_path):
+    store = jobs.JobStore(str(tmp_path))
+    job_id, path = _texts_job(store, ["ok"])
+    store.add_results(job_id, [{"index": 0, "text": "ok"}])
+    running = store.create("texts", os.path.join(str(tmp_path), "inputs", "r.jsonl"))
+    orphan = os.path.join(str(tmp_path), "inputs", "orphan.csv")
+    open(orphan, "w").close()
+    os.utime(orphan, (0, 0))
+
+    assert store.purge(time.time() - 3600) == 0  # chưa đủ cũ
+    store.update(job_id, status="done")
+    assert store.purge(time.time() + 1) == 1
+    assert store.get(job_id) is None and store.results(job_id) == []
+    assert not os.path.exists(path) and not os.path.exists(orphan)
+    assert store.get(running)["status"] == "queued"  # job chưa xong không bị xoá
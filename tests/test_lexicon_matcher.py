@@ -0,0 +1,59 @@
+# -*- coding: utf-8 -*-
+import random
+
+from app import _merge_spans
+from lexicon_matcher import LexiconMatcher, term_to_regex
+
+
+def per_term(terms, text):
+    """Cách dò cũ: mỗi từ khoá một regex + finditer."""
+    return sorted({(m.start(), m.end()) for t in terms for m in term_to_regex(t).finditer(text)})
+
+
+def longest_per_start(spans):
+    out = {}
+    for a, b in spans:
+        out[a] = max(out.get(a, a), b)
+    return sorted(out.items())
+
+
+def merged(spans, text):
+    return [(m["start"], m["end"]) for m in _merge_spans(
+        [{"start": a, "end": b, "source": {"lexicon"}} for a, b in spans], text
+    )]
+
+
+def test_literal_term_behind_wildcard_branch():
+    terms = ["a*b", "ab cd"]
+    assert per_term(terms, "ab cd") == [(0, 2), (0, 5)]
+    assert list(LexiconMatcher(terms).finditer("ab cd")) == [(0, 5)]
+
+
+def test_shared_prefix_returns_longest():
+    terms = ["ngu", "ngu ngốc", "đ*m", "đồ ngu"]
+    text = "Đồ  NGU ngốc, đ.m"
+    assert list(LexiconMatcher(terms).finditer(text)) == longest_per_start(per_term(terms, text))
+
+
+def test_matches_per_term_regex_on_random_inputs():
+    rnd = random.Random(0)
+    alphabet = "abcđ"
+
+    def word():
+        return "".join(rnd.choice(alphabet) for _ in range(rnd.randint(1, 3)))
+
+    for _ in range(1000):
+        terms = []
+        for _ in range(rnd.randint(1, 6)):
+            t = " ".join(word() for _ in range(rnd.randint(1, 2)))
+            if rnd.random() < 0.4:
+                i = rnd.randrange(len(t) + 1)
+                t = t[:i] + "*" + t[i:]
+            terms.append(t)
+        text = "".join(rnd.choice(alphabet + " .") for _ in range(rnd.randint(0, 30)))
+        got = list(LexiconMatcher(terms).finditer(text))
+        old = per_term(terms, text)
+        # mọi vị trí bắt đầu của cách cũ vẫn có khớp, dài ít nhất bằng; span highlight sau khi gộp giống hệt
+        ends = dict(got)
+        assert all(ends.get(a, -1) >= b for a, b in old), (terms, text)
+        assert merged(got, text) == merged(old, text), (terms, text)
@@ -0,0 +1,40 @@
+# -*- coding: utf-8 -*-
+import app
+from report_export import clean_spans
+
+HOSTILE = "x'><script>alert(1)</script>"
+
+
+def test_clean_spans_keeps_only_known_sources():
+    spans = [
+        {"start": 0, "end": 5, "source": [HOSTILE]},
+        {"start": 6, "end": 11, "source": ["lexicon", HOSTILE, "ml"]},
+        {"start": 12, "end": 15, "source": "abbrev"},
+    ]
+    out = clean_spans("hello world dm", spans)
+    assert [(s["start"], s["end"], s["source"]) for s in out] == [
+        (6, 11, ["lexicon", "ml"]),
+        (12, 14, ["abbrev"]),
+    ]
+
+
+def test_highlight_escapes_source():
+    html = app.make_highlight_html("hello", [{"start": 0, "end": 5, "source": [HOSTILE]}])
+    assert "<script>" not in html
+    assert "&#x27;&gt;&lt;script&gt;" in html
+
+
+def test_export_html_with_hostile_source():
+    client = app.app.test_client()
+    resp = client.post("/api/export?format=html", json={"items": [{
+        "text": "hello dm",
+        "prediction": 1,
+        "spans": [
+            {"start": 0, "end": 5, "source": [HOSTILE]},
+            {"start": 6, "end": 8, "source": ["lexicon", HOSTILE]},
+        ],
+    }]})
+    assert resp.status_code == 200
+    body = resp.get_data(as_text=True)
+    assert "<script>" not in body
+    assert "hello <mark title='Nguồn: lexicon'>dm</mark>" in body
@@ -0,0 +1,53 @@
+# -*- coding: utf-8 -*-
+import pytest
+
+import app
+from result_cache import ResultCache
+
+TEXTS = ["thầy dạy rất hay", "mày ngu quá", "môn này hơi khó"]
+
+
+@pytest.fixture
+def cache(monkeypatch):
+    fresh = ResultCache()
+    monkeypatch.setattr(app, "RESULT_CACHE", fresh)
+    return fresh
+
+
+def test_mixed_detail_levels_keep_cache(cache):
+    client = app.app.test_client()
+    for text in TEXTS:
+        assert client.post("/api/predict", json={"text": text}).status_code == 200
+    assert cache.stats()["items"] == 3
+    assert client.post("/api/predict?detail=label", json={"text": TEXTS[0]}).status_code == 200
+    assert cache.stats()["items"] == 4
+
+    before = cache.stats()
+    for _ in range(2):
+        for detail in ("full", "label", "probability"):
+            app._score_texts(TEXTS, detail=detail)
+    after = cache.stats()
+    # lượt đầu chỉ trượt các mức chưa chấm (2 label + 3 probability), còn lại đều trúng
+    assert after["misses"] - before["misses"] == 5
+    assert after["hits"] - before["hits"] == 13
+
+
+def test_version_change_clears_cache():
+    cache = ResultCache()
+    cache.put("a", ("m1", 1), {"prediction": 0}, ("full",))
+    cache.put("a", ("m1", 1), {"prediction": 1}, ("label",))
+    assert cache.get("a", ("m1", 1), ("full",)) == {"prediction": 0}
+    assert cache.get("a", ("m1", 1), ("label",)) == {"prediction": 1}
+    assert cache.get("a", ("m2", 1), ("full",)) is None
+    assert cache.stats()["items"] == 0
+
+
+def test_cached_result_is_isolated_from_callers():
+    cache = ResultCache()
+    result = {"prediction": 1, "spans": [{"start": 0, "end": 2, "source": ["lexicon"]}]}
+    cache.put("dm", "v", result)
+    result["spans"][0]["source"].append("ml")
+    got = cache.get("dm", "v")
+    got["spans"][0]["end"] = 99
+    got["spans"].append({"start": 3, "end": 4, "source": ["ml"]})
+    assert cache.get("dm", "v") == {"prediction": 1, "spans": [{"start": 0, "end": 2, "source": ["lexicon"]}]}
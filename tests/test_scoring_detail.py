@@ -0,0 +1,33 @@
+# -*- coding: utf-8 -*-
+import app
+
+
+def _spans(result, source):
+    return [(s["start"], s["end"]) for s in result["spans"] if source in s["source"]]
+
+
+def test_probability_keeps_abbrev_spans_on_lexicon_rows():
+    dicts = app.DICT_STORE.current
+    abbrev = next(a for a in dicts.abbrev.profane if not dicts.lexicon.search(a) and " " not in a)
+    text = f"thằng ngu {abbrev}"
+    full = app._score_texts([text], detail="full")[0]
+    probability = app._score_texts([text], detail="probability")[0]
+    assert full["decided_by"] == probability["decided_by"] == "lexicon"
+    assert _spans(probability, "abbrev") == _spans(full, "abbrev") != []
+    assert _spans(probability, "lexicon") == _spans(full, "lexicon")
+    assert "ml" not in {src for s in probability["spans"] for src in s["source"]}
+
+
+def test_profile_bypasses_micro_batcher(monkeypatch):
+    batcher = app.MicroBatcher(lambda texts: app._score_texts(texts, parallel=False), window_ms=50)
+    calls = []
+    incoming = batcher.incoming
+    monkeypatch.setattr(batcher, "incoming", lambda: calls.append(1) or incoming())
+    monkeypatch.setattr(app, "MICRO_BATCHER", batcher)
+    client = app.app.test_client()
+    resp = client.post("/api/predict?profile=1", json={"text": "xin chào"})
+    assert resp.status_code == 200 and "profile" in resp.get_json()
+    assert calls == []  # không báo incoming(): luồng gom lô không chờ request này
+    resp = client.post("/api/predict", json={"text": "xin chào"})
+    assert resp.status_code == 200 and "profile" not in resp.get_json()
+    assert calls == [1] and batcher._arriving == 0
@@ -0,0 +1,65 @@
+# -*- coding: utf-8 -*-
+import math
+import random
+
+import numpy as np
+import pytest
+
+import span_metrics
+
+
+def spans_to_charset(spans):
+    """Cách cũ (eval_offensive.spans_to_charset): tập mọi vị trí ký tự."""
+    chars = set()
+    for s in spans:
+        a, b = int(s["start"]), int(s["end"])
+        for i in range(max(0, a), max(0, b)):
+            chars.add(i)
+    return chars
+
+
+def old_char_f1(pred_spans, gt_spans):
+    """Cách cũ (eval_offensive.char_f1) dựa trên tập ký tự."""
+    P = spans_to_charset(pred_spans)
+    G = spans_to_charset(gt_spans)
+    if len(P) == 0 and len(G) == 0:
+        return 1.0, 1.0, 1.0
+    if len(P) == 0:
+        return 0.0, 0.0, 0.0
+    tp = len(P & G); fp = len(P - G); fn = len(G - P)
+    prec = tp / (tp + fp) if (tp + fp) > 0 else 0.0
+    rec = tp / (tp + fn) if (tp + fn) > 0 else 0.0
+    f1 = 2 * prec * rec / (prec + rec) if (prec + rec) > 0 else 0.0
+    return prec, rec, f1
+
+
+def random_spans(rnd):
+    # gồm cả span âm, đảo ngược (end < start), rỗng và chồng lấn
+    return [{"start": rnd.randint(-5, 40), "end": rnd.randint(-5, 45)} for _ in range(rnd.randint(0, 5))]
+
+
+def test_char_prf_equals_set_based_char_f1():
+    rnd = random.Random(13)
+    preds, gts = [], []
+    for _ in range(5000):
+        pred, gt = random_spans(rnd), random_spans(rnd)
+        assert span_metrics.char_prf(pred, gt) == pytest.approx(old_char_f1(pred, gt), abs=1e-12), (pred, gt)
+        preds.append(pred)
+        gts.append(gt)
+    batch = span_metrics.batch_char_counts(preds, gts)
+    scalar = np.array([span_metrics.char_counts(p, g) for p, g in zip(preds, gts)])
+    assert np.array_equal(batch, scalar)
+
+
+def test_aggregate_empty_input_is_nan_for_both_averages():
+    for average in ("micro", "macro"):
+        out = span_metrics.aggregate([], average)
+        assert all(math.isnan(v) for v in out.values()), average
+
+
+def test_aggregate_micro_and_macro():
+    counts = [(2, 0, 2), (0, 0, 0), (0, 3, 1)]
+    micro = span_metrics.aggregate(counts, "micro")
+    assert micro["precision"] == pytest.approx(2 / 5) and micro["recall"] == pytest.approx(2 / 5)
+    macro = span_metrics.aggregate(counts, "macro")
+    assert macro["f1"] == pytest.approx((2 / 3 + 1.0 + 0.0) / 3)
@@ -0,0 +1,39 @@
+# -*- coding: utf-8 -*-
+import csv
+import os
+import re
+
+import app
+from text_normalizer import TextNormalizer
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def per_entry(text, norm_dict):
+    """Vòng lặp cũ: re.sub lần lượt từng mục, mục sau thay cả trên kết quả của mục trước."""
+    t = str(text).lower().strip()
+    for abb, meaning in norm_dict.items():
+        t = re.sub(r"\b" + re.escape(abb) + r"\b", str(meaning), t, flags=re.IGNORECASE)
+    return t
+
+
+def test_builtin_dictionary_matches_per_entry_loop():
+    with open(os.path.join(ROOT, "data_eval.csv"), encoding="utf-8") as f:
+        texts = [row["text"] for row in csv.DictReader(f)]
+    texts += ["DM vcl, Cl! đm dcm v*l", "  Đm   thầy  "]
+    normalizer = TextNormalizer(app.norm_dict)
+    for t in texts:
+        assert normalizer.normalize(t) == per_entry(t, app.norm_dict), t
+
+
+def test_no_cascading_substitution():
+    # "l" -> "lồn" không được thay tiếp bên trong nghĩa "cái l*n" vừa thay vào
+    norm = {"cl": "cái l*n", "l": "lồn"}
+    assert per_entry("Cl code bừa bãi", norm) == "cái lồn*n code bừa bãi"
+    assert TextNormalizer(norm).normalize("Cl code bừa bãi") == "cái l*n code bừa bãi"
+
+
+def test_merged_dictionary_drops_cascades():
+    normalizer = app.DICT_STORE.current.normalizer
+    assert normalizer.normalize("Cl code bừa bãi") == "cái l*n code bừa bãi"
+    assert normalizer.normalize("Vcl tệ hại") == "vãi cả l*n tệ hại"
@@ -0,0 +1,48 @@
+# -*- coding: utf-8 -*-
+import numpy as np
+import pytest
+
+from eval_offensive import best_threshold
+
+
+def f1_at(y, scores, t):
+    pred = np.asarray(scores) >= t
+    y = np.asarray(y).astype(bool)
+    tp, fp, fn = np.sum(pred & y), np.sum(pred & ~y), np.sum(~pred & y)
+    return 2 * tp / (2 * tp + fp + fn) if tp else 0.0
+
+
+def test_midpoint_between_chosen_and_next_lower_score():
+    t, value = best_threshold([1, 1, 0, 0], [0.9, 0.7, 0.4, 0.1])
+    assert t == pytest.approx(0.55) and value == 1.0
+
+
+def test_ties_pick_lowest_threshold():
+    # 0.9 và 0.2 cùng F1 2/3 -> chọn 0.2 (giữ recall); không có điểm thấp hơn nên không lấy trung điểm
+    y, scores = [1, 0, 0, 1], [0.9, 0.6, 0.5, 0.2]
+    t, value = best_threshold(y, scores)
+    assert t == 0.2 and value == pytest.approx(2 / 3)
+    assert f1_at(y, scores, 0.9) == pytest.approx(value)
+
+
+def test_recall_at_precision():
+    t, value = best_threshold([1, 1, 0, 1], [0.9, 0.8, 0.7, 0.6], "recall@precision", min_precision=0.9)
+    assert t == pytest.approx(0.75) and value == pytest.approx(2 / 3)
+
+
+def test_recall_at_precision_fallback_to_best_precision():
+    # không ngưỡng nào đạt precision 0.9: lấy precision cao nhất (0.5 tại 0.8 và 0.6 -> thấp nhất), giá trị = recall
+    t, value = best_threshold([0, 1, 0, 1], [0.9, 0.8, 0.7, 0.6], "recall@precision", min_precision=0.9)
+    assert t == 0.6 and value == 1.0
+
+
+def test_matches_brute_force_f1():
+    rnd = np.random.default_rng(12)
+    for _ in range(200):
+        n = int(rnd.integers(1, 30))
+        y = rnd.integers(0, 2, n)
+        scores = np.round(rnd.random(n), 1)  # nhiều điểm trùng nhau
+        t, value = best_threshold(y, scores)
+        best = max(f1_at(y, scores, s) for s in np.unique(scores))
+        assert value == pytest.approx(best)
+        assert f1_at(y, scores, t) == pytest.approx(best)
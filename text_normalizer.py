@@ -0,0 +1,92 @@
+# -*- coding: utf-8 -*-
+"""
+Chuẩn hoá văn bản một lượt (single-pass) theo `norm_dict`.
+
+Thay cho vòng lặp `re.sub` theo từng mục từ điển (biên dịch lại regex và sao
+chép cả chuỗi sau mỗi lần thay): mọi từ viết tắt được gộp thành MỘT regex dạng
+trie `\\b(?:...)\\b` (tiền tố chung dùng lại, nên vẫn nhanh với từ điển vài
+nghìn mục như master_dict_data.csv), phần thay thế tra trong dict.
+
+Tuỳ chọn: đổi emoticon -> emoji -> chữ bằng bảng character2emoji.xlsx và
+emoji2word.xlsx có sẵn trong repo (nạp bởi dictionary_store.py, NORMALIZE_EMOJI=1).
+"""
+from __future__ import annotations
+
+import re
+from types import MappingProxyType
+from typing import Dict, Iterable, List, Mapping, Optional
+
+from lexicon_matcher import trie_pattern
+
+
+_MULTI_SPACE = re.compile(r" {2,}")
+
+
+def _literal_alternation(keys: Iterable[str]) -> Optional["re.Pattern[str]"]:
+    keys = sorted({k for k in keys if k}, key=len, reverse=True)
+    if not keys:
+        return None
+    return re.compile("|".join(re.escape(k) for k in keys))
+
+
+class TextNormalizer:
+    """
+    Bộ chuẩn hoá dùng chung cho app (dự đoán, huấn luyện) và eval_offensive.py.
+
+    Khác vòng lặp cũ (lower -> strip -> `re.sub` lần lượt từng mục `norm_dict`)
+    ở hai điểm, có chủ ý:
+    - chỉ thay MỘT lượt trên văn bản gốc: nghĩa vừa thay vào không bị thay tiếp
+      (vòng lặp cũ thay dây chuyền, vd. "cl" -> "cái l*n" rồi "l" -> "lồn" cho
+      "cái lồn*n"). Với từ điển gộp (~1.700 mục) 11/1.328 câu của labeled_train
+      + data_eval vì thế chuẩn hoá khác trước (mô hình huấn luyện trên bản mới);
+    - nhiều mục cùng khớp tại một vị trí thì mục DÀI nhất được chọn (vd. "vcl"
+      thắng "vc" trong "vcl quá").
+    Với từ điển gốc 6 mục trong app.py kết quả giống hệt vòng lặp cũ.
+    """
+
+    def __init__(
+        self,
+        norm_dict: Mapping[str, str],
+        emoticons: Optional[Mapping[str, str]] = None,
+        emoji_words: Optional[Mapping[str, str]] = None,
+    ):
+        self.source = MappingProxyType(dict(norm_dict))
+        lookup: Dict[str, str] = {}
+        for abb, meaning in self.source.items():
+            abb = str(abb)
+            if abb:
+                lookup.setdefault(abb.lower(), str(meaning))
+        self._lookup = lookup
+        # viết tắt khớp nguyên văn (kể cả '*', '.'); trie tham -> khớp dài nhất.
+        # Văn bản đã lower() trước khi thay nên không cần IGNORECASE; lookahead
+        # ký tự đầu loại nhanh các vị trí không thể bắt đầu một mục (~4x nhanh hơn).
+        body = trie_pattern(lookup, literal=True)
+        first = "".join(sorted({re.escape(k[0]) for k in lookup}))
+        self._pattern = re.compile(r"(?=[" + first + r"])\b(?:" + body + r")\b") if body else None
+
+        self._emoticons = dict(emoticons or {})
+        self._emoticon_pattern = _literal_alternation(self._emoticons)
+        self._emoji_words = dict(emoji_words or {})
+        self._emoji_pattern = _literal_alternation(self._emoji_words)
+
+    def _expand(self, m: "re.Match[str]") -> str:
+        s = m.group(0)
+        return self._lookup.get(s.lower(), s)
+
+    def normalize(self, text: str) -> str:
+        t = str(text).lower().strip()
+        if self._emoticon_pattern is not None:
+            t = self._emoticon_pattern.sub(lambda m: self._emoticons[m.group(0)], t)
+        if self._emoji_pattern is not None:
+            t = self._emoji_pattern.sub(lambda m: " " + self._emoji_words[m.group(0)] + " ", t)
+            t = _MULTI_SPACE.sub(" ", t).strip()
+        if self._pattern is not None:
+            t = self._pattern.sub(self._expand, t)
+        return t
+
+    __call__ = normalize
+
+    def normalize_many(self, texts: Iterable[str]) -> List[str]:
+        normalize = self.normalize
+        return [normalize(t) for t in texts]
+
@@ -0,0 +1,296 @@
+# -*- coding: utf-8 -*-
+"""
+Đọc file upload theo luồng (streaming) -> sinh từng đoạn văn bản kèm vị trí.
+
+- CSV : pandas đọc theo chunk (`chunksize`), không nạp cả file.
+- XLSX: openpyxl chế độ read-only, duyệt từng hàng.
+- TXT : đọc từng dòng từ stream.
+- PDF : pdfminer trích từng trang, đọc thẳng từ bộ nhớ (không ghi file tạm).
+  PDF từ PDF_PARALLEL_MIN_PAGES trang trở lên được chia theo nhóm
+  PDF_PAGES_PER_TASK trang cho pool tiến trình PDF_WORKERS: nội dung file đặt
+  một lần vào shared memory, mỗi worker chỉ dựng layout các trang được giao;
+  kết quả vẫn trả theo đúng thứ tự trang, trang nào xong trước trả trước.
+- DOCX: duyệt từng paragraph.
+
+`iter_upload_segments` trả (văn bản, vị trí) — vị trí là {"row": n} (CSV/XLSX),
+{"line": n} (TXT), {"paragraph": n} (DOCX) hoặc {"page": p, "line": n} (PDF),
+đánh số từ 1 — để kết quả trỏ ngược về chỗ trong file gốc.
+`iter_upload_texts` chỉ trả văn bản.
+
+Lỗi định dạng / thiếu cột văn bản được báo NGAY khi mở (ValueError), trước khi
+bắt đầu trả kết quả, để route có thể trả 400 như cũ.
+"""
+from __future__ import annotations
+
+import io
+import os
+import threading
+from collections import deque
+from itertools import chain
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+
+SUPPORTED_EXTS = {"csv", "xlsx", "xls", "txt", "docx", "pdf"}
+
+ROWS_PER_CHUNK = 1000
+
+PDF_WORKERS = int(os.environ.get("PDF_WORKERS", str(min(os.cpu_count() or 1, 4))))
+PDF_PARALLEL_MIN_PAGES = int(os.environ.get("PDF_PARALLEL_MIN_PAGES", "8"))
+PDF_PAGES_PER_TASK = int(os.environ.get("PDF_PAGES_PER_TASK", "4"))
+
+Location = Dict[str, int]
+Segment = Tuple[str, Location]
+
+
+def _text_column(df, detect_columns: Callable) -> str:
+    text_col, _ = detect_columns(df)
+    if text_col is None:
+        obj_cols = [c for c in df.columns if df[c].dtype == 'object']
+        if not obj_cols:
+            raise ValueError("Không tìm thấy cột văn bản trong file.")
+        text_col = obj_cols[0]
+    return text_col
+
+
+def _rows(texts: Iterator[str]) -> Iterator[Segment]:
+    return ((t, {"row": n}) for n, t in enumerate(texts, 1))
+
+
+def _iter_csv(stream, detect_columns: Callable) -> Iterator[str]:
+    import pandas as pd
+
+    reader = pd.read_csv(stream, chunksize=ROWS_PER_CHUNK)
+    try:
+        first = next(reader)
+    except StopIteration:
+        return iter(())
+    text_col = _text_column(first, detect_columns)
+
+    def gen():
+        for chunk in chain([first], reader):
+            yield from chunk[text_col].astype(str).tolist()
+    return gen()
+
+
+def _iter_xlsx(stream, detect_columns: Callable) -> Iterator[str]:
+    import pandas as pd
+    from openpyxl import load_workbook
+
+    wb = load_workbook(stream, read_only=True, data_only=True)
+    rows = wb.active.iter_rows(values_only=True)
+    header = next(rows, None)
+    if header is None:
+        wb.close()
+        return iter(())
+    header = [str(h) if h is not None else f"col{i}" for i, h in enumerate(header)]
+    head_rows: List[Tuple] = []
+    for row in rows:
+        head_rows.append(row)
+        if len(head_rows) >= ROWS_PER_CHUNK:
+            break
+    sample = pd.DataFrame([list(r)[:len(header)] for r in head_rows], columns=header)
+    text_col = _text_column(sample, detect_columns)
+    col = header.index(text_col)
+
+    def gen():
+        try:
+            for row in chain(head_rows, rows):
+                v = row[col] if col < len(row) else None
+                # giống pandas .astype(str): ô trống -> "nan"
+                yield "nan" if v is None else str(v)
+        finally:
+            wb.close()
+    return gen()
+
+
+def _iter_xls(stream, detect_columns: Callable) -> Iterator[str]:
+    # .xls cũ không đọc được ở chế độ read-only -> đọc cả sheet như trước
+    import pandas as pd
+
+    df = pd.read_excel(stream)
+    text_col = _text_column(df, detect_columns)
+    return iter(df[text_col].astype(str).tolist())
+
+
+def _iter_txt(stream) -> Iterator[Segment]:
+    for n, line in enumerate(io.TextIOWrapper(stream, encoding="utf-8", errors="ignore"), 1):
+        line = line.strip()
+        if line:
+            yield line, {"line": n}
+
+
+def _iter_docx(stream) -> Iterator[Segment]:
+    from docx import Document
+
+    doc = Document(stream)
+    for n, p in enumerate(doc.paragraphs, 1):
+        if p.text and p.text.strip():
+            yield p.text.strip(), {"paragraph": n}
+
+
+# =========================
+# PDF
+# =========================
+def _page_lines(page) -> List[str]:
+    from pdfminer.layout import LTTextContainer
+
+    content = "".join(el.get_text() for el in page if isinstance(el, LTTextContainer))
+    return [line.strip() for line in content.splitlines() if line.strip()]
+
+
+def _pdf_segments(pages: Iterable[Tuple[int, List[str]]]) -> Iterator[Segment]:
+    for page_no, lines in pages:
+        for n, line in enumerate(lines, 1):
+            yield line, {"page": page_no, "line": n}
+
+
+def _pdf_page_count(data: bytes) -> int:
+    from pdfminer.pdfdocument import PDFDocument
+    from pdfminer.pdfpage import PDFPage
+    from pdfminer.pdfparser import PDFParser
+
+    doc = PDFDocument(PDFParser(io.BytesIO(data)))
+    return sum(1 for _ in PDFPage.create_pages(doc))
+
+
+class _MemoryReader(io.RawIOBase):
+    """File chỉ đọc trên một memoryview: đọc thẳng từ shared memory, không chép cả file."""
+
+    def __init__(self, view: memoryview):
+        self._view = view
+        self._pos = 0
+
+    def readable(self) -> bool:
+        return True
+
+    def seekable(self) -> bool:
+        return True
+
+    def readinto(self, b) -> int:
+        n = max(0, min(len(b), len(self._view) - self._pos))
+        b[:n] = self._view[self._pos:self._pos + n]
+        self._pos += n
+        return n
+
+    def seek(self, offset: int, whence: int = io.SEEK_SET) -> int:
+        base = {io.SEEK_SET: 0, io.SEEK_CUR: self._pos, io.SEEK_END: len(self._view)}[whence]
+        self._pos = max(0, base + offset)
+        return self._pos
+
+    def tell(self) -> int:
+        return self._pos
+
+
+def _extract_page_range(shm_name: str, size: int, first: int, last: int) -> List[Tuple[int, List[str]]]:
+    """(Chạy trong worker) dựng layout các trang [first, last) của PDF nằm trong shared memory."""
+    from multiprocessing import shared_memory
+
+    from pdfminer.high_level import extract_pages
+
+    shm = shared_memory.SharedMemory(name=shm_name)
+    try:
+        # pdfminer đọc dần qua memoryview (chỉ các khối cần cho trang được giao);
+        # view phải được giải phóng trước shm.close()
+        with shm.buf[:size] as view:
+            pages = extract_pages(_MemoryReader(view), page_numbers=range(first, last))
+            return [(first + i + 1, _page_lines(page)) for i, page in enumerate(pages)]
+    finally:
+        shm.close()
+
+
+_pdf_executor = None
+_pdf_executor_pid: Optional[int] = None
+_pdf_lock = threading.Lock()
+
+
+def _pdf_pool():
+    global _pdf_executor, _pdf_executor_pid
+    from concurrent.futures import ProcessPoolExecutor
+    from multiprocessing import get_context
+
+    with _pdf_lock:
+        if _pdf_executor is None or _pdf_executor_pid != os.getpid():
+            # spawn: không fork tiến trình web nhiều luồng. Worker import module này +
+            # pdfminer; riêng khi chạy `python app.py`, spawn chạy lại __main__ (app.py,
+            # trừ khối `if __name__ == "__main__"`) trong mỗi worker — một lần khi pool
+            # khởi động, không nạp mô hình (import app lười, xem startup_profile.py)
+            _pdf_executor = ProcessPoolExecutor(max_workers=PDF_WORKERS, mp_context=get_context("spawn"))
+            _pdf_executor_pid = os.getpid()
+        return _pdf_executor
+
+
+def _iter_pdf_parallel(data: bytes, n_pages: int) -> Iterator[Tuple[int, List[str]]]:
+    from multiprocessing import shared_memory
+
+    shm = shared_memory.SharedMemory(create=True, size=len(data))
+    try:
+        shm.buf[:len(data)] = data
+        pool = _pdf_pool()
+        ranges = deque((i, min(i + PDF_PAGES_PER_TASK, n_pages)) for i in range(0, n_pages, PDF_PAGES_PER_TASK))
+        pending: deque = deque()
+        try:
+            # giữ tối đa 2 nhóm mỗi worker đang chạy: bộ nhớ không phụ thuộc số trang
+            while ranges or pending:
+                while ranges and len(pending) < 2 * PDF_WORKERS:
+                    first, last = ranges.popleft()
+                    pending.append(pool.submit(_extract_page_range, shm.name, len(data), first, last))
+                yield from pending.popleft().result()
+        finally:
+            for fut in pending:
+                fut.cancel()
+            # nhóm đã chạy dở phải xong trước khi giải phóng vùng nhớ
+            for fut in pending:
+                if not fut.cancelled():
+                    fut.exception()
+    finally:
+        shm.close()
+        shm.unlink()
+
+
+def _iter_pdf(stream) -> Iterator[Segment]:
+    from pdfminer.high_level import extract_pages
+
+    data = stream.read()
+    n_pages = _pdf_page_count(data)  # PDF hỏng -> lỗi ngay khi mở (400)
+
+    def gen():
+        if PDF_WORKERS > 1 and n_pages >= PDF_PARALLEL_MIN_PAGES:
+            pages = _iter_pdf_parallel(data, n_pages)
+        else:
+            pages = ((i, _page_lines(page)) for i, page in enumerate(extract_pages(io.BytesIO(data)), 1))
+        yield from _pdf_segments(pages)
+    return gen()
+
+
+def iter_upload_segments(stream, filename: str, detect_columns: Callable) -> Iterator[Segment]:
+    """Mở file upload và trả về iterator (văn bản, vị trí) (lười, theo luồng)."""
+    ext = (filename or "").split(".")[-1].lower()
+    if ext not in SUPPORTED_EXTS:
+        raise ValueError("Định dạng không hỗ trợ. Hãy dùng CSV/TXT/XLSX/DOCX/PDF.")
+    if ext == "csv":
+        return _rows(_iter_csv(stream, detect_columns))
+    if ext == "xlsx":
+        return _rows(_iter_xlsx(stream, detect_columns))
+    if ext == "xls":
+        return _rows(_iter_xls(stream, detect_columns))
+    if ext == "txt":
+        return _iter_txt(stream)
+    if ext == "docx":
+        return _iter_docx(stream)
+    return _iter_pdf(stream)
+
+
+def iter_upload_texts(stream, filename: str, detect_columns: Callable) -> Iterator[str]:
+    """Mở file upload và trả về iterator các dòng văn bản (lười, theo luồng)."""
+    return (text for text, _ in iter_upload_segments(stream, filename, detect_columns))
+
+
+def chunked(items: Iterable[str], size: int) -> Iterator[List[str]]:
+    """Gom iterator thành các lô kích thước cố định."""
+    batch: List[str] = []
+    for it in items:
+        batch.append(it)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
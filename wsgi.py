@@ -0,0 +1,14 @@
+# -*- coding: utf-8 -*-
+"""
+Điểm vào WSGI cho production:
+
+    gunicorn -c gunicorn.conf.py wsgi:app
+
+Import module này nạp mô hình + dựng sẵn chỉ mục (`create_app`). Với
+`preload_app = True` việc đó chạy một lần ở gunicorn master trước khi fork.
+Watcher đổi nóng từ điển không chạy ở master (luồng không sống qua fork):
+gunicorn.conf.py bật nó trong từng worker (post_fork).
+"""
+from app import create_app
+
+app = create_app(watch=False)